@@ -1,17 +1,28 @@
 """
 Streamlit interface for the Routing Pattern demonstration
 Run with: streamlit run app.py
+
+All browser sessions share one cached router and a BackgroundRouter pool
+of ``APP_WORKERS`` threads, so a page never blocks on a model call; beyond
+``APP_MAX_PENDING`` waiting queries users are asked to retry. The answer
+being generated is polled into a fragment every ``APP_POLL_SECONDS`` and
+the history is paged ``APP_HISTORY_PAGE_SIZE`` messages at a time, so each
+rerun costs the same however long the conversation gets. Each browser
+session is its own conversation.
 """
 
 from typing import Dict
 
-from datetime import datetime
+import uuid
 import streamlit as st
 
 # Import our routing components
+from src.router.background import BackgroundRouter
 from src.router.router import Router
 from src.models.routing import QueryCategory
 from src.config.settings import settings
+from src.config.sample_queries import SAMPLE_QUESTIONS
+from src.utils.metrics import start_metrics_server
 
 # Page configuration
 st.set_page_config(
@@ -84,47 +95,49 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+@st.cache_resource
+def start_exporter(port: int):
+    """Start the metrics exporter once per process, not once per session"""
+    return start_metrics_server(port)
+
+
+if settings.METRICS_PORT:
+    start_exporter(settings.METRICS_PORT)
+
+@st.cache_resource
+def get_router() -> Router:
+    """One router, with its handlers, caches and conversation memory, shared by every session"""
+    router = Router(model_name=settings.OLLAMA_MODEL)
+    if settings.WARMUP_ON_START:
+        router.warm_up()
+    return router
+
+
+@st.cache_resource
+def get_worker() -> BackgroundRouter:
+    """Worker threads shared by every session, so no page script waits on a model call"""
+    return BackgroundRouter(get_router(), settings.APP_WORKERS, settings.APP_MAX_PENDING)
+
+
+with st.spinner("Loading models..."):
+    worker = get_worker()
+
 # Initialize session state
-if 'router' not in st.session_state:
-    st.session_state.router = Router(model_name=settings.OLLAMA_MODEL)
-    
 if 'messages' not in st.session_state:
     st.session_state.messages = []
 
+# The query being answered in the background, if any
+if 'pending' not in st.session_state:
+    st.session_state.pending = None
+
+# Page of history on screen, counted back from the latest
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
+
+# Each browser session is one conversation, so follow-up questions keep their context
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
-# Sample questions organized by category
-SAMPLE_QUESTIONS = {
-    "General Inquiries": [
-        "What are your business hours?",
-        "Where are you located?",
-        "Do you offer international shipping?",
-        "What payment methods do you accept?"
-    ],
-    "Refund & Returns": [
-        "I want to return my order #12345, it arrived damaged",
-        "How long do I have to return an item?",
-        "My package never arrived, can I get a refund?",
-        "I received the wrong item in my order"
-    ],
-    "Technical Support": [
-        "My app keeps crashing when I try to log in",
-        "The website won't load on my browser",
-        "I'm getting error code E404 on the screen",
-        "How do I reset my password?"
-    ],
-    "Billing Questions": [
-        "Why was I charged twice for my subscription?",
-        "I don't recognize this charge on my card",
-        "How can I update my payment method?",
-        "When will I receive my invoice?"
-    ],
-    "Product Recommendations": [
-        "Can you recommend a good laptop for programming?",
-        "What's the best phone for photography?",
-        "I need a gift for a 10-year-old, any suggestions?",
-        "Which of your products is best for beginners?"
-    ]
-}
 
 def get_category_color(category: QueryCategory) -> str:
     """Get color for category badge"""
@@ -138,27 +151,72 @@ def get_category_color(category: QueryCategory) -> str:
     }
     return colors.get(category, "#757575")
 
-def process_query(query_text: str) -> None:
-    """Process a query and add to message history"""
-    with st.spinner("Processing query..."):
-        try:
-            # Route the query
-            response, routing_decision = st.session_state.router.route_query(query_text)
-            
-            # Add to messages
+def submit_query(query_text: str) -> None:
+    """Hand the query to the background worker; the live exchange polls it until the answer is complete"""
+    if st.session_state.pending is not None:
+        st.toast("Still answering your previous question...")
+        return
+    job = worker.submit(query_text, st.session_state.session_id)
+    if job is None:
+        st.warning("The demo is busy right now, please try again in a moment.")
+        return
+    st.session_state.pending = job
+    st.session_state.history_page = 0
+
+
+@st.fragment(run_every=settings.APP_POLL_SECONDS)
+def show_pending() -> None:
+    """Render the exchange being answered, re-running only this fragment until the job finishes"""
+    job = st.session_state.pending
+    if job is None:
+        return
+    if job.done:
+        st.session_state.pending = None
+        if job.response is not None:
             st.session_state.messages.append({
-                'timestamp': datetime.now(),
-                'query': query_text,
-                'response': response,
-                'routing_decision': routing_decision
+                'timestamp': job.submitted,
+                'query': job.query,
+                'response': job.response,
+                'routing_decision': job.routing_decision
             })
-            
+        else:
+            st.session_state.error = job.error
+        # Redraw the page once so the finished exchange joins the history
+        st.rerun()
+
+    with st.chat_message("user"):
+        st.markdown(job.query)
+    with st.chat_message("assistant"):
+        text = job.text
+        st.markdown(text + "▌" if text else "_Routing query..._")
+
+
+def change_page(step: int) -> None:
+    st.session_state.history_page += step
 
-            # Rerun to update the display
-            st.rerun()
-            
-        except Exception as e:
-            st.error(f"Error processing query: {str(e)}")
+
+def show_history() -> None:
+    """Render one page of the conversation, so each rerun costs the same however long it gets"""
+    messages = st.session_state.messages
+    page_size = settings.APP_HISTORY_PAGE_SIZE
+    pages = max(1, -(-len(messages) // page_size))
+    page = min(st.session_state.history_page, pages - 1)
+    end = len(messages) - page * page_size
+    start = max(end - page_size, 0)
+
+    if pages > 1:
+        older, position, newer = st.columns([1, 2, 1])
+        with older:
+            st.button("⬆️ Older", key="history_older", disabled=page == pages - 1,
+                      on_click=change_page, args=(1,), use_container_width=True)
+        with position:
+            st.caption(f"Messages {start + 1}-{end} of {len(messages)}")
+        with newer:
+            st.button("⬇️ Newer", key="history_newer", disabled=page == 0,
+                      on_click=change_page, args=(-1,), use_container_width=True)
+
+    for message in messages[start:end]:
+        display_message(message)
 
 def display_message(message: Dict):
     """Display a single message in the chat history"""
@@ -196,7 +254,7 @@ def display_message(message: Dict):
             if message['routing_decision'].extracted_info and any(message['routing_decision'].extracted_info.values()):
                 st.write("**Extracted Information:**")
                 for key, value in message['routing_decision'].extracted_info.items():
-                    if value and value != "if mentioned":
+                    if value:
                         st.write(f"- {key.replace('_', ' ').title()}: {value}")
 
 def main():
@@ -211,13 +269,17 @@ def main():
     col1, col2 = st.columns([3, 1])
     
     with col1:       
-        for message in st.session_state.messages:
-            display_message(message)
+        if st.session_state.get('error'):
+            st.error(f"Error processing query: {st.session_state.pop('error')}")
+
+        show_history()
+
+        # New exchanges stream into this container, below the history
+        live_container = st.container()
 
         # Chat input
         if prompt := st.chat_input("Say something"):
-            with st.chat_message("user"):
-                process_query(prompt) 
+            submit_query(prompt)
 
 
     with col2:
@@ -233,16 +295,27 @@ def main():
                         use_container_width=True,
                         help=f"Click to send: {question}"
                     ):
-                        process_query(question)
+                        submit_query(question)
+
+    with live_container:
+        if st.session_state.pending is not None:
+            show_pending()
     
     # Sidebar with system information and statistics
     with st.sidebar:
         st.header("⚙️ System Information")
         st.info(f"**Model:** {settings.OLLAMA_MODEL}")
         st.info(f"**Confidence Threshold:** {settings.DEFAULT_CONFIDENCE_THRESHOLD}")
+        stats = worker.stats()
+        st.caption(f"Workers: {stats['running']} of {stats['workers']} busy, {stats['queued']} queued")
         
         if st.button("🗑️ Clear Conversation", type="secondary", use_container_width=True):
             st.session_state.messages = []
+            st.session_state.pending = None
+            st.session_state.history_page = 0
+            if worker.router.memory is not None:
+                worker.router.memory.forget(st.session_state.session_id)
+            st.session_state.session_id = uuid.uuid4().hex
             st.rerun()
         
         st.header("ℹ️ About")
@@ -0,0 +1,242 @@
+"""
+Local stand-in for the Ollama HTTP API, used by the benchmarks.
+
+Answers /api/chat (streaming and non-streaming), /api/embeddings, /api/show
+and /api/tags with configurable latency, generation speed and failure rate.
+Classification prompts get a JSON answer chosen by keyword matching, so the
+router sees realistic categories without a real model.
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import numpy as np
+from src.models.routing import QueryCategory
+from src.router.speculation import KeywordPredictor
+
+QUERY_PATTERN = re.compile(r'^Query: "(.*)"$', re.S)
+BATCH_LINE_PATTERN = re.compile(r"^\[(\d+)\] (.*)$", re.M)
+
+FILLER_WORDS = (
+    "thanks for reaching out we are happy to help with your request here is what you can do next "
+    "please let us know if anything else comes up and we will follow up as soon as possible"
+).split()
+
+
+class FakeOllamaConfig:
+    """Timing and failure behaviour of the fake server"""
+
+    def __init__(
+        self,
+        latency: float = 0.05,
+        tokens_per_second: float = 200.0,
+        failure_rate: float = 0.0,
+        response_tokens: int = 120,
+        embedding_dim: int = 64,
+        num_ctx: int = 4096,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.response_tokens = response_tokens
+        self.embedding_dim = embedding_dim
+        self.num_ctx = num_ctx
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.failure_rate
+
+
+class FakeOllamaServer(ThreadingHTTPServer):
+    """Threaded HTTP server answering like Ollama"""
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, address: Tuple[str, int], config: FakeOllamaConfig):
+        super().__init__(address, _FakeOllamaHandler)
+        self.config = config
+        self.predictor = KeywordPredictor()
+        self.requests_served = 0
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        """Serve from a background thread"""
+        threading.Thread(target=self.serve_forever, name="fake-ollama", daemon=True).start()
+        return self
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        category, confidence = self.predictor.predict(text)
+        if category is None:
+            category, confidence = QueryCategory.GENERAL_INQUIRY, 0.6
+        return {
+            "category": category.value,
+            "confidence": round(max(confidence, 0.6), 2),
+            "reasoning": f"The query mentions topics typical of {category.value.replace('_', ' ')} requests.",
+        }
+
+    def answer(self, messages: List[Dict[str, str]], num_predict: Optional[int]) -> str:
+        """Content of the assistant message for a chat request"""
+        system = " ".join(message["content"] for message in messages if message.get("role") == "system")
+        user = messages[-1]["content"] if messages else ""
+
+        if '"intents"' in system:
+            match = QUERY_PATTERN.match(user.strip())
+            text = match.group(1) if match else user
+            hits = sorted(self.predictor.matches(text).items(), key=lambda item: item[1], reverse=True)
+            intents = [
+                {"category": category.value, "confidence": round(min(0.95, 0.6 + 0.15 * count), 2), "reasoning": ""}
+                for category, count in hits if count
+            ]
+            return json.dumps({"intents": intents or [self.classify(text)]})
+
+        if "Classify" in system:
+            batch = BATCH_LINE_PATTERN.findall(user)
+            if batch:
+                return json.dumps({
+                    "results": [{"index": int(index), **self.classify(query)} for index, query in batch]
+                })
+            match = QUERY_PATTERN.match(user.strip())
+            return json.dumps(self.classify(match.group(1) if match else user))
+
+        count = self.config.response_tokens
+        if num_predict:
+            count = min(count, num_predict)
+        return " ".join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(count))
+
+    def embedding(self, text: str) -> List[float]:
+        """Bag-of-words vector, so similar queries get similar embeddings"""
+        vector = np.zeros(self.config.embedding_dim, dtype=np.float64)
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % len(vector)] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+
+class _FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: FakeOllamaServer
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _send_json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, payload: Dict[str, Any]) -> None:
+        line = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+        self.wfile.flush()
+
+    def do_GET(self) -> None:
+        if self.path == "/api/tags":
+            self._send_json({"models": []})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        config = self.server.config
+        self.server.requests_served += 1
+
+        if self.path == "/api/show":
+            self._send_json({"parameters": f"num_ctx {config.num_ctx}"})
+            return
+
+        time.sleep(config.latency)
+        if config.should_fail():
+            self._send_json({"error": "simulated server failure"}, status=500)
+            return
+
+        if self.path == "/api/embeddings":
+            self._send_json({"embedding": self.server.embedding(request.get("prompt", ""))})
+            return
+        if self.path != "/api/chat":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        messages = request.get("messages") or []
+        if not messages:
+            # Empty chat requests just load the model
+            self._send_json({"model": request.get("model"), "message": {"role": "assistant", "content": ""}, "done": True})
+            return
+
+        options = request.get("options") or {}
+        content = self.server.answer(messages, options.get("num_predict"))
+        pieces = re.findall(r"\S+\s*|\s+", content) or [""]
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4 + 1
+        stats = {
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "prompt_eval_duration": int(config.latency * 1e9),
+            "eval_count": len(pieces),
+            "eval_duration": int(len(pieces) / config.tokens_per_second * 1e9),
+            "load_duration": 0,
+            "total_duration": int((config.latency + len(pieces) / config.tokens_per_second) * 1e9),
+        }
+
+        if not request.get("stream", True):
+            time.sleep(len(pieces) / config.tokens_per_second)
+            self._send_json({"model": request.get("model"), "message": {"role": "assistant", "content": content}, **stats})
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for piece in pieces:
+                time.sleep(1.0 / config.tokens_per_second)
+                self._send_chunk({"model": request.get("model"), "message": {"role": "assistant", "content": piece}, "done": False})
+            self._send_chunk({"model": request.get("model"), "message": {"role": "assistant", "content": ""}, **stats})
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client stopped reading early (e.g. classification early exit)
+            self.close_connection = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = FakeOllamaConfig(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        failure_rate=args.failure_rate,
+        response_tokens=args.response_tokens,
+        seed=args.seed,
+    )
+    server = FakeOllamaServer((args.host, args.port), config)
+    print(f"Fake Ollama listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmark the router against a local fake Ollama server (or a real one).
+
+Examples:
+    python -m benchmarks.run --concurrency 1 4 16 --requests 200 --output results.json
+    python -m benchmarks.run --baseline results.json
+    python -m benchmarks.run --host http://localhost:11434 --workload queries.jsonl
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import argparse
+import json
+import sys
+import time
+import numpy as np
+from benchmarks.fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from benchmarks.workload import load_workload, repeat_to
+from src.config.settings import settings
+from src.models.routing import QueryCategory
+from src.router.router import Router
+from src.utils.llm_client import LLMClient
+
+STAGES = ("classify", "handle", "total")
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency percentiles in milliseconds"""
+    if not samples:
+        return {"mean": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "mean": round(float(values.mean()), 2),
+        "p50": round(float(p50), 2),
+        "p95": round(float(p95), 2),
+        "p99": round(float(p99), 2),
+        "max": round(float(values.max()), 2),
+    }
+
+
+def run_level(router: Router, queries: List[str], concurrency: int) -> Dict[str, Any]:
+    """Route every query with ``concurrency`` worker threads and time each stage"""
+
+    def route(query: str) -> Optional[Dict[str, float]]:
+        # Same steps as Router.route_query, timed separately
+        started = time.perf_counter()
+        try:
+            routing_decision = router.classify_query(query)
+            classified = time.perf_counter()
+            response = router.dispatch(query, routing_decision)
+        except Exception:
+            return None
+        finished = time.perf_counter()
+        return {
+            "classify": classified - started,
+            "handle": finished - classified,
+            "total": finished - started,
+            "failed": routing_decision.category == QueryCategory.UNKNOWN or bool(response.metadata.get("fallback")),
+        }
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(route, queries))
+    elapsed = time.perf_counter() - started
+
+    completed = [result for result in results if result is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": len(queries),
+        "errors": sum(1 for result in results if result is None or result["failed"]),
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(queries) / elapsed, 2) if elapsed else 0.0,
+        "stages": {stage: summarize([result[stage] for result in completed]) for stage in STAGES},
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe every concurrency level that got slower than the baseline by more than ``tolerance``"""
+    baseline_levels = {level["concurrency"]: level for level in baseline.get("levels", [])}
+    regressions = []
+    for level in current["levels"]:
+        before = baseline_levels.get(level["concurrency"])
+        if before is None:
+            continue
+        for stage in STAGES:
+            old, new = before["stages"][stage]["p95"], level["stages"][stage]["p95"]
+            if old and new > old * (1 + tolerance):
+                regressions.append(
+                    f"concurrency {level['concurrency']}: {stage} p95 {old:.1f} ms -> {new:.1f} ms"
+                )
+        old, new = before["throughput_rps"], level["throughput_rps"]
+        if old and new < old * (1 - tolerance):
+            regressions.append(f"concurrency {level['concurrency']}: throughput {old:.1f} -> {new:.1f} req/s")
+    return regressions
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"{'conc':>5} {'req/s':>8} {'errors':>7}  " + "  ".join(f"{stage + ' p50/p95/p99 ms':>28}" for stage in STAGES))
+    for level in result["levels"]:
+        stages = "  ".join(
+            f"{level['stages'][stage]['p50']:>8.1f} / {level['stages'][stage]['p95']:>7.1f} / {level['stages'][stage]['p99']:>7.1f}"
+            for stage in STAGES
+        )
+        print(f"{level['concurrency']:>5} {level['throughput_rps']:>8.1f} {level['errors']:>7}  {stages}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark query routing")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="queries routed per concurrency level")
+    parser.add_argument("--workload", help="JSONL file of queries (defaults to the sample and demo queries)")
+    parser.add_argument("--host", help="benchmark a real Ollama server instead of the fake one")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake server: seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="fake server: generation speed")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fake server: share of requests failing")
+    parser.add_argument("--seed", type=int, default=0, help="fake server: random seed for failures")
+    parser.add_argument("--cache", action="store_true", help="keep the classification and response caches on")
+    parser.add_argument("--output", help="write the JSON result to this file")
+    parser.add_argument("--baseline", help="JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed regression before failing")
+    args = parser.parse_args()
+
+    if not args.cache:
+        # Repeated workload queries would otherwise only measure cache hits
+        settings.ENABLE_CLASSIFICATION_CACHE = False
+        settings.ENABLE_RESPONSE_CACHE = False
+    # Fake-server decisions are not training data
+    settings.DECISION_LOG_PATH = ""
+    settings.ROUTE_LOG_PATH = ""
+
+    config = {
+        "requests": args.requests,
+        "workload": args.workload or "sample_queries",
+        "cache": args.cache,
+    }
+    host = args.host
+    if host is None:
+        fake = FakeOllamaConfig(
+            latency=args.latency,
+            tokens_per_second=args.tokens_per_second,
+            failure_rate=args.failure_rate,
+            seed=args.seed,
+        )
+        host = FakeOllamaServer(("127.0.0.1", 0), fake).start().url
+        config.update(
+            {"latency": args.latency, "tokens_per_second": args.tokens_per_second, "failure_rate": args.failure_rate}
+        )
+    config["host"] = host if args.host else "fake"
+
+    router = Router(client=LLMClient(hosts=[host]))
+    router.warm_up()
+    queries = repeat_to(load_workload(args.workload), args.requests)
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": config,
+        "levels": [run_level(router, queries, concurrency) for concurrency in args.concurrency],
+    }
+    print_report(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(result, output_file, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            regressions = compare(result, json.load(baseline_file), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
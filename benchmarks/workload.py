@@ -0,0 +1,29 @@
+from typing import List, Optional
+import json
+from src.config.sample_queries import labeled_examples
+
+
+def load_workload(path: Optional[str] = None) -> List[str]:
+    """Queries to benchmark: the sample and demo queries, or one per line of a JSONL file.
+
+    Each JSONL line is either a JSON string or an object with a ``query`` field.
+    """
+    if path is None:
+        return [query for query, _ in labeled_examples()]
+
+    queries = []
+    with open(path, "r", encoding="utf-8") as workload_file:
+        for line in workload_file:
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            queries.append(item["query"] if isinstance(item, dict) else str(item))
+    return queries
+
+
+def repeat_to(queries: List[str], count: int) -> List[str]:
+    """Cycle through the workload until it has ``count`` queries"""
+    if not queries:
+        raise ValueError("Benchmark workload is empty")
+    return [queries[index % len(queries)] for index in range(count)]
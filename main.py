@@ -3,6 +3,8 @@ Main entry point for the Routing Pattern demonstration
 """
 
 from src.router.router import Router
+from src.config.sample_queries import DEMO_QUERIES
+from src.config.settings import settings
 
 
 def demonstrate_routing():
@@ -10,17 +12,11 @@ def demonstrate_routing():
     
     # Initialize the router
     router = Router()
+    if settings.WARMUP_ON_START:
+        router.warm_up()
     
     # Example queries representing different categories
-    test_queries = [
-        "What are your business hours?",
-        "I want to return my order #12345, it arrived damaged",
-        "My app keeps crashing when I try to log in",
-        "Why was I charged twice for my subscription?",
-        "Can you recommend a good laptop for programming?",
-        "The screen is showing error code E404",
-        "I need help choosing between your premium and basic plans",
-    ]
+    test_queries = [query for query, _ in DEMO_QUERIES]
     
     print("=" * 80)
     print("ROUTING PATTERN DEMONSTRATION")
@@ -0,0 +1,21 @@
+"""
+HTTP entry point: serves the router as an ASGI app with uvicorn
+"""
+
+import uvicorn
+from src.config.settings import settings
+
+
+def serve():
+    """Run the routing service until interrupted, draining queued requests on shutdown"""
+    uvicorn.run(
+        "src.server.asgi:app",
+        host=settings.SERVER_HOST,
+        port=settings.SERVER_PORT,
+        timeout_graceful_shutdown=int(settings.SERVER_DRAIN_TIMEOUT),
+        log_level=settings.LOG_LEVEL.lower(),
+    )
+
+
+if __name__ == "__main__":
+    serve()
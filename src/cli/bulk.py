@@ -0,0 +1,312 @@
+"""
+Route a large JSONL or CSV export of queries offline.
+
+Examples:
+    python -m src.cli.bulk tickets.jsonl --output routed.jsonl
+    python -m src.cli.bulk tickets.csv --field body --id-field ticket_id --handle --workers 8 --output routed.jsonl
+    python -m src.cli.bulk tickets.jsonl --output routed.jsonl --resume
+
+The input is read lazily and only a bounded window of batches is in flight,
+so memory stays flat however large the file is. Progress is checkpointed next
+to the output file; ``--resume`` continues a crashed or interrupted run from
+the last checkpoint.
+"""
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from src.config.settings import settings
+from src.utils.logging_config import logger
+from src.router.router import Router
+
+# (input position, query or None when the record has none, record id)
+Record = Tuple[int, Optional[str], Any]
+
+
+def read_records(path: str, input_format: str, field: str, id_field: Optional[str] = None) -> Iterator[Record]:
+    """Yield the query of every input record, one at a time.
+
+    JSONL lines are either a JSON string or an object holding ``field``; CSV
+    files need a header row with a ``field`` column.
+    """
+    with open(path, "r", encoding="utf-8", newline="") as input_file:
+        if input_format == "csv":
+            for index, row in enumerate(csv.DictReader(input_file)):
+                yield index, row.get(field) or None, row.get(id_field) if id_field else None
+            return
+
+        index = 0
+        for line in input_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+            if isinstance(item, dict):
+                query = item.get(field)
+                yield index, query if isinstance(query, str) and query.strip() else None, item.get(id_field) if id_field else None
+            else:
+                yield index, item if isinstance(item, str) and item.strip() else None, None
+            index += 1
+
+
+def chunked(records: Iterable[Record], size: int) -> Iterator[List[Record]]:
+    chunk: List[Record] = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class Checkpoint:
+    """Which input records are already in the output file, and how many bytes of it are valid.
+
+    Records finish out of order, so progress is a watermark (every position up
+    to it is done) plus the few positions finished beyond it.
+    """
+
+    def __init__(self, path: str, input_path: str):
+        self.path = path
+        self.input_path = os.path.abspath(input_path)
+        self.watermark = -1
+        self.done_above: Set[int] = set()
+        self.output_bytes = 0
+
+    @classmethod
+    def load(cls, path: str, input_path: str) -> Optional["Checkpoint"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as checkpoint_file:
+            data = json.load(checkpoint_file)
+        checkpoint = cls(path, input_path)
+        if data.get("input") != checkpoint.input_path:
+            raise ValueError(f"Checkpoint {path} belongs to {data.get('input')}, not {checkpoint.input_path}")
+        checkpoint.watermark = data["watermark"]
+        checkpoint.done_above = set(data["done_above"])
+        checkpoint.output_bytes = data["output_bytes"]
+        return checkpoint
+
+    @property
+    def completed(self) -> int:
+        return self.watermark + 1 + len(self.done_above)
+
+    def is_done(self, position: int) -> bool:
+        return position <= self.watermark or position in self.done_above
+
+    def mark_done(self, position: int) -> None:
+        self.done_above.add(position)
+        while self.watermark + 1 in self.done_above:
+            self.watermark += 1
+            self.done_above.discard(self.watermark)
+
+    def save(self, output_bytes: int) -> None:
+        """Atomically record progress; ``output_bytes`` must already be flushed to disk"""
+        self.output_bytes = output_bytes
+        data = {
+            "input": self.input_path,
+            "watermark": self.watermark,
+            "done_above": sorted(self.done_above),
+            "output_bytes": output_bytes,
+        }
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as checkpoint_file:
+            json.dump(data, checkpoint_file)
+        os.replace(temporary, self.path)
+
+    def remove(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Progress:
+    """Live throughput on stderr"""
+
+    def __init__(self, interval: float, already_done: int = 0):
+        self.interval = interval
+        self.already_done = already_done
+        self.done = 0
+        self.errors = 0
+        self.started = time.perf_counter()
+        self._last_report = self.started
+        self._last_done = 0
+
+    def update(self, results: List[Dict[str, Any]]) -> None:
+        self.done += len(results)
+        self.errors += sum(1 for result in results if "error" in result)
+        now = time.perf_counter()
+        if self.interval and now - self._last_report >= self.interval:
+            recent = (self.done - self._last_done) / (now - self._last_report)
+            self._last_report, self._last_done = now, self.done
+            sys.stderr.write(f"\r{self.line()} (now {recent:.1f}/s)   ")
+            sys.stderr.flush()
+
+    def line(self) -> str:
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        return f"{self.already_done + self.done} routed, {self.errors} errors, {rate:.1f}/s"
+
+    def finish(self) -> None:
+        elapsed = time.perf_counter() - self.started
+        sys.stderr.write(f"\r{self.line()} in {elapsed:.1f}s" + " " * 16 + "\n")
+
+
+def route_chunk(router: Router, chunk: List[Record], handle: bool) -> List[Dict[str, Any]]:
+    """Classify a chunk with one batched model call, then optionally run each handler"""
+    results = []
+    for position, query, record_id in chunk:
+        result: Dict[str, Any] = {"index": position, "query": query}
+        if record_id is not None:
+            result["id"] = record_id
+        if query is None:
+            result["error"] = "record has no query"
+        results.append(result)
+
+    routable = [result for result in results if "error" not in result]
+    try:
+        queries = [result["query"] for result in routable]
+        if len(queries) > 1:
+            decisions = router.classify_many(queries)
+        else:
+            decisions = [router.classify_query(query) for query in queries]
+    except Exception as e:
+        for result in routable:
+            result["error"] = str(e)
+        return results
+
+    for result, routing_decision in zip(routable, decisions):
+        result["decision"] = routing_decision.to_dict()
+        if not handle:
+            continue
+        try:
+            response = router.dispatch(result["query"], routing_decision)
+        except Exception as e:
+            result["error"] = str(e)
+            continue
+        result["response"] = {
+            "response": response.response,
+            "handler_name": response.handler_name,
+            "metadata": response.metadata,
+        }
+    return results
+
+
+def run(args: argparse.Namespace) -> int:
+    input_format = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    checkpoint_path = args.output + ".checkpoint"
+
+    checkpoint = Checkpoint.load(checkpoint_path, args.input) if args.resume else None
+    if args.resume and checkpoint is None and os.path.exists(args.output):
+        # The checkpoint is removed once a run completes, so the output is most likely finished
+        print(f"No checkpoint at '{checkpoint_path}' to resume {args.output} from; "
+              "rerun without --resume to overwrite it", file=sys.stderr)
+        return 1
+    if checkpoint is not None:
+        # Drop anything written after the last checkpoint; those records are routed again
+        output_file = open(args.output, "r+b" if os.path.exists(args.output) else "w+b")
+        output_file.truncate(checkpoint.output_bytes)
+        output_file.seek(checkpoint.output_bytes)
+        logger.info("Resuming %s after %s completed records", args.input, checkpoint.completed)
+    else:
+        checkpoint = Checkpoint(checkpoint_path, args.input)
+        output_file = open(args.output, "wb")
+
+    router = Router()
+    progress = Progress(args.progress_interval, already_done=checkpoint.completed)
+    records = (record for record in read_records(args.input, input_format, args.field, args.id_field)
+               if not checkpoint.is_done(record[0]))
+    max_pending = args.workers * 2
+    pending: Deque[Future] = deque()
+    since_checkpoint = 0
+
+    def write(results: List[Dict[str, Any]]) -> None:
+        nonlocal since_checkpoint
+        for result in results:
+            output_file.write(json.dumps(result, default=str).encode("utf-8") + b"\n")
+            checkpoint.mark_done(result["index"])
+        progress.update(results)
+        since_checkpoint += len(results)
+        if since_checkpoint >= args.checkpoint_every:
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            checkpoint.save(output_file.tell())
+            since_checkpoint = 0
+
+    def collect_one() -> None:
+        # A batch leaves ``pending`` once finished but before it is written, so an
+        # interrupt neither loses it nor has the handler below write it again
+        if args.ordered:
+            results = pending[0].result()
+            pending.popleft()
+            write(results)
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            write(future.result())
+
+    interrupted = False
+    pool = ThreadPoolExecutor(max_workers=args.workers)
+    try:
+        for chunk in chunked(records, args.batch_size):
+            pending.append(pool.submit(route_chunk, router, chunk, args.handle))
+            while len(pending) >= max_pending:
+                collect_one()
+        while pending:
+            collect_one()
+    except KeyboardInterrupt:
+        interrupted = True
+        pool.shutdown(wait=True, cancel_futures=True)
+        # Keep the batches that finished before the interrupt (in ordered mode, only up to the first gap)
+        for future in pending:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                write(future.result())
+            elif args.ordered:
+                break
+    finally:
+        pool.shutdown(wait=True)
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        checkpoint.save(output_file.tell())
+        output_file.close()
+        progress.finish()
+
+    if interrupted:
+        sys.stderr.write(f"Interrupted; rerun with --resume to continue from {checkpoint_path}\n")
+        return 130
+    checkpoint.remove()
+    return 1 if progress.errors and args.fail_on_error else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Route a JSONL or CSV file of queries in bulk")
+    parser.add_argument("input", help="JSONL (string or object per line) or CSV file with a header row")
+    parser.add_argument("--output", "-o", required=True, help="JSONL file to write results to")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="input format (defaults to the file extension)")
+    parser.add_argument("--field", default="query", help="field or column holding the query")
+    parser.add_argument("--id-field", help="field or column copied to the output as 'id'")
+    parser.add_argument("--handle", action="store_true", help="also run the selected handler for every query")
+    parser.add_argument("--workers", type=int, default=4, help="batches routed concurrently")
+    parser.add_argument("--batch-size", type=int, default=settings.CLASSIFY_BATCH_MAX_SIZE,
+                        help="queries classified together in one model call")
+    parser.add_argument("--ordered", action="store_true", help="write results in input order")
+    parser.add_argument("--resume", action="store_true", help="continue from the output's checkpoint")
+    parser.add_argument("--checkpoint-every", type=int, default=500, help="records between checkpoints")
+    parser.add_argument("--progress-interval", type=float, default=1.0, help="seconds between progress updates (0 = off)")
+    parser.add_argument("--fail-on-error", action="store_true", help="exit non-zero if any record failed")
+    args = parser.parse_args()
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+Summarize the binary route log written by the router.
+
+Examples:
+    ROUTE_LOG_PATH=data/routing_events.bin python -m src.cli.route_stats
+    python -m src.cli.route_stats --log data/routing_events.bin --since 3600 --column generate_ms
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from src.config.settings import settings
+from src.utils.route_log import RECORD_DTYPE, RouteLogReader
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Summarize the binary route log")
+    parser.add_argument("--log", default=settings.ROUTE_LOG_PATH, help="route log written with ROUTE_LOG_PATH")
+    parser.add_argument("--since", type=float, help="only routes from the last N seconds")
+    parser.add_argument("--column", choices=RECORD_DTYPE.names, help="also print percentiles of this column")
+    parser.add_argument("--tail", type=int, default=0, help="print the last N routed queries")
+    args = parser.parse_args()
+
+    if not args.log or not os.path.exists(args.log):
+        print(f"No route log at '{args.log}'; route some queries with ROUTE_LOG_PATH set first", file=sys.stderr)
+        return 1
+
+    reader = RouteLogReader(args.log)
+    try:
+        mask = reader.since(time.time() - args.since) if args.since else None
+        summary = reader.summary(mask)
+        if args.column:
+            summary[args.column] = reader.percentiles(args.column, mask=mask)
+        print(json.dumps(summary, indent=2))
+        for index in range(max(len(reader) - args.tail, 0), len(reader)):
+            print(f"{reader.handler(index):<28} {reader.records[index]['route_ms']:>9.1f} ms  {reader.query(index)}")
+    finally:
+        reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
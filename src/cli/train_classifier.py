@@ -0,0 +1,106 @@
+"""
+Train the local classifier on the routing decisions logged by the LLM classifier.
+
+Examples:
+    DECISION_LOG_PATH=data/routing_decisions.jsonl python -m src.cli.train_classifier
+    python -m src.cli.train_classifier --log data/routing_decisions.jsonl --target-agreement 0.98
+
+Run it again as the log grows: the router picks up the new model file without
+a restart, and a larger log usually means more queries clear the threshold.
+"""
+
+from collections import Counter
+from typing import Dict, Tuple
+import argparse
+import os
+import sys
+import numpy as np
+from src.config.settings import settings
+from src.models.routing import QueryCategory
+from src.router.local_classifier import LocalClassifier, calibrate_threshold
+from src.utils.classification_cache import normalize_query
+from src.utils.decision_log import read_decisions
+
+
+def load_examples(path: str, min_confidence: float) -> Dict[str, Tuple[str, QueryCategory]]:
+    """Latest confident decision per normalized query"""
+    examples: Dict[str, Tuple[str, QueryCategory]] = {}
+    for entry in read_decisions(path):
+        if float(entry.get("confidence", 0.0)) < min_confidence:
+            continue
+        try:
+            category = QueryCategory(entry["category"])
+        except ValueError:
+            continue
+        if category != QueryCategory.UNKNOWN:
+            examples[normalize_query(entry["query"])] = (entry["query"], category)
+    return examples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Train the local routing classifier from the decision log")
+    parser.add_argument("--log", default=settings.DECISION_LOG_PATH, help="JSONL decision log")
+    parser.add_argument("--output", default=settings.LOCAL_CLASSIFIER_PATH, help="where to write the model")
+    parser.add_argument("--min-examples", type=int, default=200, help="refuse to train on fewer unique queries")
+    parser.add_argument("--min-confidence", type=float, default=settings.DEFAULT_CONFIDENCE_THRESHOLD,
+                        help="ignore LLM decisions below this confidence")
+    parser.add_argument("--target-agreement", type=float, default=0.97,
+                        help="agreement with the LLM required above the served threshold")
+    parser.add_argument("--validation-share", type=float, default=0.2, help="held out to calibrate the threshold")
+    parser.add_argument("--features", type=int, default=2 ** 16, help="hashed feature dimensions")
+    parser.add_argument("--iterations", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if not args.log or not os.path.exists(args.log):
+        print(f"No decision log at '{args.log}'; route some queries with DECISION_LOG_PATH set first", file=sys.stderr)
+        return 1
+    examples = list(load_examples(args.log, args.min_confidence).values())
+    if len(examples) < args.min_examples:
+        print(f"Only {len(examples)} unique logged queries; need {args.min_examples} to train", file=sys.stderr)
+        return 1
+
+    order = np.random.default_rng(args.seed).permutation(len(examples))
+    held_out = max(1, int(len(examples) * args.validation_share))
+    train = [examples[index] for index in order[held_out:]]
+    validation = [examples[index] for index in order[:held_out]]
+    print(f"Training on {len(train)} queries, calibrating on {len(validation)}")
+    for category, count in Counter(category for _, category in examples).most_common():
+        print(f"  {category.value:<24} {count}")
+
+    classifier = LocalClassifier.fit(
+        [query for query, _ in train],
+        [category for _, category in train],
+        n_features=args.features,
+        iterations=args.iterations,
+    )
+
+    probabilities = classifier.predict_proba([query for query, _ in validation])
+    predicted = [classifier.categories[index] for index in probabilities.argmax(axis=1)]
+    confidence = probabilities.max(axis=1)
+    correct = np.array([guess == category for guess, (_, category) in zip(predicted, validation)], dtype=np.float64)
+    classifier.threshold = calibrate_threshold(confidence, correct, args.target_agreement, min_support=max(10, held_out // 20))
+
+    served = confidence >= classifier.threshold
+    classifier.report = {
+        "examples": len(examples),
+        "validation_accuracy": round(float(correct.mean()), 4),
+        "coverage": round(float(served.mean()), 4),
+        "served_agreement": round(float(correct[served].mean()), 4) if served.any() else None,
+    }
+    classifier.save(args.output)
+
+    print(f"Validation agreement with the LLM: {classifier.report['validation_accuracy']:.1%}")
+    if served.any():
+        print(
+            f"Threshold {classifier.threshold:.3f}: {classifier.report['coverage']:.1%} of queries served locally "
+            f"at {classifier.report['served_agreement']:.1%} agreement"
+        )
+    else:
+        print(f"No threshold reaches {args.target_agreement:.0%} agreement yet; the classifier will only run in shadow")
+    print(f"Model written to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
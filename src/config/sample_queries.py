@@ -0,0 +1,66 @@
+from typing import Dict, List, Tuple
+from src.models.routing import QueryCategory
+
+# Sample questions organized by category, shown in the Streamlit sidebar
+SAMPLE_QUESTIONS = {
+    "General Inquiries": [
+        "What are your business hours?",
+        "Where are you located?",
+        "Do you offer international shipping?",
+        "What payment methods do you accept?"
+    ],
+    "Refund & Returns": [
+        "I want to return my order #12345, it arrived damaged",
+        "How long do I have to return an item?",
+        "My package never arrived, can I get a refund?",
+        "I received the wrong item in my order"
+    ],
+    "Technical Support": [
+        "My app keeps crashing when I try to log in",
+        "The website won't load on my browser",
+        "I'm getting error code E404 on the screen",
+        "How do I reset my password?"
+    ],
+    "Billing Questions": [
+        "Why was I charged twice for my subscription?",
+        "I don't recognize this charge on my card",
+        "How can I update my payment method?",
+        "When will I receive my invoice?"
+    ],
+    "Product Recommendations": [
+        "Can you recommend a good laptop for programming?",
+        "What's the best phone for photography?",
+        "I need a gift for a 10-year-old, any suggestions?",
+        "Which of your products is best for beginners?"
+    ]
+}
+
+SAMPLE_QUESTION_CATEGORIES = {
+    "General Inquiries": QueryCategory.GENERAL_INQUIRY,
+    "Refund & Returns": QueryCategory.REFUND_REQUEST,
+    "Technical Support": QueryCategory.TECHNICAL_SUPPORT,
+    "Billing Questions": QueryCategory.BILLING_QUESTION,
+    "Product Recommendations": QueryCategory.PRODUCT_RECOMMENDATION,
+}
+
+# Example queries representing different categories, run by main.py
+DEMO_QUERIES: List[Tuple[str, QueryCategory]] = [
+    ("What are your business hours?", QueryCategory.GENERAL_INQUIRY),
+    ("I want to return my order #12345, it arrived damaged", QueryCategory.REFUND_REQUEST),
+    ("My app keeps crashing when I try to log in", QueryCategory.TECHNICAL_SUPPORT),
+    ("Why was I charged twice for my subscription?", QueryCategory.BILLING_QUESTION),
+    ("Can you recommend a good laptop for programming?", QueryCategory.PRODUCT_RECOMMENDATION),
+    ("The screen is showing error code E404", QueryCategory.TECHNICAL_SUPPORT),
+    ("I need help choosing between your premium and basic plans", QueryCategory.PRODUCT_RECOMMENDATION),
+]
+
+
+def labeled_examples() -> List[Tuple[str, QueryCategory]]:
+    """All sample and demo queries with their expected category, without duplicates"""
+    examples: Dict[str, QueryCategory] = {}
+    for group, questions in SAMPLE_QUESTIONS.items():
+        for question in questions:
+            examples.setdefault(question, SAMPLE_QUESTION_CATEGORIES[group])
+    for query, category in DEMO_QUERIES:
+        examples.setdefault(query, category)
+    return list(examples.items())
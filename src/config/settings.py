@@ -1,3 +1,4 @@
+import json
 import os
 from dotenv import load_dotenv
 
@@ -7,10 +8,145 @@ class Settings:
     # Ollama settings
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3")
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
+    # Comma-separated list of Ollama hosts to balance across (defaults to OLLAMA_HOST)
+    OLLAMA_HOSTS = [host.strip() for host in os.getenv("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+    OLLAMA_HEALTH_CHECK_INTERVAL = float(os.getenv("OLLAMA_HEALTH_CHECK_INTERVAL", "10"))
+    OLLAMA_SLOW_HOST_FACTOR = float(os.getenv("OLLAMA_SLOW_HOST_FACTOR", "3.0"))
+    OLLAMA_AFFINITY_WINDOW = float(os.getenv("OLLAMA_AFFINITY_WINDOW", "300"))
+    # Seconds or a duration such as "30m"; -1 keeps models loaded indefinitely
+    OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "-1")
+    WARMUP_ON_START = os.getenv("WARMUP_ON_START", "true").lower() == "true"
+    OLLAMA_TIMEOUT = float(os.getenv("OLLAMA_TIMEOUT", "120"))
+    OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+    OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+    OLLAMA_RETRY_BACKOFF = float(os.getenv("OLLAMA_RETRY_BACKOFF", "0.5"))
+    OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "100"))
+    OLLAMA_KEEPALIVE_CONNECTIONS = int(os.getenv("OLLAMA_KEEPALIVE_CONNECTIONS", "20"))
+    CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+    CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
     
     # Router settings
     DEFAULT_CONFIDENCE_THRESHOLD = float(os.getenv("DEFAULT_CONFIDENCE_THRESHOLD", "0.7"))
     ENABLE_FALLBACK_HANDLER = os.getenv("ENABLE_FALLBACK_HANDLER", "true").lower() == "true"
+    MAX_CONCURRENT_ROUTES = int(os.getenv("MAX_CONCURRENT_ROUTES", "64"))
+    
+    # Tiered models: a small classifier, per-category handler models and a
+    # larger model for low-confidence routes (empty values fall back to OLLAMA_MODEL)
+    CLASSIFIER_MODEL = os.getenv("CLASSIFIER_MODEL", "")
+    # Comma-separated category=model pairs, e.g. "technical_support=gemma3:12b"
+    HANDLER_MODELS = dict(
+        (category.strip(), model.strip())
+        for category, _, model in (pair.partition("=") for pair in os.getenv("HANDLER_MODELS", "").split(","))
+        if model.strip()
+    )
+    # JSON object of Ollama options per category, e.g. {"general_inquiry": {"num_predict": 200}}
+    HANDLER_OPTIONS = json.loads(os.getenv("HANDLER_OPTIONS", "") or "{}")
+    ESCALATION_MODEL = os.getenv("ESCALATION_MODEL", "")
+    
+    # JSON-constrained classification, parsed while it streams
+    CLASSIFY_EARLY_EXIT = os.getenv("CLASSIFY_EARLY_EXIT", "true").lower() == "true"
+    CLASSIFY_BACKGROUND_REASONING = os.getenv("CLASSIFY_BACKGROUND_REASONING", "false").lower() == "true"
+    
+    # Batched classification
+    CLASSIFIER_CONTEXT_WINDOW = int(os.getenv("CLASSIFIER_CONTEXT_WINDOW", "2048"))
+    CLASSIFY_BATCH_MAX_SIZE = int(os.getenv("CLASSIFY_BATCH_MAX_SIZE", "25"))
+    
+    # Semantic fast-path router
+    ENABLE_SEMANTIC_ROUTER = os.getenv("ENABLE_SEMANTIC_ROUTER", "false").lower() == "true"
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+    SEMANTIC_INDEX_PATH = os.getenv("SEMANTIC_INDEX_PATH", "data/semantic_index.npy")
+    SEMANTIC_MIN_SIMILARITY = float(os.getenv("SEMANTIC_MIN_SIMILARITY", "0.5"))
+    SEMANTIC_TEMPERATURE = float(os.getenv("SEMANTIC_TEMPERATURE", "0.02"))
+    
+    # Local extraction of order numbers, error codes and product names
+    PRODUCT_CATALOG_PATH = os.getenv("PRODUCT_CATALOG_PATH", "")
+    
+    # Classification cache
+    ENABLE_CLASSIFICATION_CACHE = os.getenv("ENABLE_CLASSIFICATION_CACHE", "true").lower() == "true"
+    CLASSIFICATION_CACHE_SIZE = int(os.getenv("CLASSIFICATION_CACHE_SIZE", "1024"))
+    CLASSIFICATION_CACHE_TTL = float(os.getenv("CLASSIFICATION_CACHE_TTL", "3600"))
+    CLASSIFICATION_CACHE_DB = os.getenv("CLASSIFICATION_CACHE_DB", "")
+    CLASSIFICATION_CACHE_DB_MAX_ENTRIES = int(os.getenv("CLASSIFICATION_CACHE_DB_MAX_ENTRIES", "100000"))
+    
+    # Semantic response cache (opt-in, never used for sensitive handlers)
+    ENABLE_RESPONSE_CACHE = os.getenv("ENABLE_RESPONSE_CACHE", "false").lower() == "true"
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+    
+    # Speculative handler execution (AsyncRouter)
+    ENABLE_SPECULATION = os.getenv("ENABLE_SPECULATION", "false").lower() == "true"
+    SPECULATION_MIN_CONFIDENCE = float(os.getenv("SPECULATION_MIN_CONFIDENCE", "0.6"))
+    
+    # Multi-intent routing: off, auto (when keywords of two categories appear) or always
+    MULTI_INTENT = os.getenv("MULTI_INTENT", "off").lower()
+    MULTI_INTENT_THRESHOLD = float(os.getenv("MULTI_INTENT_THRESHOLD", "0.5"))
+    MULTI_INTENT_MAX = int(os.getenv("MULTI_INTENT_MAX", "3"))
+    
+    # Decision log and the local classifier distilled from it (off, shadow or serve).
+    # The log holds customer queries in plain text, so it is opt-in
+    DECISION_LOG_PATH = os.getenv("DECISION_LOG_PATH", "")
+    LOCAL_CLASSIFIER_PATH = os.getenv("LOCAL_CLASSIFIER_PATH", "data/local_classifier.npz")
+    LOCAL_CLASSIFIER_MODE = os.getenv("LOCAL_CLASSIFIER_MODE", "off").lower()
+    LOCAL_CLASSIFIER_RELOAD_SECONDS = float(os.getenv("LOCAL_CLASSIFIER_RELOAD_SECONDS", "60"))
+    
+    # Binary log of every finished route, read with python -m src.cli.route_stats
+    ROUTE_LOG_PATH = os.getenv("ROUTE_LOG_PATH", "")
+    
+    # Conversation memory: token budgets for the history sent with each prompt
+    CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "true").lower() == "true"
+    CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "1024"))
+    # Comma-separated model=tokens pairs overriding the budget, e.g. "gemma3:1b=512,gemma3:12b=2048"
+    CONVERSATION_MODEL_BUDGETS = dict(
+        (model.strip(), int(tokens))
+        for model, _, tokens in (pair.partition("=") for pair in os.getenv("CONVERSATION_MODEL_BUDGETS", "").split(","))
+        if tokens.strip()
+    )
+    CONVERSATION_CLASSIFY_TOKENS = int(os.getenv("CONVERSATION_CLASSIFY_TOKENS", "256"))
+    CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "256"))
+    CONVERSATION_SUMMARY_MODEL = os.getenv("CONVERSATION_SUMMARY_MODEL", "")
+    CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+    CONVERSATION_TTL = float(os.getenv("CONVERSATION_TTL", "3600"))
+    # Turns kept per session when summarizing fails; the oldest are dropped beyond it
+    CONVERSATION_MAX_TURNS = int(os.getenv("CONVERSATION_MAX_TURNS", "50"))
+    
+    # Single-flight: identical in-flight queries share one classification / answer
+    COALESCE_CLASSIFICATION = os.getenv("COALESCE_CLASSIFICATION", "true").lower() == "true"
+    COALESCE_RESPONSES = os.getenv("COALESCE_RESPONSES", "false").lower() == "true"
+    
+    # Deadlines in seconds (0 disables); stage deadlines never outlive the route's
+    ROUTE_TIMEOUT = float(os.getenv("ROUTE_TIMEOUT", "90")) or None
+    CLASSIFY_TIMEOUT = float(os.getenv("CLASSIFY_TIMEOUT", "15")) or None
+    GENERATE_TIMEOUT = float(os.getenv("GENERATE_TIMEOUT", "75")) or None
+    
+    # Hedged classification: duplicate requests slower than HEDGE_PERCENTILE on another host,
+    # spending at most HEDGE_BUDGET extra requests per classification
+    ENABLE_HEDGING = os.getenv("ENABLE_HEDGING", "false").lower() == "true"
+    HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+    HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+    HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+    
+    # Admission scheduler for handler generations (AsyncRouter and the HTTP server)
+    ENABLE_SCHEDULER = os.getenv("ENABLE_SCHEDULER", "false").lower() == "true"
+    SCHEDULER_CONCURRENCY = int(os.getenv("SCHEDULER_CONCURRENCY", "16"))
+    SCHEDULER_POLICIES = json.loads(os.getenv("SCHEDULER_POLICIES", "") or "{}")
+    SCHEDULER_OVERLOAD_POLICY = os.getenv("SCHEDULER_OVERLOAD_POLICY", "shed")
+    
+    # HTTP server
+    SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+    SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+    SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "64"))
+    SERVER_QUEUE_SIZE = int(os.getenv("SERVER_QUEUE_SIZE", "256"))
+    SERVER_BATCH_WINDOW_MS = float(os.getenv("SERVER_BATCH_WINDOW_MS", "10"))
+    SERVER_DRAIN_TIMEOUT = float(os.getenv("SERVER_DRAIN_TIMEOUT", "30"))
+    SERVER_MAX_BODY_BYTES = int(os.getenv("SERVER_MAX_BODY_BYTES", "65536"))
+    
+    # Streamlit demo: shared worker threads, answer polling and history paging
+    APP_WORKERS = int(os.getenv("APP_WORKERS", "8"))
+    APP_MAX_PENDING = int(os.getenv("APP_MAX_PENDING", "64"))
+    APP_POLL_SECONDS = float(os.getenv("APP_POLL_SECONDS", "0.5"))
+    APP_HISTORY_PAGE_SIZE = int(os.getenv("APP_HISTORY_PAGE_SIZE", "10"))
+    
+    # Metrics (0 disables the Prometheus exporter)
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -1,35 +1,135 @@
 from abc import ABC, abstractmethod
-import ollama
-from src.utils.logging_config import logger
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Tuple, Union
+from src.config.settings import settings
+from src.utils.conversation import current_conversation
+from src.utils.llm_client import LLMClient, get_llm_client
 from src.models.responses import HandlerResponse
 from src.models.routing import RoutingDecision
 
 
 class BaseHandler(ABC):
     """Abstract base class for specialized handlers"""
-    
-    def __init__(self, model_name: str = "gemma3"):
-        self.model_name = model_name
-        self.client = ollama
-    
+
+    # Handlers dealing with account or payment data must never share responses
+    sensitive_data = False
+
+    # Static system prompt sent first on every call, so the server can reuse its cached prefix
+    system_prompt = ""
+
+    # Default Ollama generation options (num_predict, num_ctx, ...) for this handler
+    generation_options: Dict[str, Any] = {}
+
+    def __init__(
+        self,
+        model_name: str = None,
+        client: Optional[LLMClient] = None,
+        options: Optional[Dict[str, Any]] = None,
+        escalation_model: Optional[str] = None,
+    ):
+        self.model_name = model_name or settings.OLLAMA_MODEL
+        self.client = client or get_llm_client()
+        self.options = {**self.generation_options, **(options or {})}
+        self.escalation_model = escalation_model
+
     @abstractmethod
+    def build_prompt(self, query: str, routing_decision: RoutingDecision) -> Tuple[str, str]:
+        """Return the (prompt, system_prompt) pair used to answer the query"""
+
+    @abstractmethod
+    def build_response(self, response: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Wrap the generated text in a HandlerResponse"""
+
+    def model_for(self, routing_decision: RoutingDecision) -> str:
+        """Model that answers this decision; low-confidence routes go to the escalation model"""
+        if self.escalation_model and routing_decision.confidence < settings.DEFAULT_CONFIDENCE_THRESHOLD:
+            return self.escalation_model
+        return self.model_name
+
+    def finish_response(self, response: str, routing_decision: RoutingDecision, model: str) -> HandlerResponse:
+        """Build the HandlerResponse and record which model produced it"""
+        handler_response = self.build_response(response, routing_decision)
+        handler_response.metadata["model"] = model
+        return handler_response
+
     def handle(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
         """Process the query and return a response"""
-        
+        response = self.generate(query, routing_decision)
+        return self.finish_response(response, routing_decision, self.model_for(routing_decision))
 
-    def _call_llm(self, prompt: str, system_prompt: str = "") -> str:
-        """Helper method to call Ollama"""
+    async def handle_async(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Process the query without blocking the event loop"""
+        response = await self.generate_async(query, routing_decision)
+        return self.finish_response(response, routing_decision, self.model_for(routing_decision))
+
+    def generate(self, query: str, routing_decision: RoutingDecision) -> str:
+        """Generate the response text without wrapping it in a HandlerResponse"""
+        prompt, system_prompt = self.build_prompt(query, routing_decision)
+        return self._call_llm(prompt, system_prompt, self.model_for(routing_decision))
+
+    async def generate_async(self, query: str, routing_decision: RoutingDecision) -> str:
+        """Async version of generate"""
+        prompt, system_prompt = self.build_prompt(query, routing_decision)
+        return await self._call_llm_async(prompt, system_prompt, self.model_for(routing_decision))
+
+    def handle_stream(self, query: str, routing_decision: RoutingDecision) -> Iterator[Union[str, HandlerResponse]]:
+        """Yield response text as it is generated, then the complete HandlerResponse"""
+        prompt, system_prompt = self.build_prompt(query, routing_decision)
+        model = self.model_for(routing_decision)
+        chunks = []
+        for chunk in self._call_llm_stream(prompt, system_prompt, model):
+            chunks.append(chunk)
+            yield chunk
+        yield self.finish_response("".join(chunks), routing_decision, model)
+
+    async def handle_stream_async(
+        self, query: str, routing_decision: RoutingDecision
+    ) -> AsyncIterator[Union[str, HandlerResponse]]:
+        """Async version of handle_stream"""
+        prompt, system_prompt = self.build_prompt(query, routing_decision)
+        model = self.model_for(routing_decision)
+        chunks = []
+        async for chunk in self._call_llm_stream_async(prompt, system_prompt, model):
+            chunks.append(chunk)
+            yield chunk
+        yield self.finish_response("".join(chunks), routing_decision, model)
+
+    def _build_messages(self, prompt: str, system_prompt: str = "", model: str = None) -> list:
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
+        # Earlier turns of the session go after the static system prompt, within the model's history budget
+        conversation = current_conversation()
+        if conversation is not None:
+            messages.extend(conversation.messages(model or self.model_name))
         messages.append({"role": "user", "content": prompt})
-        
-        try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages
-            )
-            return response['message']['content']
-        except Exception as e:
-            logger.error("Error calling Ollama: %s", str(e))
-           
\ No newline at end of file
+        return messages
+
+    def _call_llm(self, prompt: str, system_prompt: str = "", model: str = None) -> str:
+        """Helper method to call Ollama; raises LLMClientError on failure"""
+        messages = self._build_messages(prompt, system_prompt, model)
+        response = self.client.chat(messages, model=model or self.model_name, options=self.options or None)
+        return response['message']['content']
+
+    async def _call_llm_async(self, prompt: str, system_prompt: str = "", model: str = None) -> str:
+        """Helper method to call Ollama through the async client"""
+        messages = self._build_messages(prompt, system_prompt, model)
+        response = await self.client.chat_async(messages, model=model or self.model_name, options=self.options or None)
+        return response['message']['content']
+
+    def _call_llm_stream(self, prompt: str, system_prompt: str = "", model: str = None) -> Iterator[str]:
+        """Helper method to stream a response from Ollama chunk by chunk"""
+        messages = self._build_messages(prompt, system_prompt, model)
+        for part in self.client.chat_stream(messages, model=model or self.model_name, options=self.options or None):
+            content = part['message']['content']
+            if content:
+                yield content
+
+    async def _call_llm_stream_async(self, prompt: str, system_prompt: str = "", model: str = None) -> AsyncIterator[str]:
+        """Helper method to stream a response through the async client"""
+        messages = self._build_messages(prompt, system_prompt, model)
+        async for part in self.client.chat_stream_async(
+            messages, model=model or self.model_name, options=self.options or None
+        ):
+            content = part['message']['content']
+            if content:
+                yield content
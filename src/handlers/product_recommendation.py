@@ -1,22 +1,26 @@
+from typing import Tuple
 from src.handlers.base import BaseHandler
 from src.models.responses import HandlerResponse
 from src.models.routing import RoutingDecision
 
 class ProductRecommendationHandler(BaseHandler):
     """Handles product recommendation requests"""
-    
-    def handle(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
-        system_prompt = """You are a product recommendation specialist.
+
+    system_prompt = """You are a product recommendation specialist.
         Help customers find products that match their needs.
         Ask about preferences, budget, and use cases when needed.
         Provide personalized recommendations with clear reasoning."""
-        
+
+    generation_options = {"num_predict": 512}
+    
+    def build_prompt(self, query: str, routing_decision: RoutingDecision) -> Tuple[str, str]:
         prompt = f"""Customer is looking for: {query}
         
         Please provide helpful product recommendations."""
         
-        response = self._call_llm(prompt, system_prompt)
-        
+        return prompt, self.system_prompt
+
+    def build_response(self, response: str, routing_decision: RoutingDecision) -> HandlerResponse:
         return HandlerResponse(
             response=response,
             metadata={
@@ -24,4 +28,4 @@ class ProductRecommendationHandler(BaseHandler):
                 "personalized": True
             },
             handler_name="ProductRecommendationHandler"
-        )
\ No newline at end of file
+        )
@@ -1,18 +1,21 @@
+from typing import Tuple
 from src.handlers.base import BaseHandler
 from src.models.responses import HandlerResponse
 from src.models.routing import RoutingDecision
 
 class RefundRequestHandler(BaseHandler):
     """Handles refund and return requests"""
-    
-    def handle(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
-        system_prompt = """You are a customer service specialist handling refund and return requests.
+
+    system_prompt = """You are a customer service specialist handling refund and return requests.
         Be empathetic and solution-oriented. Follow company policy:
         - Refunds are available within 30 days of purchase
         - Items must be in original condition
         - Customer needs order number and reason for return
         Always be polite and try to resolve issues satisfactorily."""
-        
+
+    generation_options = {"num_predict": 384}
+    
+    def build_prompt(self, query: str, routing_decision: RoutingDecision) -> Tuple[str, str]:
         # Extract any order information if available
         order_info = routing_decision.extracted_info.get("order_number", "Not provided")
         
@@ -22,8 +25,11 @@ class RefundRequestHandler(BaseHandler):
         
         Please handle this refund request appropriately, asking for any missing information needed."""
         
-        response = self._call_llm(prompt, system_prompt)
-        
+        return prompt, self.system_prompt
+
+    def build_response(self, response: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        order_info = routing_decision.extracted_info.get("order_number", "Not provided")
+
         return HandlerResponse(
             response=response,
             metadata={
@@ -32,4 +38,4 @@ class RefundRequestHandler(BaseHandler):
                 "requires_followup": True
             },
             handler_name="RefundRequestHandler"
-        )
\ No newline at end of file
+        )
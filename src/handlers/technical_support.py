@@ -1,3 +1,4 @@
+from typing import Tuple
 from src.handlers.base import BaseHandler
 from src.models.responses import HandlerResponse
 from src.models.routing import RoutingDecision
@@ -5,19 +6,22 @@ from src.models.routing import RoutingDecision
 
 class TechnicalSupportHandler(BaseHandler):
     """Handles technical support queries"""
-    
-    def handle(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
-        system_prompt = """You are a technical support specialist.
+
+    system_prompt = """You are a technical support specialist.
         Provide clear, step-by-step solutions to technical problems.
         Ask clarifying questions when needed to diagnose issues.
         Be patient and avoid using too much technical jargon."""
-        
+
+    generation_options = {"num_predict": 768}
+    
+    def build_prompt(self, query: str, routing_decision: RoutingDecision) -> Tuple[str, str]:
         prompt = f"""Technical issue: {query}
         
         Please provide troubleshooting steps or a solution."""
         
-        response = self._call_llm(prompt, system_prompt)
-        
+        return prompt, self.system_prompt
+
+    def build_response(self, response: str, routing_decision: RoutingDecision) -> HandlerResponse:
         return HandlerResponse(
             response=response,
             metadata={
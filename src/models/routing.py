@@ -10,9 +10,29 @@ class QueryCategory(Enum):
     PRODUCT_RECOMMENDATION = "product_recommendation"
     UNKNOWN = "unknown"
 
-@dataclass
+# Slotted: one is created per routed query, so no per-instance __dict__
+@dataclass(slots=True)
 class RoutingDecision:
     category: QueryCategory
     confidence: float
     reasoning: str
-    extracted_info: Dict[str, Any]
\ No newline at end of file
+    extracted_info: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable representation of the decision"""
+        return {
+            "category": self.category.value,
+            "confidence": self.confidence,
+            "reasoning": self.reasoning,
+            "extracted_info": dict(self.extracted_info),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RoutingDecision":
+        """Rebuild a decision produced by to_dict"""
+        return cls(
+            category=QueryCategory(data["category"]),
+            confidence=float(data["confidence"]),
+            reasoning=data.get("reasoning", ""),
+            extracted_info=dict(data.get("extracted_info") or {}),
+        )
@@ -0,0 +1,393 @@
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple, Union
+import asyncio
+import functools
+import time
+from src.config.settings import settings
+from src.utils.logging_config import logger
+from src.models.routing import QueryCategory, RoutingDecision
+from src.models.responses import HandlerResponse
+from src.handlers.base import BaseHandler
+from src.router.caching import Classification
+from src.router.fan_out import answer_intents_async, intents_to_answer
+from src.router.router import Router
+from src.router.scheduler import AdmissionRejected, AdmissionScheduler
+from src.router.speculation import SpeculationStats
+from src.utils.conversation import Conversation, aiterate_using, current_conversation, has_history, using
+from src.utils.deadline import aiterate_until, deadline, expires_in, until
+from src.utils.llm_client import LLMClientError
+from src.utils.metrics import Span, Trace, aiterate_in_span, finish_span, metrics, span, trace
+from src.utils.tokens import estimate_tokens
+
+# Returned in place of a handler answer when the scheduler degrades a query it cannot serve in time
+BUSY_MESSAGE = (
+    "We're handling an unusually high number of requests right now. "
+    "Please try again shortly or contact our support team."
+)
+
+
+class _Speculation:
+    """A handler generation started before classification finished"""
+
+    def __init__(self, category: QueryCategory, model: str, task: asyncio.Task, prompt_tokens: int):
+        self.category = category
+        self.model = model
+        self.task = task
+        self.prompt_tokens = prompt_tokens
+
+
+class AsyncRouter(Router):
+    """Router that classifies and handles queries on the asyncio event loop.
+
+    Shares prompts, parsing, handlers and the pooled LLMClient with the
+    synchronous Router, but awaits the async client so many routes can be in
+    flight at once. ``max_concurrency`` caps how many routes run at the same time; any
+    other keyword arguments are passed on to Router.
+
+    With ``speculative`` enabled, a cheap keyword prediction starts the likely
+    handler while the authoritative classification is still running. The
+    speculative answer is kept when both agree and cancelled otherwise. With
+    a scheduler, speculation only runs in an idle slot and holds it until
+    the generation ends, so it never delays or outnumbers real queries.
+
+    With a ``scheduler`` (or ``ENABLE_SCHEDULER``), handler generations wait
+    for an AdmissionScheduler slot, which serves categories by priority and
+    sheds or degrades queries that would miss their deadline.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        max_concurrency: Optional[int] = None,
+        speculative: Optional[bool] = None,
+        scheduler: Optional[AdmissionScheduler] = None,
+        **router_options,
+    ):
+        super().__init__(model_name, **router_options)
+        self.max_concurrency = max_concurrency or settings.MAX_CONCURRENT_ROUTES
+        self._semaphores = {}
+
+        if scheduler is None and settings.ENABLE_SCHEDULER:
+            scheduler = AdmissionScheduler.from_settings(settings.SCHEDULER_CONCURRENCY, settings.SCHEDULER_POLICIES)
+        self.scheduler = scheduler
+
+        self.speculative = settings.ENABLE_SPECULATION if speculative is None else speculative
+        self.speculation_stats = SpeculationStats()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        """Return the concurrency limiter bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores = {loop: semaphore}
+        return semaphore
+
+    async def classify_query_async(self, query: str) -> RoutingDecision:
+        """Classify the query without blocking the event loop"""
+
+        with deadline(settings.CLASSIFY_TIMEOUT), span("classify") as classify_span:
+            if has_history():
+                routing_decision, source = await self.classifier.classify_async(query), "conversation"
+            else:
+                routing_decision, source = await self.caches.cached_decision_async(query, self.classifier.model), "cache"
+            if routing_decision is None:
+                routing_decision, source = await self.caches.coalesce_classification_async(
+                    query, self.classifier.model, lambda: self._classify_uncached_async(query)
+                )
+            classify_span.set(category=routing_decision.category.value, source=source)
+
+        return self._attach_extracted_info(query, routing_decision)
+
+    async def classify_intents_async(self, query: str) -> List[RoutingDecision]:
+        """Async version of classify_intents"""
+        if not self.may_have_several_intents(query):
+            return [await self.classify_query_async(query)]
+
+        with deadline(settings.CLASSIFY_TIMEOUT), span("classify", source="multi_intent") as classify_span:
+            intents = await self.classifier.classify_intents_async(query)
+            if intents:
+                classify_span.set(category=intents[0].category.value, intents=len(intents))
+
+        if not intents:
+            return [await self.classify_query_async(query)]
+        return [self._attach_extracted_info(query, routing_decision) for routing_decision in intents]
+
+    async def _classify_uncached_async(self, query: str) -> Classification:
+        prediction = self.learner.predict(query)
+        routing_decision, source = self.learner.serve(prediction), "local"
+        if routing_decision is None and self.semantic_router is not None:
+            routing_decision, source = await asyncio.to_thread(self._fast_path, query), "semantic"
+        if routing_decision is None:
+            routing_decision, source = await self.classifier.classify_async(query), "llm"
+            await self.learner.learn_async(query, routing_decision, prediction, self.classifier.model)
+        await self.caches.store_decision_async(query, self.classifier.model, routing_decision)
+        return routing_decision, source
+
+    async def _admit(self, category: QueryCategory) -> Optional[float]:
+        """Wait for a scheduler slot; returns when it was granted, or None without a scheduler"""
+        if self.scheduler is None:
+            return None
+        with span("admit", category=category.value):
+            await self.scheduler.acquire(category)
+        return time.perf_counter()
+
+    def _release(self, category: QueryCategory, admitted: Optional[float]) -> None:
+        if admitted is not None:
+            self.scheduler.release(category, time.perf_counter() - admitted)
+
+    def _overload_response(self, handler: BaseHandler, error: AdmissionRejected) -> HandlerResponse:
+        """Shed (re-raise) or degrade a query the scheduler turned away"""
+        metrics.rejections.inc(reason=error.reason, category=error.category.value)
+        if settings.SCHEDULER_OVERLOAD_POLICY != "degrade":
+            raise error
+        logger.warning("Degrading %s: %s", type(handler).__name__, str(error))
+        return HandlerResponse(
+            response=BUSY_MESSAGE,
+            metadata={"degraded": True, "reason": error.reason},
+            handler_name=type(handler).__name__
+        )
+
+    async def _handle_async(self, handler: BaseHandler, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Generate an answer under the scheduler, sharing it with identical in-flight queries"""
+
+        async def generate() -> HandlerResponse:
+            admitted = await self._admit(routing_decision.category)
+            try:
+                # The generation deadline starts once the query holds a slot
+                with deadline(settings.GENERATE_TIMEOUT):
+                    return await handler.handle_async(query, routing_decision)
+            finally:
+                self._release(routing_decision.category, admitted)
+
+        return await self.caches.handle_async(handler, query, routing_decision, generate)
+
+    async def dispatch_async(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Run the selected handler for an existing routing decision"""
+        handler = self._select_handler(routing_decision)
+        with span("generate", **self._generate_attributes(handler, routing_decision)) as generate_span:
+            try:
+                vector = None
+                if self.caches.uses_response_cache(handler, routing_decision):
+                    cached, vector = await self.caches.lookup_response_async(routing_decision, query)
+                    if cached is not None:
+                        logger.info("Serving %s response from cache", routing_decision.category.value)
+                        generate_span.set(source="response_cache")
+                        return cached
+
+                response = await self._handle_async(handler, query, routing_decision)
+            except LLMClientError as e:
+                generate_span.set(source="fallback")
+                return self._fallback_response(handler, e)
+            except AdmissionRejected as e:
+                generate_span.set(source="shed")
+                return self._overload_response(handler, e)
+
+        if vector is not None:
+            self.caches.store_response(routing_decision, vector, response)
+        return response
+
+    async def dispatch_intents_async(self, query: str, intents: List[RoutingDecision]) -> HandlerResponse:
+        """Answer every confident intent concurrently and merge the answers"""
+        return await answer_intents_async(self.dispatch_async, query, intents)
+
+    async def route_query_async(
+        self, query: str, session_id: Optional[str] = None
+    ) -> Tuple[HandlerResponse, RoutingDecision]:
+        """Classify and route the query, respecting the concurrency cap"""
+
+        async with self._semaphore():
+            logger.info("Routing query: %s ", query[:50])
+            started = time.perf_counter()
+            conversation = self.conversation(session_id)
+
+            with deadline(settings.ROUTE_TIMEOUT), trace() as route_trace, using(conversation):
+                speculation = self._start_speculation(query) if self.speculative else None
+                try:
+                    intents = await self.classify_intents_async(query)
+                except BaseException:
+                    if speculation is not None:
+                        speculation.task.cancel()
+                    raise
+                routing_decision = intents[0]
+                logger.info("Classification: %s  (confidence: %s)", routing_decision.category.value, routing_decision.confidence)
+                self.predictor.observe(routing_decision.category)
+
+                response = None
+                if speculation is not None and len(intents_to_answer(intents)) > 1:
+                    # The speculative answer covers one intent of the unfocused query
+                    speculation.task.cancel()
+                    self.speculation_stats.record_miss(speculation.prompt_tokens)
+                elif speculation is not None:
+                    response = await self._resolve_speculation(speculation, routing_decision)
+                if response is None:
+                    response = await self.dispatch_intents_async(query, intents)
+
+        return await self.finish_route_async(route_trace, routing_decision, response, started, query, conversation), routing_decision
+
+    async def finish_route_async(
+        self,
+        route_trace: Trace,
+        routing_decision: RoutingDecision,
+        response: HandlerResponse,
+        started: float,
+        query: Optional[str] = None,
+        conversation: Optional[Conversation] = None,
+    ) -> HandlerResponse:
+        """finish_route, with the route log written off the event loop"""
+        return await self.recorder.finish_async(route_trace, routing_decision, response, started, query, conversation)
+
+    def _start_speculation(self, query: str) -> Optional[_Speculation]:
+        """Start the predicted handler if the keyword guess is confident enough"""
+        category, confidence = self.predictor.predict(query)
+        if category is None or confidence < settings.SPECULATION_MIN_CONFIDENCE:
+            return None
+
+        provisional = RoutingDecision(
+            category=category,
+            confidence=confidence,
+            reasoning="Speculative keyword prediction",
+            extracted_info=self.extractor.extract(query)
+        )
+        handler = self.get_handler(provisional)
+        if self.caches.uses_response_cache(handler, provisional):
+            # A cache lookup is cheaper than a speculative generation
+            return None
+
+        admitted = None
+        if self.scheduler is not None:
+            # Only an idle slot, so a speculative generation never takes one from a real query
+            if not self.scheduler.try_acquire(category):
+                return None
+            admitted = time.perf_counter()
+
+        prompt, system_prompt = handler.build_prompt(query, provisional)
+        attributes = dict(self._generate_attributes(handler, provisional), source="speculation")
+        task = asyncio.create_task(self._speculate(handler, query, provisional, attributes))
+        if admitted is not None:
+            # A done callback also runs for a task cancelled before it started
+            task.add_done_callback(functools.partial(self._release_speculation, category, admitted))
+        return _Speculation(category, handler.model_for(provisional), task, estimate_tokens(system_prompt + prompt))
+
+    @staticmethod
+    async def _speculate(handler: BaseHandler, query: str, provisional: RoutingDecision, attributes: Dict[str, str]) -> str:
+        # Timed as its own stage so wasted generations show up in the metrics
+        with deadline(settings.GENERATE_TIMEOUT), span("generate.speculative", **attributes):
+            return await handler.generate_async(query, provisional)
+
+    def _release_speculation(self, category: QueryCategory, admitted: float, task: asyncio.Task) -> None:
+        if task.cancelled() or task.exception() is not None:
+            # An abandoned generation says nothing about the category's service time
+            self.scheduler.release(category)
+        else:
+            self._release(category, admitted)
+
+    async def _resolve_speculation(
+        self, speculation: _Speculation, routing_decision: RoutingDecision
+    ) -> Optional[HandlerResponse]:
+        """Keep the speculative answer if the classifier agrees, otherwise cancel it"""
+        handler = self.get_handler(routing_decision)
+        if speculation.category == routing_decision.category and speculation.model == handler.model_for(routing_decision):
+            self.speculation_stats.record_hit()
+            try:
+                text = await speculation.task
+            except LLMClientError as e:
+                return self._fallback_response(handler, e)
+            return handler.finish_response(text, routing_decision, speculation.model)
+
+        wasted_tokens = speculation.prompt_tokens
+        if speculation.task.done() and not speculation.task.cancelled() and speculation.task.exception() is None:
+            wasted_tokens += estimate_tokens(speculation.task.result() or "")
+        speculation.task.cancel()
+        self.speculation_stats.record_miss(wasted_tokens)
+        logger.info(
+            "Speculation missed: predicted %s on %s, classified %s for %s",
+            speculation.category.value, speculation.model,
+            routing_decision.category.value, handler.model_for(routing_decision)
+        )
+        return None
+
+    async def route_many_async(self, queries: Iterable[str]) -> List[Tuple[HandlerResponse, RoutingDecision]]:
+        """Route several queries concurrently, returning results in input order"""
+        return await asyncio.gather(*(self.route_query_async(query) for query in queries))
+
+    async def route_query_stream_async(
+        self, query: str, session_id: Optional[str] = None
+    ) -> AsyncIterator[Union[RoutingDecision, str, HandlerResponse]]:
+        """Async version of route_query_stream"""
+
+        async with self._semaphore():
+            logger.info("Routing query (streaming): %s ", query[:50])
+            started = time.perf_counter()
+            route_trace = Trace()
+            route_expires = expires_in(settings.ROUTE_TIMEOUT)
+            conversation = self.conversation(session_id)
+
+            with trace(route_trace), until(route_expires), using(conversation):
+                routing_decision = await self.classify_query_async(query)
+            logger.info("Classification: %s  (confidence: %s)", routing_decision.category.value, routing_decision.confidence)
+            yield routing_decision
+
+            stream = aiterate_using(self.dispatch_stream_async(query, routing_decision, route_trace, started), conversation)
+            async for event in aiterate_until(stream, route_expires):
+                yield event
+
+    async def dispatch_stream_async(
+        self,
+        query: str,
+        routing_decision: RoutingDecision,
+        route_trace: Optional[Trace] = None,
+        started: Optional[float] = None,
+    ) -> AsyncIterator[Union[str, HandlerResponse]]:
+        """Stream the selected handler's answer for an existing routing decision.
+
+        Yields response text chunks, then the final HandlerResponse with the
+        route's timings. Pass the ``route_trace`` and ``started`` time of the
+        route when classification happened elsewhere. The conversation active
+        when the stream starts (see conversation.using) gets the answer as its
+        latest turn.
+        """
+        route_trace = route_trace or Trace()
+        started = time.perf_counter() if started is None else started
+        conversation = current_conversation()
+
+        with trace(route_trace):
+            handler = self._select_handler(routing_decision)
+        generate_span = Span("generate", self._generate_attributes(handler, routing_decision))
+        vector = None
+        if self.caches.uses_response_cache(handler, routing_decision):
+            cached, vector = await self.caches.lookup_response_async(routing_decision, query)
+            if cached is not None:
+                generate_span.set(source="response_cache")
+                finish_span(generate_span, route_trace)
+                yield cached.response
+                yield await self.finish_route_async(route_trace, routing_decision, cached, started, query, conversation)
+                return
+
+        try:
+            with trace(route_trace):
+                admitted = await self._admit(routing_decision.category)
+        except AdmissionRejected as e:
+            generate_span.set(source="shed")
+            finish_span(generate_span, route_trace)
+            degraded = self._overload_response(handler, e)
+            yield degraded.response
+            yield await self.finish_route_async(route_trace, routing_decision, degraded, started, query, conversation)
+            return
+
+        try:
+            stream = aiterate_until(handler.handle_stream_async(query, routing_decision), expires_in(settings.GENERATE_TIMEOUT))
+            async for event in aiterate_in_span(stream, generate_span):
+                if isinstance(event, HandlerResponse):
+                    finish_span(generate_span, route_trace)
+                    if vector is not None:
+                        self.caches.store_response(routing_decision, vector, event)
+                    event = await self.finish_route_async(route_trace, routing_decision, event, started, query, conversation)
+                yield event
+        except LLMClientError as e:
+            generate_span.set(source="fallback")
+            finish_span(generate_span, route_trace)
+            fallback = self._fallback_response(handler, e)
+            yield fallback.response
+            yield await self.finish_route_async(route_trace, routing_decision, fallback, started, query, conversation)
+        finally:
+            self._release(routing_decision.category, admitted)
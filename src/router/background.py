@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+import threading
+from src.models.responses import HandlerResponse
+from src.models.routing import RoutingDecision
+from src.router.router import Router
+from src.utils.logging_config import logger
+
+
+class RouteJob:
+    """One query routed in the background; callers poll it for the streamed progress"""
+
+    def __init__(self, query: str, session_id: Optional[str] = None):
+        self.query = query
+        self.session_id = session_id
+        self.submitted = datetime.now()
+        self.routing_decision: Optional[RoutingDecision] = None
+        self.response: Optional[HandlerResponse] = None
+        self.error: Optional[str] = None
+        self._chunks: List[str] = []
+        self._done = threading.Event()
+
+    @property
+    def text(self) -> str:
+        """The answer streamed so far"""
+        return "".join(self._chunks)
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+
+class BackgroundRouter:
+    """Routes queries on a fixed pool of threads so callers never block on a model call.
+
+    Built for UIs that re-run on every interaction (Streamlit): the page
+    submits a query, gets a RouteJob back at once and polls it while the
+    answer streams in. One shared router serves every session, and at most
+    ``max_pending`` jobs wait or run at a time; beyond that ``submit``
+    returns None so the caller can ask the user to retry.
+    """
+
+    def __init__(self, router: Router, workers: int = 8, max_pending: int = 64):
+        self.router = router
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.running = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="route-worker")
+
+    def submit(self, query: str, session_id: Optional[str] = None) -> Optional[RouteJob]:
+        """Queue a query, or return None when ``max_pending`` jobs are already waiting or running"""
+        with self._lock:
+            if self.pending >= self.max_pending:
+                return None
+            self.pending += 1
+        job = RouteJob(query, session_id)
+        self._pool.submit(self._run, job)
+        return job
+
+    def _run(self, job: RouteJob) -> None:
+        with self._lock:
+            self.running += 1
+        try:
+            for event in self.router.route_query_stream(job.query, job.session_id):
+                if isinstance(event, RoutingDecision):
+                    job.routing_decision = event
+                elif isinstance(event, HandlerResponse):
+                    job.response = event
+                else:
+                    job._chunks.append(event)
+        except Exception as e:
+            logger.error("Background routing failed: %s", str(e))
+            job.error = str(e)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.pending -= 1
+            job._done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"workers": self.workers, "running": self.running, "queued": self.pending - self.running}
@@ -0,0 +1,188 @@
+"""Reuse of routing work across queries.
+
+Classification decisions are cached by ClassificationCache, keyed on the
+normalized query, the classifier model and the prompt version, with an
+optional SQLite tier (``CLASSIFICATION_CACHE_DB``) that survives restarts.
+Handler answers go to the opt-in semantic ResponseCache
+(``ENABLE_RESPONSE_CACHE``); handlers marked ``sensitive_data`` always
+generate fresh answers.
+
+Concurrent requests for the same normalized query wait on one in-flight
+classification (``COALESCE_CLASSIFICATION``) and, with
+``COALESCE_RESPONSES``, on one non-sensitive handler answer. Shared results
+are counted in ``routing_coalesced_total``. Follow-ups in a conversation
+skip all of this, since their answers depend on the conversation.
+"""
+from typing import Awaitable, Callable, Optional, Tuple
+import asyncio
+import hashlib
+import numpy as np
+from src.config.settings import settings
+from src.handlers.base import BaseHandler
+from src.models.responses import HandlerResponse
+from src.models.routing import QueryCategory, RoutingDecision
+from src.router.prompts import PROMPT_VERSION, classification_failed
+from src.utils.classification_cache import ClassificationCache, normalize_query
+from src.utils.conversation import has_history
+from src.utils.llm_client import DeadlineExceeded
+from src.utils.response_cache import ResponseCache
+from src.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+# (decision, source) as reported in the classify span
+Classification = Tuple[RoutingDecision, str]
+
+
+class RouteCaches:
+    """The classification and response caches, and the flights that coalesce identical in-flight queries"""
+
+    def __init__(
+        self,
+        classification_cache: Optional[ClassificationCache] = None,
+        response_cache: Optional[ResponseCache] = None,
+        coalesce_classification: bool = False,
+        coalesce_responses: bool = False,
+    ):
+        self.classification_cache = classification_cache
+        self.response_cache = response_cache
+        self.classification_flight = SingleFlight("classification") if coalesce_classification else None
+        self.response_flight = SingleFlight("response") if coalesce_responses else None
+        self.async_classification_flight = AsyncSingleFlight("classification") if coalesce_classification else None
+        self.async_response_flight = AsyncSingleFlight("response") if coalesce_responses else None
+
+    @classmethod
+    def from_settings(cls) -> "RouteCaches":
+        classification_cache = None
+        if settings.ENABLE_CLASSIFICATION_CACHE:
+            classification_cache = ClassificationCache(
+                max_entries=settings.CLASSIFICATION_CACHE_SIZE,
+                ttl_seconds=settings.CLASSIFICATION_CACHE_TTL,
+                db_path=settings.CLASSIFICATION_CACHE_DB or None,
+                max_db_entries=settings.CLASSIFICATION_CACHE_DB_MAX_ENTRIES,
+            )
+        response_cache = None
+        if settings.ENABLE_RESPONSE_CACHE:
+            response_cache = ResponseCache(max_entries_per_category=settings.RESPONSE_CACHE_MAX_ENTRIES)
+        return cls(classification_cache, response_cache, settings.COALESCE_CLASSIFICATION, settings.COALESCE_RESPONSES)
+
+    @staticmethod
+    def classification_key(query: str, model: str) -> str:
+        return ClassificationCache.make_key(query, model, PROMPT_VERSION)
+
+    def cached_decision(self, query: str, model: str) -> Optional[RoutingDecision]:
+        """Look the query up in the classification cache, if one is configured"""
+        if self.classification_cache is None:
+            return None
+        return self.classification_cache.get(self.classification_key(query, model))
+
+    async def cached_decision_async(self, query: str, model: str) -> Optional[RoutingDecision]:
+        """cached_decision, off the event loop when the lookup may reach the SQLite tier"""
+        if self.classification_cache is not None and self.classification_cache.persistent:
+            return await asyncio.to_thread(self.cached_decision, query, model)
+        return self.cached_decision(query, model)
+
+    def store_decision(self, query: str, model: str, routing_decision: RoutingDecision) -> None:
+        """Cache a successful classification; failures are always retried"""
+        if self.classification_cache is None or routing_decision.category == QueryCategory.UNKNOWN:
+            return
+        self.classification_cache.set(self.classification_key(query, model), routing_decision)
+
+    async def store_decision_async(self, query: str, model: str, routing_decision: RoutingDecision) -> None:
+        if self.classification_cache is not None and self.classification_cache.persistent:
+            await asyncio.to_thread(self.store_decision, query, model, routing_decision)
+        else:
+            self.store_decision(query, model, routing_decision)
+
+    def coalesce_classification(self, query: str, model: str, classify: Callable[[], Classification]) -> Classification:
+        """Run ``classify``, or share the result of an identical classification already in flight"""
+        if self.classification_flight is None:
+            return classify()
+        try:
+            (routing_decision, source), shared = self.classification_flight.do(self.classification_key(query, model), classify)
+        except DeadlineExceeded as e:
+            # Raised to a caller whose deadline passed while waiting; the leader reports failures as UNKNOWN
+            return classification_failed(e), "coalesced"
+        if shared:
+            return RoutingDecision.from_dict(routing_decision.to_dict()), "coalesced"
+        return routing_decision, source
+
+    async def coalesce_classification_async(
+        self, query: str, model: str, classify: Callable[[], Awaitable[Classification]]
+    ) -> Classification:
+        """Async version of coalesce_classification"""
+        if self.async_classification_flight is None:
+            return await classify()
+        try:
+            (routing_decision, source), shared = await self.async_classification_flight.do(
+                self.classification_key(query, model), classify
+            )
+        except DeadlineExceeded as e:
+            return classification_failed(e), "coalesced"
+        if shared:
+            return RoutingDecision.from_dict(routing_decision.to_dict()), "coalesced"
+        return routing_decision, source
+
+    def uses_response_cache(self, handler: BaseHandler, routing_decision: RoutingDecision) -> bool:
+        """Sensitive handlers, uncovered categories and conversation follow-ups always generate fresh answers"""
+        return (
+            self.response_cache is not None
+            and not handler.sensitive_data
+            and self.response_cache.covers(routing_decision.category)
+            and not has_history()
+        )
+
+    def lookup_response(self, routing_decision: RoutingDecision, query: str) -> Tuple[Optional[HandlerResponse], Optional[np.ndarray]]:
+        """The cached answer or None, and the query vector to store a fresh answer under"""
+        return self.response_cache.lookup(routing_decision.category, query)
+
+    async def lookup_response_async(
+        self, routing_decision: RoutingDecision, query: str
+    ) -> Tuple[Optional[HandlerResponse], Optional[np.ndarray]]:
+        # Embedding the query is a blocking model call
+        return await asyncio.to_thread(self.response_cache.lookup, routing_decision.category, query)
+
+    def store_response(self, routing_decision: RoutingDecision, vector: np.ndarray, response: HandlerResponse) -> None:
+        """Cache a copy, so the timings and usage finish_route adds to this route never reach later hits"""
+        if not response.metadata.get("sensitive_data"):
+            self.response_cache.store(routing_decision.category, vector, self.copy_response(response, False))
+
+    @staticmethod
+    def _coalesces_responses(flight, handler: BaseHandler) -> bool:
+        """Sensitive answers are personal and follow-ups depend on their conversation, so neither is shared"""
+        return flight is not None and not handler.sensitive_data and not has_history()
+
+    def handle(self, handler: BaseHandler, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Run the handler, or share the answer to an identical query already in flight"""
+        if not self._coalesces_responses(self.response_flight, handler):
+            return handler.handle(query, routing_decision)
+        response, shared = self.response_flight.do(
+            self.response_key(handler, query, routing_decision), lambda: handler.handle(query, routing_decision)
+        )
+        return self.copy_response(response, shared)
+
+    async def handle_async(
+        self,
+        handler: BaseHandler,
+        query: str,
+        routing_decision: RoutingDecision,
+        generate: Callable[[], Awaitable[HandlerResponse]],
+    ) -> HandlerResponse:
+        """Await ``generate``, or share the answer to an identical query already in flight"""
+        if not self._coalesces_responses(self.async_response_flight, handler):
+            return await generate()
+        response, shared = await self.async_response_flight.do(
+            self.response_key(handler, query, routing_decision), generate
+        )
+        return self.copy_response(response, shared)
+
+    @staticmethod
+    def response_key(handler: BaseHandler, query: str, routing_decision: RoutingDecision) -> str:
+        raw = "\x1f".join((type(handler).__name__, handler.model_for(routing_decision), normalize_query(query)))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def copy_response(response: HandlerResponse, shared: bool) -> HandlerResponse:
+        """Give every caller of a coalesced call its own response to annotate"""
+        metadata = {key: value for key, value in response.metadata.items() if key not in ("timings", "usage")}
+        if shared:
+            metadata["coalesced"] = True
+        return HandlerResponse(response=response.response, metadata=metadata, handler_name=response.handler_name)
@@ -0,0 +1,408 @@
+"""Classification with the classifier model.
+
+``CLASSIFIER_MODEL`` runs on a small model; a decision whose confidence
+falls below ``DEFAULT_CONFIDENCE_THRESHOLD`` is re-classified by
+``ESCALATION_MODEL``. The model answers in JSON mode and is parsed as it
+streams, so generation stops once ``category`` and ``confidence`` are
+complete (``CLASSIFY_EARLY_EXIT``); with ``CLASSIFY_BACKGROUND_REASONING``
+the reasoning finishes in the background.
+
+With ``ENABLE_HEDGING``, a classification still unanswered after the
+``HEDGE_PERCENTILE`` of recent latencies is sent again to another host and
+the first valid answer wins. Hedges are capped at ``HEDGE_BUDGET`` of
+classification requests (see HedgePolicy).
+"""
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Set
+import asyncio
+import contextvars
+import json
+import queue
+import re
+import threading
+import time
+from src.config.settings import settings
+from src.utils.logging_config import logger
+from src.utils.hedging import HedgePolicy
+from src.utils.json_stream import IncrementalJSONParser
+from src.utils.llm_client import LLMClient, LLMClientError
+from src.utils.metrics import Span, finish_span, span
+from src.utils.tokens import estimate_tokens
+from src.models.routing import QueryCategory, RoutingDecision
+from src.router.prompts import (
+    BATCH_CLASSIFICATION_SYSTEM_PROMPT,
+    BATCH_ITEM_OUTPUT_TOKENS,
+    CLASSIFIER_OPTIONS,
+    MULTI_INTENT_OPTIONS,
+    batch_classification_messages,
+    build_batch_classification_prompt,
+    classification_failed,
+    classification_messages,
+    decision_from_result,
+    multi_intent_messages,
+    parse_batch_classification,
+    parse_classification,
+    parse_intents,
+)
+
+
+class LLMClassifier:
+    """Asks the classifier model for routing decisions, through the sync or the async client"""
+
+    def __init__(
+        self,
+        client: LLMClient,
+        model: str,
+        escalation_model: Optional[str] = None,
+        hedging: Optional[HedgePolicy] = None,
+    ):
+        self.client = client
+        self.model = model
+        self.escalation_model = escalation_model
+        self.hedging = hedging
+        # Context window of the classifier model, looked up on first batch
+        self._num_ctx: Optional[int] = None
+        # Classification streams left running to fill in reasoning
+        self._background_tasks: Set[asyncio.Task] = set()
+
+    @classmethod
+    def from_settings(cls, client: LLMClient, model_name: str) -> "LLMClassifier":
+        """Classifier configured by CLASSIFIER_MODEL (defaulting to ``model_name``), ESCALATION_MODEL and ENABLE_HEDGING"""
+        hedging = None
+        if settings.ENABLE_HEDGING:
+            hedging = HedgePolicy(settings.HEDGE_PERCENTILE, settings.HEDGE_BUDGET, settings.HEDGE_MIN_SAMPLES)
+        return cls(client, settings.CLASSIFIER_MODEL or model_name, settings.ESCALATION_MODEL or None, hedging)
+
+    def warm_up(self) -> None:
+        """Load the classifier models and prime their prompt prefix"""
+        if self.escalation_model:
+            self.client.warm_up(self.escalation_model, classification_messages("", self.model), options=CLASSIFIER_OPTIONS)
+        # Classification runs on every query, so its prefix is primed last
+        self.client.warm_up(self.model, classification_messages("", self.model), options=CLASSIFIER_OPTIONS)
+
+    def classify(self, query: str) -> RoutingDecision:
+        """Ask the classifier model for a routing decision, escalating if it is unsure"""
+        routing_decision = self._classify_with_model(query, self.model)
+        if self.needs_escalation(routing_decision):
+            routing_decision = self.escalate(query, routing_decision)
+        return routing_decision
+
+    def needs_escalation(self, routing_decision: RoutingDecision) -> bool:
+        return (
+            self.escalation_model is not None
+            and self.escalation_model != self.model
+            and routing_decision.confidence < settings.DEFAULT_CONFIDENCE_THRESHOLD
+        )
+
+    def escalate(self, query: str, routing_decision: RoutingDecision) -> RoutingDecision:
+        """Re-classify a low-confidence decision with the escalation model"""
+        self._log_escalation(routing_decision)
+        escalated = self._classify_with_model(query, self.escalation_model)
+        return routing_decision if escalated.category == QueryCategory.UNKNOWN else escalated
+
+    def _log_escalation(self, routing_decision: RoutingDecision) -> None:
+        logger.info(
+            "Escalating classification to %s (confidence %.2f)", self.escalation_model, routing_decision.confidence
+        )
+
+    def _classify_with_model(self, query: str, model: str) -> RoutingDecision:
+        """Classify with one model, hedging on another host if it is slower than usual"""
+        if self.hedging is None:
+            return self._attempt(query, model)
+        started = time.monotonic()
+        delay = self.hedging.delay()
+        if not self.hedging.start() or delay is None:
+            routing_decision = self._attempt(query, model)
+            self.hedging.finish(time.monotonic() - started)
+            return routing_decision
+
+        # Both attempts run on their own threads so the caller can take whichever answers first
+        results: queue.Queue = queue.Queue()
+        hosts: List[str] = []
+        cancels: List[threading.Event] = []
+
+        def launch(hedge: bool) -> None:
+            cancelled = threading.Event()
+            cancels.append(cancelled)
+            context = contextvars.copy_context()
+
+            def attempt() -> None:
+                try:
+                    results.put((hedge, context.run(self._attempt, query, model, hosts, cancelled, hedge)))
+                except Exception as e:
+                    results.put((hedge, classification_failed(e)))
+
+            threading.Thread(target=attempt, daemon=True).start()
+
+        launch(hedge=False)
+        try:
+            outcome = results.get(timeout=delay)
+        except queue.Empty:
+            outcome = None
+            if self.hedging.try_hedge():
+                logger.info("Hedging classification on %s after %.0f ms", model, delay * 1000)
+                launch(hedge=True)
+
+        finished = 0
+        while True:
+            hedge, routing_decision = outcome or results.get()
+            outcome = None
+            finished += 1
+            # A failed attempt only wins if the other one fails too
+            if routing_decision.category != QueryCategory.UNKNOWN or finished == len(cancels):
+                break
+        for cancelled in cancels:
+            cancelled.set()
+        self.hedging.finish(time.monotonic() - started, hedge_won=hedge)
+        return routing_decision
+
+    def _attempt(
+        self,
+        query: str,
+        model: str,
+        avoid_hosts: Optional[List[str]] = None,
+        cancelled: Optional[threading.Event] = None,
+        hedge: bool = False,
+    ) -> Optional[RoutingDecision]:
+        """Classify with one model call.
+
+        The answer is constrained to JSON and parsed while it streams, so the
+        decision is ready as soon as category and confidence are complete.
+        Returns None if ``cancelled`` is set first (another attempt won).
+        """
+
+        parser = IncrementalJSONParser()
+        parse_span = Span("classify.parse", {"model": model})
+        parse_seconds = 0.0
+
+        with span("classify.llm", model=model, source="hedge" if hedge else None):
+            stream = self.client.chat_stream(
+                classification_messages(query, self.model),
+                model=model,
+                avoid_hosts=avoid_hosts,
+                format="json",
+                options=CLASSIFIER_OPTIONS
+            )
+            try:
+                for part in stream:
+                    if cancelled is not None and cancelled.is_set():
+                        stream.close()
+                        return None
+                    started = time.perf_counter()
+                    parser.feed(part['message']['content'])
+                    parse_seconds += time.perf_counter() - started
+                    if self._ready(parser):
+                        break
+            except (LLMClientError, KeyError) as e:
+                stream.close()
+                return classification_failed(e)
+
+        routing_decision = self._streamed_decision(parser)
+        finish_span(parse_span, duration=parse_seconds)
+        if "reasoning" in parser.fields or not settings.CLASSIFY_BACKGROUND_REASONING:
+            stream.close()
+        else:
+            threading.Thread(
+                target=self._complete_reasoning, args=(stream, parser, routing_decision), daemon=True
+            ).start()
+        return routing_decision
+
+    @staticmethod
+    def _ready(parser: IncrementalJSONParser) -> bool:
+        """Whether generation can stop because the routing fields are complete"""
+        return settings.CLASSIFY_EARLY_EXIT and "category" in parser.fields and "confidence" in parser.fields
+
+    @staticmethod
+    def _streamed_decision(parser: IncrementalJSONParser) -> RoutingDecision:
+        """Build the decision from the streamed fields, or parse whatever arrived"""
+        if "category" in parser.fields and "confidence" in parser.fields:
+            try:
+                return decision_from_result(parser.fields)
+            except (TypeError, ValueError) as e:
+                return classification_failed(e)
+        return parse_classification(parser.buffer)
+
+    @staticmethod
+    def _complete_reasoning(stream: Iterator, parser: IncrementalJSONParser, routing_decision: RoutingDecision) -> None:
+        """Read the rest of a classification stream to fill in its reasoning"""
+        try:
+            for part in stream:
+                if "reasoning" in parser.feed(part['message']['content']):
+                    routing_decision.reasoning = str(parser.fields["reasoning"])
+                    break
+        except (LLMClientError, KeyError) as e:
+            logger.warning("Could not complete classification reasoning: %s", str(e))
+        finally:
+            stream.close()
+
+    def classify_intents(self, query: str) -> List[RoutingDecision]:
+        """Every request in the query, most confident first; empty if the model fails to split it"""
+        try:
+            response = self.client.chat(
+                multi_intent_messages(query, self.model),
+                model=self.model,
+                format="json",
+                options=MULTI_INTENT_OPTIONS
+            )
+            return parse_intents(response['message']['content'])
+        except (LLMClientError, KeyError) as e:
+            logger.error("Multi-intent classification failed: %s", str(e))
+            return []
+
+    def classify_batch(self, queries: List[str]) -> Dict[int, RoutingDecision]:
+        """Classify one planned batch with a single model call; answers that fail validation are left out"""
+        try:
+            response = self.client.chat(
+                batch_classification_messages(queries),
+                model=self.model,
+                format="json",
+                options={**CLASSIFIER_OPTIONS, "num_predict": BATCH_ITEM_OUTPUT_TOKENS * len(queries) + 32}
+            )
+            return parse_batch_classification(response['message']['content'], len(queries))
+        except (LLMClientError, KeyError) as e:
+            logger.error("Error parsing batch classification response: %s", str(e))
+            return {}
+
+    def plan_batches(self, queries: List[str]) -> List[List[int]]:
+        """Group query indexes into batches that fit the context window"""
+        budget = int(self._context_window() * 0.9) - estimate_tokens(
+            BATCH_CLASSIFICATION_SYSTEM_PROMPT + build_batch_classification_prompt([])
+        )
+        batches: List[List[int]] = []
+        current: List[int] = []
+        used = 0
+
+        for index, query in enumerate(queries):
+            cost = estimate_tokens(json.dumps(query)) + 4 + BATCH_ITEM_OUTPUT_TOKENS
+            if current and (used + cost > budget or len(current) >= settings.CLASSIFY_BATCH_MAX_SIZE):
+                batches.append(current)
+                current, used = [], 0
+            current.append(index)
+            used += cost
+
+        if current:
+            batches.append(current)
+        return batches
+
+    def _context_window(self) -> int:
+        """Context length of the classifier model, read once from Ollama"""
+        if self._num_ctx is None:
+            self._num_ctx = settings.CLASSIFIER_CONTEXT_WINDOW
+            try:
+                parameters = self.client.show(self.model).get("parameters") or ""
+                match = re.search(r"num_ctx\s+(\d+)", parameters)
+                if match:
+                    self._num_ctx = int(match.group(1))
+            except Exception as e:
+                logger.warning("Could not read context window for %s: %s", self.model, str(e))
+        return self._num_ctx
+
+    async def classify_async(self, query: str) -> RoutingDecision:
+        """Async version of classify"""
+        routing_decision = await self._classify_with_model_async(query, self.model)
+        if self.needs_escalation(routing_decision):
+            self._log_escalation(routing_decision)
+            escalated = await self._classify_with_model_async(query, self.escalation_model)
+            if escalated.category != QueryCategory.UNKNOWN:
+                routing_decision = escalated
+        return routing_decision
+
+    async def _classify_with_model_async(self, query: str, model: str) -> RoutingDecision:
+        """Classify with one model, hedging on another host if it is slower than usual"""
+        if self.hedging is None:
+            return await self._attempt_async(query, model)
+        started = time.monotonic()
+        delay = self.hedging.delay()
+        if not self.hedging.start() or delay is None:
+            routing_decision = await self._attempt_async(query, model)
+            self.hedging.finish(time.monotonic() - started)
+            return routing_decision
+
+        hosts: List[str] = []
+        attempts = {asyncio.create_task(self._attempt_async(query, model, hosts)): False}
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done and self.hedging.try_hedge():
+                logger.info("Hedging classification on %s after %.0f ms", model, delay * 1000)
+                attempts[asyncio.create_task(self._attempt_async(query, model, hosts, hedge=True))] = True
+
+            pending = set(attempts)
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.result().category != QueryCategory.UNKNOWN), None)
+                # A failed attempt only wins if the other one fails too
+                if winner is None and not pending:
+                    winner = done.pop()
+                if winner is not None:
+                    break
+        finally:
+            for task in attempts:
+                task.cancel()
+        self.hedging.finish(time.monotonic() - started, hedge_won=attempts[winner])
+        return winner.result()
+
+    async def _attempt_async(
+        self, query: str, model: str, avoid_hosts: Optional[List[str]] = None, hedge: bool = False
+    ) -> RoutingDecision:
+        """Classify with one model call, parsing the JSON answer while it streams"""
+
+        parser = IncrementalJSONParser()
+        parse_span = Span("classify.parse", {"model": model})
+        parse_seconds = 0.0
+
+        with span("classify.llm", model=model, source="hedge" if hedge else None):
+            stream = self.client.chat_stream_async(
+                classification_messages(query, self.model),
+                model=model,
+                avoid_hosts=avoid_hosts,
+                format="json",
+                options=CLASSIFIER_OPTIONS
+            )
+            try:
+                async for part in stream:
+                    started = time.perf_counter()
+                    parser.feed(part['message']['content'])
+                    parse_seconds += time.perf_counter() - started
+                    if self._ready(parser):
+                        break
+            except (LLMClientError, KeyError) as e:
+                await stream.aclose()
+                return classification_failed(e)
+
+        routing_decision = self._streamed_decision(parser)
+        finish_span(parse_span, duration=parse_seconds)
+        if "reasoning" in parser.fields or not settings.CLASSIFY_BACKGROUND_REASONING:
+            await stream.aclose()
+        else:
+            task = asyncio.create_task(self._complete_reasoning_async(stream, parser, routing_decision))
+            self._background_tasks.add(task)
+            task.add_done_callback(self._background_tasks.discard)
+        return routing_decision
+
+    @staticmethod
+    async def _complete_reasoning_async(
+        stream: AsyncIterator, parser: IncrementalJSONParser, routing_decision: RoutingDecision
+    ) -> None:
+        """Read the rest of a classification stream to fill in its reasoning"""
+        try:
+            async for part in stream:
+                if "reasoning" in parser.feed(part['message']['content']):
+                    routing_decision.reasoning = str(parser.fields["reasoning"])
+                    break
+        except (LLMClientError, KeyError) as e:
+            logger.warning("Could not complete classification reasoning: %s", str(e))
+        finally:
+            await stream.aclose()
+
+    async def classify_intents_async(self, query: str) -> List[RoutingDecision]:
+        """Async version of classify_intents"""
+        try:
+            response = await self.client.chat_async(
+                multi_intent_messages(query, self.model),
+                model=self.model,
+                format="json",
+                options=MULTI_INTENT_OPTIONS
+            )
+            return parse_intents(response['message']['content'])
+        except (LLMClientError, KeyError) as e:
+            logger.error("Multi-intent classification failed: %s", str(e))
+            return []
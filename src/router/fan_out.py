@@ -0,0 +1,127 @@
+"""Answering queries that ask for several things at once.
+
+With ``MULTI_INTENT=auto`` (keywords of two or more categories) or
+``always``, the classifier lists every request in the query. Each intent
+with at least ``MULTI_INTENT_THRESHOLD`` confidence, up to
+``MULTI_INTENT_MAX``, goes to its own handler at the same time, told to
+answer only its part, and the answers are merged into one reply with
+per-intent details in ``metadata["intents"]``. The route takes about as
+long as the slowest handler. Streaming routes answer the top intent only.
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import contextvars
+import threading
+from src.config.settings import settings
+from src.models.routing import QueryCategory, RoutingDecision
+from src.models.responses import HandlerResponse
+from src.utils.metrics import span
+
+# Section headings when the answers to several intents are merged into one reply
+INTENT_HEADINGS = {
+    QueryCategory.GENERAL_INQUIRY: "Your question",
+    QueryCategory.REFUND_REQUEST: "Your refund",
+    QueryCategory.TECHNICAL_SUPPORT: "Your technical issue",
+    QueryCategory.BILLING_QUESTION: "Your billing question",
+    QueryCategory.PRODUCT_RECOMMENDATION: "Our recommendations",
+}
+
+# Appended to the query for each handler of a multi-intent query, so it answers only its part
+INTENT_FOCUS = (
+    "\n\n(This message contains several requests. Answer only the {topic} part; "
+    "the other parts are answered separately.)"
+)
+
+Dispatch = Callable[[str, RoutingDecision], HandlerResponse]
+AsyncDispatch = Callable[[str, RoutingDecision], Awaitable[HandlerResponse]]
+
+
+def intents_to_answer(intents: List[RoutingDecision]) -> List[RoutingDecision]:
+    """The top intent, plus the others confident enough to answer, up to MULTI_INTENT_MAX"""
+    others = [decision for decision in intents[1:] if decision.confidence >= settings.MULTI_INTENT_THRESHOLD]
+    return intents[:1] + others[:max(settings.MULTI_INTENT_MAX - 1, 0)]
+
+
+def focused_query(query: str, routing_decision: RoutingDecision) -> str:
+    return query + INTENT_FOCUS.format(topic=routing_decision.category.value.replace("_", " "))
+
+
+def merge_responses(intents: List[RoutingDecision], responses: List[HandlerResponse]) -> HandlerResponse:
+    """Combine the answers to several intents into one reply, in intent order"""
+    sections = [
+        f"**{INTENT_HEADINGS.get(decision.category, 'Your question')}**\n\n{response.response.strip()}"
+        for decision, response in zip(intents, responses)
+    ]
+    metadata: Dict[str, Any] = {
+        "intents": [
+            {
+                "category": decision.category.value,
+                "confidence": decision.confidence,
+                "handler_name": response.handler_name,
+                "metadata": response.metadata,
+            }
+            for decision, response in zip(intents, responses)
+        ]
+    }
+    for flag in ("fallback", "degraded", "sensitive_data"):
+        if any(response.metadata.get(flag) for response in responses):
+            metadata[flag] = True
+    return HandlerResponse(
+        response="\n\n".join(sections),
+        metadata=metadata,
+        handler_name="+".join(response.handler_name for response in responses)
+    )
+
+
+def answer_intents(dispatch: Dispatch, query: str, intents: List[RoutingDecision]) -> HandlerResponse:
+    """Answer every confident intent at the same time and merge the answers.
+
+    The first intent is handled on the calling thread and the others on
+    their own threads. A single intent is dispatched as usual.
+    """
+    intents = intents_to_answer(intents)
+    if len(intents) == 1:
+        return dispatch(query, intents[0])
+
+    responses: List[Optional[HandlerResponse]] = [None] * len(intents)
+    errors: List[BaseException] = []
+
+    def answer(index: int) -> None:
+        try:
+            responses[index] = dispatch(focused_query(query, intents[index]), intents[index])
+        except Exception as e:
+            errors.append(e)
+
+    with span("fan_out", category=intents[0].category.value, intents=len(intents)):
+        threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(answer, index), daemon=True)
+            for index in range(1, len(intents))
+        ]
+        for thread in threads:
+            thread.start()
+        answer(0)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return merge_responses(intents, responses)
+
+
+async def answer_intents_async(dispatch: AsyncDispatch, query: str, intents: List[RoutingDecision]) -> HandlerResponse:
+    """Async version of answer_intents, with one task per intent"""
+    intents = intents_to_answer(intents)
+    if len(intents) == 1:
+        return await dispatch(query, intents[0])
+    with span("fan_out", category=intents[0].category.value, intents=len(intents)):
+        tasks = [
+            asyncio.ensure_future(dispatch(focused_query(query, routing_decision), routing_decision))
+            for routing_decision in intents
+        ]
+        try:
+            responses = await asyncio.gather(*tasks)
+        except BaseException:
+            # One answer failed or was shed; the others are no longer needed
+            for task in tasks:
+                task.cancel()
+            raise
+    return merge_responses(intents, list(responses))
@@ -0,0 +1,93 @@
+"""Distilling the LLM classifier into the local one.
+
+With ``DECISION_LOG_PATH`` set, every LLM classification is appended to a
+JSONL decision log. It is off by default because the log stores queries in
+plain text. ``python -m src.cli.train_classifier`` trains a LocalClassifier
+on the log and calibrates its serving threshold.
+
+``LOCAL_CLASSIFIER_MODE=shadow`` runs the local classifier alongside the
+LLM and tracks how often they agree (``shadow_stats``). ``serve`` answers
+confident queries locally and sends the rest to the LLM. Retrained models
+are picked up without a restart (``LOCAL_CLASSIFIER_RELOAD_SECONDS``).
+"""
+from typing import Optional, Tuple
+import asyncio
+from src.config.settings import settings
+from src.utils.decision_log import DecisionLog
+from src.utils.logging_config import logger
+from src.utils.metrics import metrics
+from src.models.routing import QueryCategory, RoutingDecision
+from src.router.local_classifier import LocalClassifierLoader, ShadowStats
+
+# (category, probability, serving threshold) from the local classifier
+Prediction = Tuple[QueryCategory, float, float]
+
+
+class DecisionLearner:
+    """Logs LLM decisions as training data and runs the local classifier in shadow or serve mode"""
+
+    def __init__(
+        self,
+        decision_log: Optional[DecisionLog] = None,
+        local_classifier: Optional[LocalClassifierLoader] = None,
+        mode: str = "shadow",
+    ):
+        self.decision_log = decision_log
+        self.local_classifier = local_classifier
+        self.mode = mode
+        self.shadow_stats = ShadowStats()
+
+    @classmethod
+    def from_settings(cls) -> "DecisionLearner":
+        decision_log = DecisionLog(settings.DECISION_LOG_PATH) if settings.DECISION_LOG_PATH else None
+        local_classifier = None
+        if settings.LOCAL_CLASSIFIER_MODE in ("shadow", "serve"):
+            local_classifier = LocalClassifierLoader(settings.LOCAL_CLASSIFIER_PATH, settings.LOCAL_CLASSIFIER_RELOAD_SECONDS)
+        return cls(decision_log, local_classifier, settings.LOCAL_CLASSIFIER_MODE)
+
+    def predict(self, query: str) -> Optional[Prediction]:
+        """The local classifier's guess, if a trained one is loaded"""
+        classifier = self.local_classifier.get() if self.local_classifier is not None else None
+        if classifier is None:
+            return None
+        category, probability = classifier.predict(query)
+        # Served decisions must not look unsure enough to trigger escalation
+        return category, probability, max(classifier.threshold, settings.DEFAULT_CONFIDENCE_THRESHOLD)
+
+    def serve(self, prediction: Optional[Prediction]) -> Optional[RoutingDecision]:
+        """The decision to use instead of asking the LLM, in serve mode when the prediction is confident"""
+        if prediction is None or self.mode != "serve":
+            return None
+        category, probability, threshold = prediction
+        if probability < threshold:
+            return None
+        metrics.local_classifier.inc(outcome="served")
+        return RoutingDecision(
+            category=category,
+            confidence=round(probability, 4),
+            reasoning=f"Local classifier (p={probability:.2f})",
+            extracted_info={}
+        )
+
+    def learn(self, query: str, routing_decision: RoutingDecision, prediction: Optional[Prediction], model: str) -> None:
+        """Log the LLM's decision as training data and score the local classifier against it"""
+        if routing_decision.category == QueryCategory.UNKNOWN:
+            return
+        if self.decision_log is not None:
+            self.decision_log.append(query, routing_decision, model)
+        if prediction is not None:
+            category, probability, threshold = prediction
+            agreed = category == routing_decision.category
+            self.shadow_stats.record(agreed, probability >= threshold)
+            metrics.local_classifier.inc(outcome="agreed" if agreed else "disagreed")
+            if self.shadow_stats.compared % 100 == 0:
+                logger.info("Local classifier vs LLM: %s", self.shadow_stats.as_dict())
+
+    async def learn_async(
+        self, query: str, routing_decision: RoutingDecision, prediction: Optional[Prediction], model: str
+    ) -> None:
+        """learn, with the decision log written off the event loop"""
+        if self.decision_log is not None:
+            await asyncio.to_thread(self.learn, query, routing_decision, prediction, model)
+        else:
+            self.learn(query, routing_decision, prediction, model)
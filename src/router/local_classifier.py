@@ -0,0 +1,245 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import json
+import os
+import re
+import threading
+import time
+import zlib
+import numpy as np
+from src.models.routing import QueryCategory
+from src.utils.classification_cache import normalize_query
+from src.utils.logging_config import logger
+
+TOKEN_PATTERN = re.compile(r"[\w#]+")
+
+# Sparse rows in CSR layout: (row offsets, feature indexes, values)
+SparseRows = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+class HashingVectorizer:
+    """Maps a query to a sparse, L2-normalized vector of hashed word unigrams and bigrams.
+
+    Needs no vocabulary, so new words in tomorrow's log cost nothing to add.
+    """
+
+    def __init__(self, n_features: int = 2 ** 16):
+        self.n_features = n_features
+
+    def features(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        tokens = TOKEN_PATTERN.findall(normalize_query(query))
+        # The constant start token keeps every row non-empty
+        grams = ["<s>"] + tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        counts: Dict[int, float] = {}
+        for gram in grams:
+            digest = zlib.crc32(gram.encode("utf-8"))
+            index = digest % self.n_features
+            # A sign bit halves the damage of hash collisions
+            counts[index] = counts.get(index, 0.0) + (1.0 if digest & 0x80000000 else -1.0)
+        indexes = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        norm = np.linalg.norm(values)
+        return indexes, values / norm if norm else values
+
+    def transform(self, queries: Sequence[str]) -> SparseRows:
+        offsets = [0]
+        all_indexes, all_values = [], []
+        for query in queries:
+            indexes, values = self.features(query)
+            all_indexes.append(indexes)
+            all_values.append(values)
+            offsets.append(offsets[-1] + len(indexes))
+        return np.array(offsets, dtype=np.int64), np.concatenate(all_indexes), np.concatenate(all_values)
+
+
+def _logits(weights: np.ndarray, bias: np.ndarray, rows: SparseRows) -> np.ndarray:
+    offsets, indexes, values = rows
+    contributions = weights[indexes] * values[:, None]
+    return np.add.reduceat(contributions, offsets[:-1], axis=0) + bias
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def calibrate_threshold(probabilities: np.ndarray, correct: np.ndarray, target: float, min_support: int) -> float:
+    """Lowest confidence at which predictions at or above it agree with the LLM at least ``target`` of the time"""
+    order = np.argsort(-probabilities)
+    agreement = np.cumsum(correct[order]) / np.arange(1, len(order) + 1)
+    valid = np.nonzero((agreement >= target) & (np.arange(1, len(order) + 1) >= min_support))[0]
+    if not len(valid):
+        # Never confident enough to serve
+        return 1.01
+    return float(probabilities[order][valid[-1]])
+
+
+class LocalClassifier:
+    """Multinomial logistic regression over hashed n-grams, distilled from LLM routing decisions.
+
+    ``threshold`` is the calibrated confidence above which its answers agreed
+    with the LLM often enough to be served without a model call.
+    """
+
+    def __init__(
+        self,
+        weights: np.ndarray,
+        bias: np.ndarray,
+        categories: List[QueryCategory],
+        vectorizer: HashingVectorizer,
+        threshold: float = 1.01,
+        report: Optional[Dict[str, Any]] = None,
+    ):
+        self.weights = weights
+        self.bias = bias
+        self.categories = categories
+        self.vectorizer = vectorizer
+        self.threshold = threshold
+        self.report = report or {}
+
+    @classmethod
+    def fit(
+        cls,
+        queries: Sequence[str],
+        labels: Sequence[QueryCategory],
+        n_features: int = 2 ** 16,
+        iterations: int = 300,
+        learning_rate: float = 0.05,
+        l2: float = 1e-5,
+    ) -> "LocalClassifier":
+        """Train with full-batch Adam on the softmax cross-entropy"""
+        vectorizer = HashingVectorizer(n_features)
+        rows = vectorizer.transform(queries)
+        categories = sorted(set(labels), key=lambda category: category.value)
+        label_index = {category: index for index, category in enumerate(categories)}
+        targets = np.zeros((len(queries), len(categories)), dtype=np.float32)
+        targets[np.arange(len(queries)), [label_index[label] for label in labels]] = 1.0
+
+        weights = np.zeros((n_features, len(categories)), dtype=np.float32)
+        bias = np.zeros(len(categories), dtype=np.float32)
+        offsets, indexes, values = rows
+        row_of_value = np.repeat(np.arange(len(queries)), np.diff(offsets))
+        moments = [np.zeros_like(weights), np.zeros_like(weights), np.zeros_like(bias), np.zeros_like(bias)]
+        beta1, beta2, epsilon = 0.9, 0.999, 1e-8
+
+        for step in range(1, iterations + 1):
+            delta = (_softmax(_logits(weights, bias, rows)) - targets) / len(queries)
+            weight_gradient = np.zeros_like(weights)
+            np.add.at(weight_gradient, indexes, values[:, None] * delta[row_of_value])
+            weight_gradient += l2 * weights
+            bias_gradient = delta.sum(axis=0)
+
+            for parameter, gradient, first, second in (
+                (weights, weight_gradient, moments[0], moments[1]),
+                (bias, bias_gradient, moments[2], moments[3]),
+            ):
+                first *= beta1
+                first += (1 - beta1) * gradient
+                second *= beta2
+                second += (1 - beta2) * gradient * gradient
+                corrected = learning_rate * np.sqrt(1 - beta2 ** step) / (1 - beta1 ** step)
+                parameter -= corrected * first / (np.sqrt(second) + epsilon)
+
+        return cls(weights, bias, categories, vectorizer)
+
+    def predict_proba(self, queries: Sequence[str]) -> np.ndarray:
+        return _softmax(_logits(self.weights, self.bias, self.vectorizer.transform(queries)))
+
+    def predict(self, query: str) -> Tuple[QueryCategory, float]:
+        """Most likely category and its probability"""
+        probabilities = self.predict_proba([query])[0]
+        best = int(np.argmax(probabilities))
+        return self.categories[best], float(probabilities[best])
+
+    def save(self, path: str) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = path + ".tmp.npz"
+        np.savez_compressed(
+            temporary,
+            weights=self.weights,
+            bias=self.bias,
+            categories=np.array([category.value for category in self.categories]),
+            n_features=np.array(self.vectorizer.n_features),
+            threshold=np.array(self.threshold),
+            report=np.array(json.dumps(self.report)),
+        )
+        # Routers reload the file when it changes, so replace it atomically
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LocalClassifier":
+        with np.load(path) as data:
+            return cls(
+                weights=data["weights"],
+                bias=data["bias"],
+                categories=[QueryCategory(value) for value in data["categories"]],
+                vectorizer=HashingVectorizer(int(data["n_features"])),
+                threshold=float(data["threshold"]),
+                report=json.loads(str(data["report"])),
+            )
+
+
+class LocalClassifierLoader:
+    """Keeps the latest trained classifier loaded, picking up retrained files as they appear"""
+
+    def __init__(self, path: str, reload_seconds: float = 60.0):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.classifier: Optional[LocalClassifier] = None
+        self._mtime: Optional[float] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self) -> Optional[LocalClassifier]:
+        now = time.monotonic()
+        if now - self._checked < self.reload_seconds and self._checked:
+            return self.classifier
+        with self._lock:
+            if now - self._checked < self.reload_seconds and self._checked:
+                return self.classifier
+            self._checked = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                return self.classifier
+            if mtime != self._mtime:
+                try:
+                    self.classifier = LocalClassifier.load(self.path)
+                    self._mtime = mtime
+                    logger.info(
+                        "Loaded local classifier from %s (threshold %.3f, %s)",
+                        self.path, self.classifier.threshold, self.classifier.report.get("coverage", "no report")
+                    )
+                except Exception as e:
+                    logger.warning("Could not load local classifier %s: %s", self.path, str(e))
+        return self.classifier
+
+
+class ShadowStats:
+    """How often the local classifier agrees with the LLM, overall and above its threshold"""
+
+    def __init__(self):
+        self.compared = 0
+        self.agreed = 0
+        self.confident = 0
+        self.confident_agreed = 0
+        self._lock = threading.Lock()
+
+    def record(self, agreed: bool, confident: bool) -> None:
+        with self._lock:
+            self.compared += 1
+            self.agreed += agreed
+            self.confident += confident
+            self.confident_agreed += agreed and confident
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "compared": self.compared,
+                "agreement": self.agreed / self.compared if self.compared else 0.0,
+                # Share of LLM traffic that serve mode would have answered locally
+                "coverage": self.confident / self.compared if self.compared else 0.0,
+                "confident_agreement": self.confident_agreed / self.confident if self.confident else 0.0,
+            }
@@ -0,0 +1,228 @@
+"""Prompts for the classifier model and the parsing of its JSON answers.
+
+Static instructions always go in the system message, so every
+classification shares a prompt prefix the model server keeps cached.
+PROMPT_VERSION hashes those prefixes; it is part of every classification
+cache key, so editing a prompt retires the decisions cached under it.
+"""
+from typing import Any, Dict, List, Optional
+import hashlib
+import json
+from src.config.settings import settings
+from src.utils.conversation import current_conversation
+from src.utils.logging_config import logger
+from src.models.routing import QueryCategory, RoutingDecision
+
+
+CATEGORY_DESCRIPTIONS = """1. general_inquiry - General questions, FAQs, company information
+2. refund_request - Requests for refunds, returns, or exchanges
+3. technical_support - Technical problems, bugs, or issues with products/services
+4. billing_question - Questions about charges, invoices, or payment methods
+5. product_recommendation - Requests for product suggestions or comparisons"""
+
+CLASSIFICATION_SYSTEM_PROMPT = f"""Classify the customer service query you are given into exactly ONE of these categories:
+
+{CATEGORY_DESCRIPTIONS}
+
+Respond with a JSON object in this exact format:
+{{
+    "category": "one of the categories above",
+    "confidence": 0.0 to 1.0,
+    "reasoning": "brief explanation of why this category was chosen"
+}}
+
+IMPORTANT: Respond ONLY with the JSON object, no additional text."""
+
+BATCH_CLASSIFICATION_SYSTEM_PROMPT = f"""Classify each of the numbered customer service queries you are given into exactly ONE of these categories:
+
+{CATEGORY_DESCRIPTIONS}
+
+Respond with a JSON object holding one result per query, using the query's index:
+{{
+    "results": [
+        {{
+            "index": 0,
+            "category": "one of the categories above",
+            "confidence": 0.0 to 1.0,
+            "reasoning": "brief explanation of why this category was chosen"
+        }}
+    ]
+}}
+
+IMPORTANT: Respond ONLY with the JSON object, no additional text."""
+
+MULTI_INTENT_SYSTEM_PROMPT = f"""A customer service query may ask for more than one thing. List every separate request in the query you are given, using these categories:
+
+{CATEGORY_DESCRIPTIONS}
+
+Respond with a JSON object listing the requests, most important first:
+{{
+    "intents": [
+        {{
+            "category": "one of the categories above",
+            "confidence": 0.0 to 1.0,
+            "reasoning": "brief explanation of which part of the query this is"
+        }}
+    ]
+}}
+
+Most queries contain a single request; only list a category when the query really asks for it.
+IMPORTANT: Respond ONLY with the JSON object, no additional text."""
+
+# Deterministic, short classifier answers
+CLASSIFIER_OPTIONS = {"temperature": 0.0, "num_predict": 128}
+MULTI_INTENT_OPTIONS = {"temperature": 0.0, "num_predict": 256}
+
+# Output tokens reserved for each item of a batched classification answer
+BATCH_ITEM_OUTPUT_TOKENS = 50
+
+
+def build_classification_prompt(query: str, model: str) -> str:
+    """Build the user message asking the model to classify a single query"""
+    conversation = current_conversation()
+    if conversation is not None and not conversation.empty:
+        # Follow-ups such as "what about my other order?" are classified with what came before
+        history = conversation.transcript(min(settings.CONVERSATION_CLASSIFY_TOKENS, conversation.memory.budget_for(model)))
+        if history:
+            return f'Conversation so far:\n{history}\n\nClassify the latest query.\nQuery: "{query}"'
+    return f'Query: "{query}"'
+
+
+def classification_messages(query: str, model: str) -> List[Dict[str, str]]:
+    """Static instructions first so every classification shares the same prompt prefix"""
+    return [
+        {"role": "system", "content": CLASSIFICATION_SYSTEM_PROMPT},
+        {"role": "user", "content": build_classification_prompt(query, model)},
+    ]
+
+
+def build_batch_classification_prompt(queries: List[str]) -> str:
+    """Build the user message listing several numbered queries"""
+    numbered = "\n".join(f"[{index}] {json.dumps(query)}" for index, query in enumerate(queries))
+    return f"Queries:\n{numbered}"
+
+
+def batch_classification_messages(queries: List[str]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": BATCH_CLASSIFICATION_SYSTEM_PROMPT},
+        {"role": "user", "content": build_batch_classification_prompt(queries)},
+    ]
+
+
+def multi_intent_messages(query: str, model: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": MULTI_INTENT_SYSTEM_PROMPT},
+        {"role": "user", "content": build_classification_prompt(query, model)},
+    ]
+
+
+def strip_code_fence(content: str) -> str:
+    """Clean up the response if it contains markdown"""
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+
+def decision_from_result(result: Dict[str, Any]) -> RoutingDecision:
+    """Build a RoutingDecision from one parsed classifier JSON object"""
+    # Map string category to enum
+    category_str = result.get("category", "unknown")
+    try:
+        category = QueryCategory(category_str)
+    except ValueError:
+        category = QueryCategory.UNKNOWN
+
+    return RoutingDecision(
+        category=category,
+        confidence=float(result.get("confidence", 0.5)),
+        reasoning=result.get("reasoning", ""),
+        extracted_info={}
+    )
+
+
+def classification_failed(error: Exception) -> RoutingDecision:
+    logger.error("Classification failed: %s", str(error))
+    return RoutingDecision(
+        category=QueryCategory.UNKNOWN,
+        confidence=0.0,
+        reasoning=f"Classification failed: {str(error)}",
+        extracted_info={}
+    )
+
+
+def parse_classification(content: str) -> RoutingDecision:
+    """Turn the raw classifier output into a RoutingDecision"""
+    try:
+        result = json.loads(strip_code_fence(content))
+        if not isinstance(result, dict):
+            raise ValueError(f"expected a JSON object, got {type(result).__name__}")
+        return decision_from_result(result)
+    except (json.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+        return classification_failed(e)
+
+
+def _valid_decision(item: Any) -> Optional[RoutingDecision]:
+    """The decision in one item of a list answer, or None if the item is invalid"""
+    if not isinstance(item, dict):
+        return None
+    try:
+        decision = decision_from_result(item)
+    except (TypeError, ValueError):
+        return None
+    if decision.category == QueryCategory.UNKNOWN or not 0.0 <= decision.confidence <= 1.0:
+        return None
+    return decision
+
+
+def parse_batch_classification(content: str, size: int) -> Dict[int, RoutingDecision]:
+    """Parse a batched answer, keeping only items that pass validation"""
+    try:
+        results = json.loads(strip_code_fence(content))
+    except json.JSONDecodeError as e:
+        logger.error("Error parsing batch classification response: %s", str(e))
+        return {}
+
+    if isinstance(results, dict):
+        results = results.get("results", [])
+    if not isinstance(results, list):
+        return {}
+
+    decisions = {}
+    for result in results:
+        index = result.get("index") if isinstance(result, dict) else None
+        if not isinstance(index, int) or not 0 <= index < size or index in decisions:
+            continue
+        decision = _valid_decision(result)
+        if decision is not None:
+            decisions[index] = decision
+    return decisions
+
+
+def parse_intents(content: str) -> List[RoutingDecision]:
+    """Valid intents from a multi-intent answer, one per category, most confident first"""
+    try:
+        result = json.loads(strip_code_fence(content))
+    except json.JSONDecodeError as e:
+        logger.error("Error parsing multi-intent classification: %s", str(e))
+        return []
+    items = result.get("intents") if isinstance(result, dict) else result
+    if not isinstance(items, list):
+        return []
+
+    best: Dict[QueryCategory, RoutingDecision] = {}
+    for item in items:
+        decision = _valid_decision(item)
+        if decision is None:
+            continue
+        if decision.category not in best or decision.confidence > best[decision.category].confidence:
+            best[decision.category] = decision
+    return sorted(best.values(), key=lambda decision: decision.confidence, reverse=True)
+
+
+# Outside a conversation the messages do not depend on the model
+PROMPT_VERSION = hashlib.sha256(
+    json.dumps(classification_messages("", "") + batch_classification_messages([])).encode("utf-8")
+).hexdigest()[:16]
@@ -0,0 +1,110 @@
+"""What is kept once a route finishes.
+
+Every route's stage timings and token usage are attached to its response
+and counted in the process-wide metrics. With ``ROUTE_LOG_PATH`` set, the
+route is also appended to the binary RouteLog for offline analysis
+(``python -m src.cli.route_stats``).
+
+Queries that share a ``session_id`` (also accepted in the ``/route``
+request body) form one conversation in ConversationMemory
+(``CONVERSATION_MEMORY``). Each answered query becomes the conversation's
+latest turn. The classifier sees up to ``CONVERSATION_CLASSIFY_TOKENS`` of
+it, so follow-ups like "what about my other order?" route correctly, and
+handlers get the earlier turns as chat messages within a per-model budget
+(``CONVERSATION_HISTORY_TOKENS``, overridden by
+``CONVERSATION_MODEL_BUDGETS``).
+"""
+from typing import Optional
+import asyncio
+import time
+from src.config.settings import settings
+from src.models.responses import HandlerResponse
+from src.models.routing import RoutingDecision
+from src.utils.conversation import Conversation, ConversationMemory
+from src.utils.llm_client import LLMClient
+from src.utils.metrics import Span, Trace, finish_span, metrics
+from src.utils.route_log import RouteLog, get_route_log
+
+
+class RouteRecorder:
+    """Records finished routes in the metrics, the route log and the conversation memory"""
+
+    def __init__(self, route_log: Optional[RouteLog] = None, memory: Optional[ConversationMemory] = None):
+        self.route_log = route_log
+        self.memory = memory
+
+    @classmethod
+    def from_settings(cls, client: LLMClient, summary_model: str) -> "RouteRecorder":
+        """Recorder for ROUTE_LOG_PATH and CONVERSATION_MEMORY; ``summary_model`` is used without CONVERSATION_SUMMARY_MODEL"""
+        route_log = get_route_log(settings.ROUTE_LOG_PATH) if settings.ROUTE_LOG_PATH else None
+        memory = None
+        if settings.CONVERSATION_MEMORY:
+            memory = ConversationMemory(
+                client,
+                summary_model=settings.CONVERSATION_SUMMARY_MODEL or summary_model,
+                history_tokens=settings.CONVERSATION_HISTORY_TOKENS,
+                model_budgets=settings.CONVERSATION_MODEL_BUDGETS,
+                summary_tokens=settings.CONVERSATION_SUMMARY_TOKENS,
+                max_sessions=settings.CONVERSATION_MAX_SESSIONS,
+                ttl_seconds=settings.CONVERSATION_TTL,
+                max_turns=settings.CONVERSATION_MAX_TURNS,
+            )
+        return cls(route_log, memory)
+
+    def conversation(self, session_id: Optional[str]) -> Optional[Conversation]:
+        """The session's conversation, or None without a session or with conversation memory off"""
+        if session_id is None or self.memory is None:
+            return None
+        return self.memory.session(session_id)
+
+    def finish(
+        self,
+        route_trace: Trace,
+        routing_decision: RoutingDecision,
+        response: HandlerResponse,
+        started: float,
+        query: Optional[str] = None,
+        conversation: Optional[Conversation] = None,
+        log_route: bool = True,
+    ) -> HandlerResponse:
+        """Record the route's metrics and attach per-stage timings and token usage to the response.
+
+        With a ``conversation``, the query and answer become its latest turn;
+        fallback and degraded answers are left out of the history. Callers on
+        an event loop use ``finish_async`` instead.
+        """
+        route_span = Span("route", {"category": routing_decision.category.value, "handler": response.handler_name})
+        finish_span(route_span, route_trace, duration=time.perf_counter() - started)
+        metrics.routes.inc(category=routing_decision.category.value, handler=response.handler_name)
+
+        response.metadata["timings"] = route_trace.timings()
+        usage = route_trace.usage()
+        if usage:
+            response.metadata["usage"] = usage
+        if log_route and self.route_log is not None and query is not None:
+            self.write_route_log(route_trace, query, routing_decision, response)
+        if conversation is not None and query is not None and not (
+            response.metadata.get("fallback") or response.metadata.get("degraded")
+        ):
+            self.memory.record(conversation, query, response.response, routing_decision.category.value)
+        return response
+
+    async def finish_async(
+        self,
+        route_trace: Trace,
+        routing_decision: RoutingDecision,
+        response: HandlerResponse,
+        started: float,
+        query: Optional[str] = None,
+        conversation: Optional[Conversation] = None,
+    ) -> HandlerResponse:
+        """finish, with the route log written off the event loop"""
+        response = self.finish(route_trace, routing_decision, response, started, query, conversation, log_route=False)
+        if self.route_log is not None and query is not None:
+            await asyncio.to_thread(self.write_route_log, route_trace, query, routing_decision, response)
+        return response
+
+    def write_route_log(self, route_trace: Trace, query: str, routing_decision: RoutingDecision, response: HandlerResponse) -> None:
+        """Append the finished route to the route log"""
+        source = next((span.attributes.get("source") for span in route_trace.spans if span.name == "classify"), None)
+        self.route_log.append(query, routing_decision, response, source)
@@ -1,119 +1,393 @@
-from typing import Tuple
-import json
-import ollama
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+import time
+from src.config.settings import settings
 from src.utils.logging_config import logger
+from src.utils.conversation import Conversation, ConversationMemory, has_history, iterate_using, using
+from src.utils.deadline import deadline, expires_in, iterate_until, until
+from src.utils.extractor import InfoExtractor
+from src.utils.llm_client import LLMClient, LLMClientError, get_llm_client
+from src.utils.metrics import Span, Trace, finish_span, iterate_in_span, metrics, span, trace
 from src.models.routing import QueryCategory, RoutingDecision
+from src.handlers.base import BaseHandler
 from src.handlers.general_inquiry import GeneralInquiryHandler
 from src.handlers.refund_request import RefundRequestHandler
 from src.handlers.technical_support import TechnicalSupportHandler
-from src.handlers.billing_question import BillingQuestionHandler 
-from src.handlers.product_recommendation import ProductRecommendationHandler 
+from src.handlers.billing_question import BillingQuestionHandler
+from src.handlers.product_recommendation import ProductRecommendationHandler
 from src.models.responses import HandlerResponse
+from src.router.caching import Classification, RouteCaches
+from src.router.classifier import LLMClassifier
+from src.router.fan_out import answer_intents
+from src.router.learning import DecisionLearner
+from src.router.recording import RouteRecorder
+from src.router.semantic_router import SemanticRouter
+from src.router.speculation import KeywordPredictor
+
+# Returned in place of a handler answer when the model server fails
+FALLBACK_MESSAGE = (
+    "Sorry, we're having trouble answering right now. "
+    "Please try again in a few minutes or contact our support team."
+)
 
 
 class Router:
-    """Main routing class that classifies queries and routes to appropriate handlers"""
-    
-    def __init__(self, model_name: str = "gemma3"):
-        self.model_name = model_name
-        self.client = ollama
-        
-        # Initialize handlers
+    """Main routing class that classifies queries and routes to appropriate handlers.
+
+    Routing is coordinated by parts built from the settings unless they are
+    passed in: the LLMClassifier, the RouteCaches, the DecisionLearner that
+    runs the local classifier, and the RouteRecorder that keeps the route
+    log and conversation memory.
+
+    Each category's handler runs on its own model and generation options
+    (``HANDLER_MODELS``, ``HANDLER_OPTIONS``) and hands low-confidence routes
+    to ``ESCALATION_MODEL``.
+    """
+
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        client: Optional[LLMClient] = None,
+        classifier: Optional[LLMClassifier] = None,
+        caches: Optional[RouteCaches] = None,
+        learner: Optional[DecisionLearner] = None,
+        recorder: Optional[RouteRecorder] = None,
+        semantic_router: Optional[SemanticRouter] = None,
+        extractor: Optional[InfoExtractor] = None,
+    ):
+        self.model_name = model_name or settings.OLLAMA_MODEL
+        self.client = client or get_llm_client()
+
+        # A small model classifies; low-confidence routes escalate to a larger one
+        self.classifier = classifier or LLMClassifier.from_settings(self.client, self.model_name)
+        self.caches = caches or RouteCaches.from_settings()
+        self.learner = learner or DecisionLearner.from_settings()
+        self.recorder = recorder or RouteRecorder.from_settings(self.client, self.classifier.model)
+
+        # Order numbers, error codes and product names are extracted locally
+        self.extractor = extractor or InfoExtractor.from_catalog_file(settings.PRODUCT_CATALOG_PATH)
+
+        # Embedding fast path consulted before the LLM classifier
+        if semantic_router is None and settings.ENABLE_SEMANTIC_ROUTER:
+            semantic_router = SemanticRouter()
+        self.semantic_router = semantic_router
+
+        # Queries asking for several things can be answered by several handlers at once (off, auto or always)
+        self.multi_intent = settings.MULTI_INTENT
+        self.predictor = KeywordPredictor()
+
+        # Initialize handlers, each with its own model and generation options
+        handler_classes = {
+            QueryCategory.GENERAL_INQUIRY: GeneralInquiryHandler,
+            QueryCategory.REFUND_REQUEST: RefundRequestHandler,
+            QueryCategory.TECHNICAL_SUPPORT: TechnicalSupportHandler,
+            QueryCategory.BILLING_QUESTION: BillingQuestionHandler,
+            QueryCategory.PRODUCT_RECOMMENDATION: ProductRecommendationHandler,
+        }
         self.handlers = {
-            QueryCategory.GENERAL_INQUIRY: GeneralInquiryHandler(model_name),
-            QueryCategory.REFUND_REQUEST: RefundRequestHandler(model_name),
-            QueryCategory.TECHNICAL_SUPPORT: TechnicalSupportHandler(model_name),
-            QueryCategory.BILLING_QUESTION: BillingQuestionHandler(model_name),
-            QueryCategory.PRODUCT_RECOMMENDATION: ProductRecommendationHandler(model_name),
+            category: handler_class(
+                settings.HANDLER_MODELS.get(category.value, self.model_name),
+                self.client,
+                options=settings.HANDLER_OPTIONS.get(category.value),
+                escalation_model=self.classifier.escalation_model,
+            )
+            for category, handler_class in handler_classes.items()
         }
-        
+
         # Default handler for unknown categories
-        self.default_handler = GeneralInquiryHandler(model_name)
-    
+        self.default_handler = self.handlers[QueryCategory.GENERAL_INQUIRY]
+
+    @property
+    def memory(self) -> Optional[ConversationMemory]:
+        return self.recorder.memory
+
+    def _fast_path(self, query: str) -> Optional[RoutingDecision]:
+        """Decide the route without a generative call when the query is clear-cut"""
+        if self.semantic_router is None:
+            return None
+        return self.semantic_router.route(query)
+
     def classify_query(self, query: str) -> RoutingDecision:
         """Classify the query into one of the defined categories"""
-        
-        classification_prompt = f"""Classify the following customer service query into exactly ONE of these categories:
 
-1. general_inquiry - General questions, FAQs, company information
-2. refund_request - Requests for refunds, returns, or exchanges
-3. technical_support - Technical problems, bugs, or issues with products/services
-4. billing_question - Questions about charges, invoices, or payment methods
-5. product_recommendation - Requests for product suggestions or comparisons
+        with deadline(settings.CLASSIFY_TIMEOUT), span("classify") as classify_span:
+            if has_history():
+                # The decision depends on the conversation, so shared caches and query-only classifiers do not apply
+                routing_decision, source = self.classifier.classify(query), "conversation"
+            else:
+                routing_decision, source = self.caches.cached_decision(query, self.classifier.model), "cache"
+            if routing_decision is None:
+                routing_decision, source = self.caches.coalesce_classification(
+                    query, self.classifier.model, lambda: self._classify_uncached(query)
+                )
+            classify_span.set(category=routing_decision.category.value, source=source)
 
-Also extract any relevant information like order numbers, product names, or error messages.
+        return self._attach_extracted_info(query, routing_decision)
 
-Query: "{query}"
+    def _classify_uncached(self, query: str) -> Classification:
+        """Classify locally, with the semantic fast path or with the LLM and cache the result; returns (decision, source)"""
+        prediction = self.learner.predict(query)
+        routing_decision, source = self.learner.serve(prediction), "local"
+        if routing_decision is None:
+            routing_decision, source = self._fast_path(query), "semantic"
+        if routing_decision is None:
+            routing_decision, source = self.classifier.classify(query), "llm"
+            self.learner.learn(query, routing_decision, prediction, self.classifier.model)
+        self.caches.store_decision(query, self.classifier.model, routing_decision)
+        return routing_decision, source
 
-Respond with a JSON object in this exact format:
-{{
-    "category": "one of the categories above",
-    "confidence": 0.0 to 1.0,
-    "reasoning": "brief explanation of why this category was chosen",
-    "extracted_info": {{
-        "order_number": "if mentioned",
-        "product_name": "if mentioned",
-        "error_message": "if mentioned"
-    }}
-}}
+    def _attach_extracted_info(self, query: str, routing_decision: RoutingDecision) -> RoutingDecision:
+        """Fill extracted_info with the locally extracted fields"""
+        routing_decision.extracted_info = self.extractor.extract(query)
+        return routing_decision
 
-IMPORTANT: Respond ONLY with the JSON object, no additional text."""
+    def may_have_several_intents(self, query: str) -> bool:
+        """Whether the query should get a multi-intent classification; in auto mode, when keywords of two categories appear"""
+        if self.multi_intent == "always":
+            return True
+        if self.multi_intent != "auto":
+            return False
+        return sum(1 for hits in self.predictor.matches(query).values() if hits) >= 2
 
-        try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[{"role": "user", "content": classification_prompt}]
+    def classify_intents(self, query: str) -> List[RoutingDecision]:
+        """Every request in the query as a RoutingDecision, most confident first.
+
+        Queries that do not look multi-intent (see ``MULTI_INTENT``) get the
+        usual single classification, as do ones the model fails to split.
+        """
+        if not self.may_have_several_intents(query):
+            return [self.classify_query(query)]
+
+        with deadline(settings.CLASSIFY_TIMEOUT), span("classify", source="multi_intent") as classify_span:
+            intents = self.classifier.classify_intents(query)
+            if intents:
+                classify_span.set(category=intents[0].category.value, intents=len(intents))
+
+        if not intents:
+            return [self.classify_query(query)]
+        return [self._attach_extracted_info(query, routing_decision) for routing_decision in intents]
+
+    def classify_many(self, queries: List[str]) -> List[RoutingDecision]:
+        """Classify many queries with one model call per batch.
+
+        Queries are packed into batches sized to fit the model's context
+        window. Items the model drops or answers invalidly are re-classified
+        one at a time.
+        """
+        model = self.classifier.model
+        decisions: List[Optional[RoutingDecision]] = []
+        predictions = {}
+        for index, query in enumerate(queries):
+            routing_decision = self.caches.cached_decision(query, model)
+            if routing_decision is None:
+                predictions[index] = self.learner.predict(query)
+                routing_decision = self.learner.serve(predictions[index]) or self._fast_path(query)
+                if routing_decision is not None:
+                    self.caches.store_decision(query, model, routing_decision)
+            decisions.append(routing_decision)
+        pending = [index for index, decision in enumerate(decisions) if decision is None]
+
+        # Identical queries in the same call are classified once
+        first_seen: Dict[str, int] = {}
+        duplicates: Dict[int, int] = {}
+        for index in pending:
+            key = self.caches.classification_key(queries[index], model)
+            if key in first_seen:
+                duplicates[index] = first_seen[key]
+            else:
+                first_seen[key] = index
+        if duplicates:
+            metrics.coalesced.inc(len(duplicates), kind="classification")
+            pending = [index for index in pending if index not in duplicates]
+
+        for batch in self.classifier.plan_batches([queries[index] for index in pending]):
+            batch = [pending[position] for position in batch]
+            parsed = self.classifier.classify_batch([queries[index] for index in batch])
+            for position, index in enumerate(batch):
+                decisions[index] = parsed.get(position)
+
+        failed = {index for index in pending if decisions[index] is None}
+        if failed:
+            logger.info("Re-classifying %s of %s queries individually", len(failed), len(queries))
+        for index in sorted(failed):
+            # classify escalates on its own, so these skip the escalation pass below
+            decisions[index] = self.classifier.classify(queries[index])
+        for index in pending:
+            if index not in failed and self.classifier.needs_escalation(decisions[index]):
+                decisions[index] = self.classifier.escalate(queries[index], decisions[index])
+        for index in pending:
+            self.learner.learn(queries[index], decisions[index], predictions[index], model)
+            self.caches.store_decision(queries[index], model, decisions[index])
+        for index, original in duplicates.items():
+            decisions[index] = RoutingDecision.from_dict(decisions[original].to_dict())
+
+        return [self._attach_extracted_info(query, decision) for query, decision in zip(queries, decisions)]
+
+    def warm_up(self) -> None:
+        """Load and pin every model used for routing, and cache the static prompt prefixes.
+
+        Called once at startup (with ``WARMUP_ON_START``) so the first query
+        does not pay for a model load. Models are loaded on every host and
+        kept for ``OLLAMA_KEEP_ALIVE``; the per-request prompt-eval time,
+        logged at debug level, confirms the cached prefixes are reused.
+        """
+        started = time.monotonic()
+        for handler in self.handlers.values():
+            self.client.warm_up(
+                handler.model_name, handler._build_messages("Hello", handler.system_prompt), options=handler.options
             )
-            
-            # Parse the JSON response
-            content = response['message']['content']
-            # Clean up the response if it contains markdown
-            content = content.strip()
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.endswith("```"):
-                content = content[:-3]
-            content = content.strip()
-            
-            result = json.loads(content)
-            
-            # Map string category to enum
-            category_str = result.get("category", "unknown")
+        self.classifier.warm_up()
+
+        embedders = [cache.embedder for cache in (self.semantic_router, self.caches.response_cache) if cache is not None]
+        for model_name in sorted({embedder.model_name for embedder in embedders}):
+            self.client.warm_up(model_name, embedding=True)
+        logger.info("Warmup finished in %.2fs", time.monotonic() - started)
+
+    def get_handler(self, routing_decision: RoutingDecision) -> BaseHandler:
+        """Select the handler responsible for a routing decision"""
+        return self.handlers.get(routing_decision.category, self.default_handler)
+
+    def _fallback_response(self, handler: BaseHandler, error: LLMClientError) -> HandlerResponse:
+        """Apologetic answer used when the model server fails, if fallbacks are enabled"""
+        if not settings.ENABLE_FALLBACK_HANDLER:
+            raise error
+        logger.error("%s failed, returning fallback response: %s", type(handler).__name__, str(error))
+        metrics.fallbacks.inc(handler=type(handler).__name__)
+        return HandlerResponse(
+            response=FALLBACK_MESSAGE,
+            metadata={"fallback": True, "error": str(error)},
+            handler_name=type(handler).__name__
+        )
+
+    def _select_handler(self, routing_decision: RoutingDecision) -> BaseHandler:
+        with span("select_handler", category=routing_decision.category.value):
+            return self.get_handler(routing_decision)
+
+    @staticmethod
+    def _generate_attributes(handler: BaseHandler, routing_decision: RoutingDecision) -> Dict[str, str]:
+        return {
+            "category": routing_decision.category.value,
+            "handler": type(handler).__name__,
+            "model": handler.model_for(routing_decision),
+        }
+
+    def dispatch(self, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        """Run the handler selected by an existing routing decision"""
+        handler = self._select_handler(routing_decision)
+        with deadline(settings.GENERATE_TIMEOUT):
+            return self._dispatch(handler, query, routing_decision)
+
+    def _dispatch(self, handler: BaseHandler, query: str, routing_decision: RoutingDecision) -> HandlerResponse:
+        with span("generate", **self._generate_attributes(handler, routing_decision)) as generate_span:
             try:
-                category = QueryCategory(category_str)
-            except ValueError:
-                category = QueryCategory.UNKNOWN
-            
-            return RoutingDecision(
-                category=category,
-                confidence=float(result.get("confidence", 0.5)),
-                reasoning=result.get("reasoning", ""),
-                extracted_info=result.get("extracted_info", {})
-            )
-            
-        except (json.JSONDecodeError, KeyError) as e:
-            logger.error("Error parsing classification response: %s", str(e))
-            return RoutingDecision(
-                category=QueryCategory.UNKNOWN,
-                confidence=0.0,
-                reasoning=f"Classification failed: {str(e)}",
-                extracted_info={}
-            )
-    
-    def route_query(self, query: str) -> Tuple[HandlerResponse, RoutingDecision]:
-        """Main routing method - classifies and routes the query"""
-        
-        logger.info("Routing query: %s ", query[:50]) 
-        
-        # Step 1: Classify the query
-        routing_decision = self.classify_query(query)
+                if not self.caches.uses_response_cache(handler, routing_decision):
+                    return self.caches.handle(handler, query, routing_decision)
+
+                cached, vector = self.caches.lookup_response(routing_decision, query)
+                if cached is not None:
+                    logger.info("Serving %s response from cache", routing_decision.category.value)
+                    generate_span.set(source="response_cache")
+                    return cached
+
+                response = self.caches.handle(handler, query, routing_decision)
+            except LLMClientError as e:
+                generate_span.set(source="fallback")
+                return self._fallback_response(handler, e)
+
+        self.caches.store_response(routing_decision, vector, response)
+        return response
+
+    def dispatch_intents(self, query: str, intents: List[RoutingDecision]) -> HandlerResponse:
+        """Answer every confident intent at the same time and merge the answers (see fan_out)"""
+        return answer_intents(self.dispatch, query, intents)
+
+    def finish_route(
+        self,
+        route_trace: Trace,
+        routing_decision: RoutingDecision,
+        response: HandlerResponse,
+        started: float,
+        query: Optional[str] = None,
+        conversation: Optional[Conversation] = None,
+    ) -> HandlerResponse:
+        """Record the finished route and attach its timings and token usage to the response (see RouteRecorder)"""
+        return self.recorder.finish(route_trace, routing_decision, response, started, query, conversation)
+
+    def conversation(self, session_id: Optional[str]) -> Optional[Conversation]:
+        """The session's conversation, or None without a session or with conversation memory off"""
+        return self.recorder.conversation(session_id)
+
+    def route_query(self, query: str, session_id: Optional[str] = None) -> Tuple[HandlerResponse, RoutingDecision]:
+        """Main routing method - classifies and routes the query, returning the top routing decision.
+
+        Queries sharing a ``session_id`` are one conversation: the classifier
+        and handlers see its earlier turns (see ConversationMemory).
+        """
+
+        logger.info("Routing query: %s ", query[:50])
+        started = time.perf_counter()
+        conversation = self.conversation(session_id)
+
+        # Stage deadlines below are capped by the route's own
+        with deadline(settings.ROUTE_TIMEOUT), trace() as route_trace, using(conversation):
+            # Step 1: Classify the query (into several intents when it asks for several things)
+            intents = self.classify_intents(query)
+            routing_decision = intents[0]
+            logger.info("Classification: %s  (confidence: %s)", routing_decision.category.value, routing_decision.confidence)
+
+            # Step 2 and 3: Route to the appropriate handlers and process the query
+            response = self.dispatch_intents(query, intents)
+
+        return self.finish_route(route_trace, routing_decision, response, started, query, conversation), routing_decision
+
+    def route_query_stream(
+        self, query: str, session_id: Optional[str] = None
+    ) -> Iterator[Union[RoutingDecision, str, HandlerResponse]]:
+        """Streaming variant of route_query.
+
+        Yields the RoutingDecision as soon as classification finishes, then the
+        handler's response text chunk by chunk, and finally the complete
+        HandlerResponse. Streams answer a single intent.
+        """
+
+        logger.info("Routing query (streaming): %s ", query[:50])
+        started = time.perf_counter()
+        # The trace, deadline and conversation are only active between yields, never while the caller holds control
+        route_trace = Trace()
+        route_expires = expires_in(settings.ROUTE_TIMEOUT)
+        conversation = self.conversation(session_id)
+
+        with trace(route_trace), until(route_expires), using(conversation):
+            routing_decision = self.classify_query(query)
         logger.info("Classification: %s  (confidence: %s)", routing_decision.category.value, routing_decision.confidence)
-        
-        # Step 2: Route to appropriate handler
-        handler = self.handlers.get(routing_decision.category, self.default_handler)
-        
-        # Step 3: Process with the selected handler
-        response = handler.handle(query, routing_decision)
-        
-        return response, routing_decision
+        yield routing_decision
+
+        with trace(route_trace), until(route_expires), using(conversation):
+            handler = self._select_handler(routing_decision)
+            generate_expires = expires_in(settings.GENERATE_TIMEOUT)
+            uses_cache = self.caches.uses_response_cache(handler, routing_decision)
+        generate_span = Span("generate", self._generate_attributes(handler, routing_decision))
+        vector = None
+        if uses_cache:
+            cached, vector = self.caches.lookup_response(routing_decision, query)
+            if cached is not None:
+                generate_span.set(source="response_cache")
+                finish_span(generate_span, route_trace)
+                yield cached.response
+                yield self.finish_route(route_trace, routing_decision, cached, started, query, conversation)
+                return
 
+        try:
+            stream = iterate_until(iterate_using(handler.handle_stream(query, routing_decision), conversation), generate_expires)
+            for event in iterate_in_span(stream, generate_span):
+                if isinstance(event, HandlerResponse):
+                    finish_span(generate_span, route_trace)
+                    if vector is not None:
+                        self.caches.store_response(routing_decision, vector, event)
+                    event = self.finish_route(route_trace, routing_decision, event, started, query, conversation)
+                yield event
+        except LLMClientError as e:
+            generate_span.set(source="fallback")
+            finish_span(generate_span, route_trace)
+            fallback = self._fallback_response(handler, e)
+            yield fallback.response
+            yield self.finish_route(route_trace, routing_decision, fallback, started, query, conversation)
@@ -0,0 +1,224 @@
+"""Admission control for handler generations.
+
+With ``ENABLE_SCHEDULER``, AsyncRouter (and so the HTTP server) runs at
+most ``SCHEDULER_CONCURRENCY`` handler generations at once. Waiting
+queries are served by weighted fair queuing across categories, so refunds
+and billing go ahead of product browsing without starving it. Queries that
+would miss their category's deadline are shed (``503`` from the server)
+or, with ``SCHEDULER_OVERLOAD_POLICY=degrade``, answered with a short busy
+message. Weights, deadlines and queue limits come from
+``SCHEDULER_POLICIES``; ``AdmissionScheduler.as_dict()`` (also on
+``/health``) reports queue depth, wait percentiles and shed counts per
+category.
+"""
+from collections import deque
+from typing import Any, Deque, Dict, List, Mapping, Optional, Tuple
+import asyncio
+import heapq
+import time
+import numpy as np
+from src.models.routing import QueryCategory
+
+
+class CategoryPolicy:
+    """How a category competes for handler slots"""
+
+    def __init__(self, weight: float = 1.0, deadline: float = 30.0, max_queue: int = 100):
+        # Share of the slots relative to other categories with waiting queries
+        self.weight = weight
+        # Seconds from arrival by which generation should have started and finished
+        self.deadline = deadline
+        self.max_queue = max_queue
+
+
+# Money matters first; browsing and FAQs take what is left
+DEFAULT_POLICIES = {
+    QueryCategory.REFUND_REQUEST: CategoryPolicy(weight=4.0, deadline=20.0),
+    QueryCategory.BILLING_QUESTION: CategoryPolicy(weight=4.0, deadline=20.0),
+    QueryCategory.TECHNICAL_SUPPORT: CategoryPolicy(weight=2.0, deadline=30.0),
+    QueryCategory.GENERAL_INQUIRY: CategoryPolicy(weight=1.0, deadline=30.0),
+    QueryCategory.PRODUCT_RECOMMENDATION: CategoryPolicy(weight=1.0, deadline=30.0),
+    QueryCategory.UNKNOWN: CategoryPolicy(weight=1.0, deadline=30.0),
+}
+
+# Wait times kept per category for the percentiles in stats
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """A query was turned away because it would miss its deadline or its queue is full"""
+
+    def __init__(self, category: QueryCategory, reason: str):
+        super().__init__(f"{category.value} query shed: {reason}")
+        self.category = category
+        self.reason = reason
+
+
+class _Waiter:
+    def __init__(self, category: QueryCategory, future: asyncio.Future):
+        self.category = category
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class _CategoryStats:
+    def __init__(self):
+        self.queued = 0
+        self.running = 0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {}
+        self.waits: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+        # Moving average of how long a handler of this category holds its slot
+        self.service_time: Optional[float] = None
+
+    def record_service(self, seconds: float) -> None:
+        self.service_time = seconds if self.service_time is None else 0.8 * self.service_time + 0.2 * seconds
+
+
+class AdmissionScheduler:
+    """Weighted fair queuing of handler executions across query categories.
+
+    At most ``concurrency`` handlers run at once. When all slots are busy,
+    waiting queries are ordered by virtual finish time, so each category with
+    waiting queries gets slots in proportion to its weight and a busy
+    low-priority category cannot starve the others. A query whose predicted
+    wait would make it miss its category's deadline, or that is still waiting
+    when only its expected service time remains, is rejected with
+    AdmissionRejected so the caller can shed or degrade it.
+
+    Runs on the asyncio event loop; it is not thread-safe.
+    """
+
+    def __init__(self, concurrency: int, policies: Optional[Mapping[QueryCategory, CategoryPolicy]] = None):
+        self.concurrency = concurrency
+        self.policies: Dict[QueryCategory, CategoryPolicy] = {**DEFAULT_POLICIES, **(policies or {})}
+        self.running = 0
+        self._heap: List[Tuple[float, int, _Waiter]] = []
+        self._sequence = 0
+        self._virtual_time = 0.0
+        self._last_tag: Dict[QueryCategory, float] = {}
+        self._stats: Dict[QueryCategory, _CategoryStats] = {category: _CategoryStats() for category in QueryCategory}
+
+    @classmethod
+    def from_settings(cls, concurrency: int, overrides: Mapping[str, Mapping[str, Any]]) -> "AdmissionScheduler":
+        """Build from ``{"category_value": {"weight": ..., "deadline": ..., "max_queue": ...}}`` overrides"""
+        policies = {}
+        for value, options in overrides.items():
+            category = QueryCategory(value)
+            default = DEFAULT_POLICIES[category]
+            policies[category] = CategoryPolicy(
+                weight=float(options.get("weight", default.weight)),
+                deadline=float(options.get("deadline", default.deadline)),
+                max_queue=int(options.get("max_queue", default.max_queue)),
+            )
+        return cls(concurrency, policies)
+
+    @property
+    def queued(self) -> int:
+        return sum(stats.queued for stats in self._stats.values())
+
+    def _expected_service(self, category: QueryCategory) -> float:
+        own = self._stats[category].service_time
+        if own is not None:
+            return own
+        known = [stats.service_time for stats in self._stats.values() if stats.service_time is not None]
+        return sum(known) / len(known) if known else 0.0
+
+    def _predicted_wait(self, tag: float) -> float:
+        """Rough wait for a query with finish tag ``tag``: the work queued ahead of it spread over all slots"""
+        ahead = [waiter for queued_tag, _, waiter in self._heap if queued_tag <= tag and not waiter.future.done()]
+        work = sum(self._expected_service(waiter.category) for waiter in ahead)
+        return work / self.concurrency
+
+    def _reject(self, category: QueryCategory, reason: str) -> AdmissionRejected:
+        stats = self._stats[category]
+        stats.shed[reason] = stats.shed.get(reason, 0) + 1
+        return AdmissionRejected(category, reason)
+
+    def _start(self, category: QueryCategory, waited: float) -> None:
+        stats = self._stats[category]
+        self.running += 1
+        stats.running += 1
+        stats.admitted += 1
+        stats.waits.append(waited)
+
+    def try_acquire(self, category: QueryCategory) -> bool:
+        """Take a slot only if one is idle and no query is waiting, for work that must never delay real queries"""
+        if self.running < self.concurrency and not self.queued:
+            self._start(category, 0.0)
+            return True
+        return False
+
+    async def acquire(self, category: QueryCategory) -> None:
+        """Wait for a handler slot; raises AdmissionRejected when the query should be shed"""
+        if self.try_acquire(category):
+            return
+
+        policy = self.policies[category]
+        stats = self._stats[category]
+        if stats.queued >= policy.max_queue:
+            raise self._reject(category, "queue_full")
+
+        tag = max(self._virtual_time, self._last_tag.get(category, 0.0)) + 1.0 / policy.weight
+        expected_service = self._expected_service(category)
+        if self._predicted_wait(tag) + expected_service > policy.deadline:
+            raise self._reject(category, "deadline")
+
+        self._last_tag[category] = tag
+        waiter = _Waiter(category, asyncio.get_running_loop().create_future())
+        self._sequence += 1
+        heapq.heappush(self._heap, (tag, self._sequence, waiter))
+        stats.queued += 1
+        self._grant()
+
+        try:
+            await asyncio.wait_for(waiter.future, max(policy.deadline - expected_service, 0.0))
+        except asyncio.TimeoutError:
+            stats.queued -= 1
+            raise self._reject(category, "deadline")
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller gave up; hand the slot on
+                self.release(category)
+            else:
+                stats.queued -= 1
+            raise
+
+    def release(self, category: QueryCategory, service_seconds: Optional[float] = None) -> None:
+        """Free a slot and start the next waiting query in fair order"""
+        stats = self._stats[category]
+        self.running -= 1
+        stats.running -= 1
+        if service_seconds is not None:
+            stats.record_service(service_seconds)
+        self._grant()
+
+    def _grant(self) -> None:
+        """Start waiting queries in virtual finish order while slots are free"""
+        while self.running < self.concurrency and self._heap:
+            tag, _, waiter = heapq.heappop(self._heap)
+            if waiter.future.done():
+                # Timed out or cancelled while waiting
+                continue
+            self._virtual_time = tag
+            self._stats[waiter.category].queued -= 1
+            self._start(waiter.category, time.monotonic() - waiter.enqueued)
+            waiter.future.set_result(None)
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth, wait times and shed counts per category"""
+        result = {}
+        for category, stats in self._stats.items():
+            waits = np.array(stats.waits) * 1000 if stats.waits else None
+            result[category.value] = {
+                "queued": stats.queued,
+                "running": stats.running,
+                "admitted": stats.admitted,
+                "shed": dict(stats.shed),
+                "wait_p50_ms": round(float(np.percentile(waits, 50)), 2) if waits is not None else 0.0,
+                "wait_p95_ms": round(float(np.percentile(waits, 95)), 2) if waits is not None else 0.0,
+                "service_ms": round(stats.service_time * 1000, 2) if stats.service_time is not None else None,
+                "weight": self.policies[category].weight,
+                "deadline": self.policies[category].deadline,
+            }
+        return result
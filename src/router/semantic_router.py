@@ -0,0 +1,122 @@
+from typing import List, Optional, Tuple
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from src.config.settings import settings
+from src.config.sample_queries import labeled_examples
+from src.models.routing import QueryCategory, RoutingDecision
+from src.utils.embeddings import Embedder
+from src.utils.logging_config import logger
+
+
+class SemanticRouter:
+    """Embedding-based fast path that routes obvious queries without an LLM call.
+
+    The query is compared against a matrix of labelled exemplar embeddings.
+    The best similarity per category is turned into a softmax score, so the
+    confidence reflects the margin between the winning category and the rest.
+    Only when it clears the confidence threshold is a decision returned;
+    otherwise the caller falls through to the LLM classifier.
+
+    The exemplar matrix is saved as a ``.npy`` file next to a small JSON
+    manifest and memory-mapped on later starts, so exemplars are only
+    re-embedded when the model or the exemplar set changes.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        examples: Optional[List[Tuple[str, QueryCategory]]] = None,
+        index_path: str = None,
+        threshold: float = None,
+        min_similarity: float = None,
+        temperature: float = None,
+    ):
+        self.embedder = embedder or Embedder()
+        self.examples = examples if examples is not None else labeled_examples()
+        self.index_path = index_path or settings.SEMANTIC_INDEX_PATH
+        self.threshold = threshold if threshold is not None else settings.DEFAULT_CONFIDENCE_THRESHOLD
+        self.min_similarity = min_similarity if min_similarity is not None else settings.SEMANTIC_MIN_SIMILARITY
+        self.temperature = temperature or settings.SEMANTIC_TEMPERATURE
+
+        self.categories = [category for category in QueryCategory if category != QueryCategory.UNKNOWN]
+        self.labels = np.array([self.categories.index(category) for _, category in self.examples], dtype=np.int32)
+        self._matrix: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.splitext(self.index_path)[0] + ".json"
+
+    def _fingerprint(self) -> str:
+        """Hash of the embedding model and exemplar set the index was built from"""
+        payload = json.dumps(
+            [self.embedder.model_name, [(text, category.value) for text, category in self.examples]]
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def matrix(self) -> np.ndarray:
+        """Exemplar embedding matrix, loaded from disk or built on first use"""
+        if self._matrix is None:
+            with self._lock:
+                if self._matrix is None:
+                    matrix = self._load_index()
+                    self._matrix = matrix if matrix is not None else self._build_index()
+        return self._matrix
+
+    def _load_index(self) -> Optional[np.ndarray]:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as manifest_file:
+                manifest = json.load(manifest_file)
+            if manifest.get("fingerprint") != self._fingerprint():
+                logger.info("Semantic index at %s is stale, rebuilding", self.index_path)
+                return None
+            return np.load(self.index_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+
+    def _build_index(self) -> np.ndarray:
+        logger.info("Embedding %s exemplars for the semantic router", len(self.examples))
+        matrix = self.embedder.embed_many([text for text, _ in self.examples])
+
+        directory = os.path.dirname(self.index_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        np.save(self.index_path, matrix)
+        with open(self.manifest_path, "w", encoding="utf-8") as manifest_file:
+            json.dump({"fingerprint": self._fingerprint(), "model": self.embedder.model_name}, manifest_file)
+
+        return np.load(self.index_path, mmap_mode="r")
+
+    def score(self, query_vector: np.ndarray) -> Tuple[QueryCategory, float, float]:
+        """Return the best category, its softmax confidence and its raw cosine similarity"""
+        similarities = self.matrix() @ query_vector
+
+        best_per_category = np.full(len(self.categories), -1.0, dtype=np.float32)
+        np.maximum.at(best_per_category, self.labels, similarities)
+
+        logits = (best_per_category - best_per_category.max()) / self.temperature
+        probabilities = np.exp(logits) / np.exp(logits).sum()
+        best = int(np.argmax(probabilities))
+
+        return self.categories[best], float(probabilities[best]), float(best_per_category[best])
+
+    def route(self, query: str) -> Optional[RoutingDecision]:
+        """Return a decision for clear-cut queries, or None to fall through to the LLM"""
+        try:
+            category, confidence, similarity = self.score(self.embedder.embed(query))
+        except Exception as e:
+            logger.warning("Semantic routing unavailable, falling back to LLM: %s", str(e))
+            return None
+
+        if confidence < self.threshold or similarity < self.min_similarity:
+            return None
+
+        return RoutingDecision(
+            category=category,
+            confidence=confidence,
+            reasoning=f"Semantic match to {category.value} examples (similarity {similarity:.2f})",
+            extracted_info={}
+        )
@@ -0,0 +1,96 @@
+from collections import Counter
+from typing import Dict, Optional, Tuple
+import re
+import threading
+from src.models.routing import QueryCategory
+
+# Cheap signals used to guess the category before the classifier answers
+CATEGORY_KEYWORDS = {
+    QueryCategory.GENERAL_INQUIRY: [
+        "hours", "open", "located", "location", "address", "shipping", "contact", "policy",
+    ],
+    QueryCategory.REFUND_REQUEST: [
+        "refund", "return", "returns", "exchange", "damaged", "broken", "wrong item", "never arrived", "money back",
+    ],
+    QueryCategory.TECHNICAL_SUPPORT: [
+        "error", "crash", "crashing", "bug", "won't load", "not working", "log in", "login", "password", "reset",
+    ],
+    QueryCategory.BILLING_QUESTION: [
+        "charge", "charged", "invoice", "billing", "bill", "payment", "subscription", "card", "receipt",
+    ],
+    QueryCategory.PRODUCT_RECOMMENDATION: [
+        "recommend", "suggest", "suggestion", "best", "which", "choosing", "compare", "gift", "looking for",
+    ],
+}
+
+
+class KeywordPredictor:
+    """Guesses a query's category from keywords, falling back to observed category priors"""
+
+    def __init__(self, keywords: Optional[Dict[QueryCategory, list]] = None):
+        keywords = keywords or CATEGORY_KEYWORDS
+        self.patterns = {
+            category: re.compile(r"\b(?:" + "|".join(re.escape(word) for word in words) + r")\b", re.IGNORECASE)
+            for category, words in keywords.items()
+        }
+        self.priors: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def matches(self, query: str) -> Dict[QueryCategory, int]:
+        """Keyword hits per category"""
+        return {category: len(pattern.findall(query)) for category, pattern in self.patterns.items()}
+
+    def predict(self, query: str) -> Tuple[Optional[QueryCategory], float]:
+        """Return the likely category and a rough confidence in [0, 1]"""
+        hits = self.matches(query)
+        total = sum(hits.values())
+
+        if total:
+            category = max(hits, key=hits.get)
+            best = hits[category]
+            return category, best / total * min(1.0, 0.5 + 0.25 * best)
+
+        with self._lock:
+            observed = sum(self.priors.values())
+            if not observed:
+                return None, 0.0
+            category, count = self.priors.most_common(1)[0]
+            return category, count / observed
+
+    def observe(self, category: QueryCategory) -> None:
+        """Record the authoritative category so priors track real traffic"""
+        if category != QueryCategory.UNKNOWN:
+            with self._lock:
+                self.priors[category] += 1
+
+
+class SpeculationStats:
+    """Counters describing how often speculative handler runs paid off"""
+
+    def __init__(self):
+        self.attempts = 0
+        self.hits = 0
+        self.misses = 0
+        self.wasted_tokens = 0
+        self._lock = threading.Lock()
+
+    def record_hit(self) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.hits += 1
+
+    def record_miss(self, wasted_tokens: int) -> None:
+        with self._lock:
+            self.attempts += 1
+            self.misses += 1
+            self.wasted_tokens += wasted_tokens
+
+    def as_dict(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "attempts": self.attempts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / self.attempts if self.attempts else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+            }
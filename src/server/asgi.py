@@ -0,0 +1,422 @@
+"""
+ASGI service exposing the router over HTTP.
+
+    POST /route          {"query": "...", "session_id": "..."} -> routing decision and handler response as JSON
+    POST /route/stream   {"query": "...", "session_id": "..."} -> NDJSON events: decision, text chunks, response
+    GET  /health         queue depth, draining state and Ollama backend status
+    GET  /metrics        Prometheus metrics
+
+Requests wait in a bounded queue served by a fixed number of workers; a full
+queue answers 429 instead of letting latency grow without limit. Queries that
+arrive within a short window are classified together with one batched model
+call, and shutdown stops accepting requests but finishes the queued ones.
+Requests with the same optional ``session_id`` form one conversation.
+"""
+
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import contextvars
+import json
+import time
+from src.config.settings import settings
+from src.utils.logging_config import logger
+from src.models.routing import RoutingDecision
+from src.models.responses import HandlerResponse
+from src.router.async_router import AsyncRouter
+from src.router.prompts import classification_failed
+from src.router.scheduler import AdmissionRejected
+from src.utils.conversation import Conversation, has_history, using
+from src.utils.deadline import current_deadline, deadline, expires_in, remaining, until
+from src.utils.llm_client import DeadlineExceeded
+from src.utils.metrics import Span, Trace, finish_span, metrics, span, trace
+
+Scope = Dict[str, Any]
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Marks the end of a job's events
+_DONE = object()
+
+
+class ClassificationBatcher:
+    """Collects queries for ``window`` seconds and classifies them with one model call.
+
+    The batch runs outside any request's context, so it gets its own
+    ``CLASSIFY_TIMEOUT``, capped by the latest deadline among its callers;
+    each caller still stops waiting at its own deadline.
+    """
+
+    def __init__(self, router: AsyncRouter, window: float, max_size: int):
+        self.router = router
+        self.window = window
+        self.max_size = max_size
+        self._pending: List[Tuple[str, asyncio.Future, Optional[float]]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def classify(self, query: str) -> RoutingDecision:
+        if self.window <= 0:
+            return await self.router.classify_query_async(query)
+
+        expires = current_deadline()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query, future, expires))
+        if len(self._pending) >= self.max_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        try:
+            async with asyncio.timeout(remaining(expires)):
+                return await future
+        except TimeoutError:
+            raise DeadlineExceeded("Deadline exceeded waiting for batched classification")
+
+    def flush(self) -> None:
+        """Classify everything collected so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            # A fresh context keeps the batch's spans out of whichever request triggered the flush
+            task = asyncio.create_task(self._classify_batch(batch), context=contextvars.Context())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _classify_batch(self, batch: List[Tuple[str, asyncio.Future, Optional[float]]]) -> None:
+        queries = [query for query, _, _ in batch]
+        deadlines = [expires for _, _, expires in batch]
+        # No caller waits past its own deadline, so the batch need not outlive the latest one
+        latest = None if None in deadlines else max(deadlines)
+        try:
+            with until(latest), deadline(settings.CLASSIFY_TIMEOUT):
+                if len(batch) == 1:
+                    # A lone query keeps the streaming, early-exit classification
+                    decisions = [await self.router.classify_query_async(queries[0])]
+                else:
+                    logger.info("Classifying %s queued queries in one batch", len(batch))
+                    decisions = await asyncio.to_thread(self.router.classify_many, queries)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), decision in zip(batch, decisions):
+            if not future.done():
+                future.set_result(decision)
+
+
+class _Job:
+    """One queued request; the worker reports its progress through ``events``"""
+
+    def __init__(self, query: str, stream: bool, session_id: Optional[str] = None):
+        self.query = query
+        self.stream = stream
+        self.session_id = session_id
+        self.events: asyncio.Queue = asyncio.Queue()
+        self.enqueued = time.perf_counter()
+        # The route deadline starts at enqueue time, so time spent queued counts against it
+        self.expires = expires_in(settings.ROUTE_TIMEOUT)
+        # Set when the client disconnects before the job finishes
+        self.abandoned = False
+
+
+class RoutingService:
+    """Bounded request queue and worker pool in front of an AsyncRouter"""
+
+    def __init__(
+        self,
+        router: Optional[AsyncRouter] = None,
+        queue_size: Optional[int] = None,
+        workers: Optional[int] = None,
+        batch_window: Optional[float] = None,
+        drain_timeout: Optional[float] = None,
+    ):
+        self.router = router
+        self.queue_size = queue_size or settings.SERVER_QUEUE_SIZE
+        self.worker_count = workers or settings.SERVER_WORKERS
+        self.batch_window = settings.SERVER_BATCH_WINDOW_MS / 1000 if batch_window is None else batch_window
+        self.drain_timeout = settings.SERVER_DRAIN_TIMEOUT if drain_timeout is None else drain_timeout
+
+        self.queue: Optional[asyncio.Queue] = None
+        self.batcher: Optional[ClassificationBatcher] = None
+        self.accepting = False
+        self.in_flight = 0
+        self._workers: List[asyncio.Task] = []
+
+    async def start(self) -> None:
+        if self.router is None:
+            self.router = AsyncRouter()
+        if settings.WARMUP_ON_START:
+            await asyncio.to_thread(self.router.warm_up)
+
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.batcher = ClassificationBatcher(self.router, self.batch_window, settings.CLASSIFY_BATCH_MAX_SIZE)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.worker_count)]
+        self.accepting = True
+        logger.info("Routing service started with %s workers and a queue of %s", self.worker_count, self.queue_size)
+
+    async def stop(self) -> None:
+        """Stop accepting requests, finish the queued ones, then stop the workers"""
+        self.accepting = False
+        if self.queue is not None:
+            logger.info("Draining %s queued and %s running requests", self.queue.qsize(), self.in_flight)
+            try:
+                await asyncio.wait_for(self.queue.join(), self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Drain timed out after %ss with %s requests unfinished", self.drain_timeout, self.queue.qsize() + self.in_flight)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, query: str, stream: bool, session_id: Optional[str] = None) -> Optional[_Job]:
+        """Queue a query, or return None when the service is full or draining"""
+        if not self.accepting:
+            return None
+        job = _Job(query, stream, session_id)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            return None
+        return job
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "status": "ok" if self.accepting else "draining",
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "in_flight": self.in_flight,
+            "workers": len(self._workers),
+            "backends": self.router.client.pool.stats() if self.router is not None else [],
+            "scheduler": self.router.scheduler.as_dict() if self.router is not None and self.router.scheduler else None,
+        }
+
+    async def _work(self) -> None:
+        while True:
+            job = await self.queue.get()
+            self.in_flight += 1
+            try:
+                if not job.abandoned:
+                    await self._process(job)
+            except AdmissionRejected as e:
+                job.events.put_nowait(e)
+            except Exception as e:
+                logger.error("Routing failed for queued query: %s", str(e))
+                job.events.put_nowait(e)
+            finally:
+                self.in_flight -= 1
+                job.events.put_nowait(_DONE)
+                self.queue.task_done()
+
+    async def _process(self, job: _Job) -> None:
+        conversation = self.router.conversation(job.session_id)
+        with using(conversation), until(job.expires):
+            await self._route_job(job, conversation)
+
+    async def _route_job(self, job: _Job, conversation: Optional[Conversation]) -> None:
+        started = job.enqueued
+        route_trace = Trace()
+        finish_span(Span("queue"), route_trace, duration=time.perf_counter() - job.enqueued)
+
+        with trace(route_trace):
+            if not job.stream and self.router.may_have_several_intents(job.query):
+                intents = await self.router.classify_intents_async(job.query)
+            elif has_history():
+                # Batched prompts carry no conversation, so follow-ups are classified on their own
+                intents = [await self.router.classify_query_async(job.query)]
+            else:
+                with span("classify.batch"):
+                    try:
+                        intents = [await self.batcher.classify(job.query)]
+                    except DeadlineExceeded as e:
+                        # Degrades like classify_query: the route goes on with an UNKNOWN decision
+                        intents = [self.router._attach_extracted_info(job.query, classification_failed(e))]
+        routing_decision = intents[0]
+        job.events.put_nowait(routing_decision)
+
+        if job.stream:
+            events = self.router.dispatch_stream_async(job.query, routing_decision, route_trace, started)
+            try:
+                async for event in events:
+                    if job.abandoned:
+                        break
+                    job.events.put_nowait(event)
+            finally:
+                await events.aclose()
+            return
+
+        with trace(route_trace):
+            response = await self.router.dispatch_intents_async(job.query, intents)
+        job.events.put_nowait(
+            await self.router.finish_route_async(route_trace, routing_decision, response, started, job.query, conversation)
+        )
+
+
+def _response_payload(response: HandlerResponse) -> Dict[str, Any]:
+    return {"response": response.response, "handler_name": response.handler_name, "metadata": response.metadata}
+
+
+def _encode(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, default=str).encode("utf-8")
+
+
+class RoutingApp:
+    """The ASGI application; no web framework needed"""
+
+    def __init__(self, service: Optional[RoutingService] = None):
+        self.service = service or RoutingService()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+
+        path, method = scope["path"].rstrip("/") or "/", scope["method"]
+        if path == "/health" and method == "GET":
+            await self._send_json(send, 200, self.service.health())
+        elif path == "/metrics" and method == "GET":
+            body = metrics.render_prometheus().encode("utf-8")
+            await self._send(send, 200, body, "text/plain; version=0.0.4")
+        elif path in ("/route", "/route/stream"):
+            if method != "POST":
+                await self._send_json(send, 405, {"error": "method not allowed"})
+                return
+            await self._route(receive, send, stream=path == "/route/stream")
+        else:
+            await self._send_json(send, 404, {"error": "not found"})
+
+    async def _lifespan(self, receive: Receive, send: Send) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                try:
+                    await self.service.start()
+                except Exception as e:
+                    logger.error("Routing service failed to start: %s", str(e))
+                    await send({"type": "lifespan.startup.failed", "message": str(e)})
+                    return
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.service.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _route(self, receive: Receive, send: Send, stream: bool) -> None:
+        query, session_id, error = await self._read_query(receive)
+        if error is not None:
+            await self._send_json(send, error[0], {"error": error[1]})
+            return
+
+        job = self.service.submit(query, stream, session_id)
+        if job is None:
+            reason = "queue_full" if self.service.accepting else "draining"
+            metrics.rejections.inc(reason=reason)
+            status = 429 if self.service.accepting else 503
+            await self._send_json(send, status, {"error": f"server busy ({reason})"}, [(b"retry-after", b"1")])
+            return
+
+        watcher = asyncio.create_task(self._watch_disconnect(receive, job))
+        try:
+            if stream:
+                await self._stream_events(send, job)
+            else:
+                await self._send_result(send, job)
+        finally:
+            watcher.cancel()
+
+    async def _send_result(self, send: Send, job: _Job) -> None:
+        routing_decision, response = None, None
+        while True:
+            event = await job.events.get()
+            if event is _DONE:
+                break
+            if isinstance(event, AdmissionRejected):
+                await self._send_json(send, 503, {"error": str(event)}, [(b"retry-after", b"1")])
+                return
+            if isinstance(event, Exception):
+                await self._send_json(send, 500, {"error": str(event)})
+                return
+            if isinstance(event, RoutingDecision):
+                routing_decision = event
+            elif isinstance(event, HandlerResponse):
+                response = event
+        if response is None:
+            # The client disconnected before its job ran
+            return
+        await self._send_json(send, 200, {"decision": routing_decision.to_dict(), **_response_payload(response)})
+
+    async def _stream_events(self, send: Send, job: _Job) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson"), (b"cache-control", b"no-cache")],
+        })
+        while True:
+            event = await job.events.get()
+            if event is _DONE:
+                break
+            if isinstance(event, RoutingDecision):
+                payload = {"type": "decision", **event.to_dict()}
+            elif isinstance(event, HandlerResponse):
+                payload = {"type": "response", **_response_payload(event)}
+            elif isinstance(event, AdmissionRejected):
+                payload = {"type": "shed", "error": str(event), "reason": event.reason}
+            elif isinstance(event, Exception):
+                payload = {"type": "error", "error": str(event)}
+            else:
+                payload = {"type": "chunk", "text": event}
+            await send({"type": "http.response.body", "body": _encode(payload) + b"\n", "more_body": True})
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+    @staticmethod
+    async def _watch_disconnect(receive: Receive, job: _Job) -> None:
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                job.abandoned = True
+                return
+
+    @staticmethod
+    async def _read_query(receive: Receive) -> Tuple[Optional[str], Optional[str], Optional[Tuple[int, str]]]:
+        """Parse ``{"query": "...", "session_id": "..."}`` from the request body, or return an HTTP error"""
+        body = b""
+        while True:
+            message = await receive()
+            body += message.get("body", b"")
+            if len(body) > settings.SERVER_MAX_BODY_BYTES:
+                return None, None, (413, "request body too large")
+            if not message.get("more_body"):
+                break
+        try:
+            payload = json.loads(body or b"{}")
+            query, session_id = payload.get("query"), payload.get("session_id")
+        except (ValueError, AttributeError):
+            return None, None, (400, "body must be a JSON object")
+        if not isinstance(query, str) or not query.strip():
+            return None, None, (400, "'query' must be a non-empty string")
+        if session_id is not None and (not isinstance(session_id, str) or not session_id):
+            return None, None, (400, "'session_id' must be a non-empty string")
+        return query, session_id, None
+
+    @staticmethod
+    async def _send(send: Send, status: int, body: bytes, content_type: str, headers: List[Tuple[bytes, bytes]] = ()) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type.encode("latin-1")), (b"content-length", str(len(body)).encode("latin-1")), *headers],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    async def _send_json(self, send: Send, status: int, payload: Dict[str, Any], headers: List[Tuple[bytes, bytes]] = ()) -> None:
+        await self._send(send, status, _encode(payload), "application/json", headers)
+
+
+def create_app(service: Optional[RoutingService] = None) -> RoutingApp:
+    """Build the ASGI app; the router is created and warmed up at server startup"""
+    return RoutingApp(service)
+
+
+app = create_app()
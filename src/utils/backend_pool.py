@@ -0,0 +1,199 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import asyncio
+import statistics
+import threading
+import time
+import weakref
+import ollama
+from src.utils.logging_config import logger
+
+
+class Backend:
+    """One Ollama host with its pooled clients and health bookkeeping"""
+
+    def __init__(self, host: str, http_options: Dict[str, Any], breaker):
+        self.host = host
+        self.client = ollama.Client(host=host, **http_options)
+        self.breaker = breaker
+        self.outstanding = 0
+        # (model, operation) -> smoothed latency and sample count, so only like requests are compared
+        self.ewma_latency: Dict[Tuple[str, str], float] = {}
+        self.samples: Dict[Tuple[str, str], int] = {}
+        # model name -> monotonic time it last answered on this host
+        self.loaded_models: Dict[str, float] = {}
+
+        self._http_options = http_options
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ollama.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    @property
+    def async_client(self) -> ollama.AsyncClient:
+        """Async client bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = ollama.AsyncClient(host=self.host, **self._http_options)
+        return client
+
+    def __repr__(self) -> str:
+        return f"Backend({self.host}, outstanding={self.outstanding}, state={self.breaker.state})"
+
+
+class Lease:
+    """A backend checked out for one request"""
+
+    def __init__(self, backend: Backend, model: str, operation: str = ""):
+        self.backend = backend
+        self.model = model
+        self.operation = operation
+        self.started = time.monotonic()
+
+
+class BackendPool:
+    """Schedules requests across several Ollama hosts.
+
+    Each request goes to the healthy host with the fewest outstanding
+    requests. Hosts that recently served the requested model are preferred
+    while they are within ``affinity_slack`` requests of the least loaded
+    host, so warm models are reused. Hosts are ejected through their circuit
+    breaker when they fail repeatedly or become much slower than their peers
+    at the same model and operation; streams are timed to their first part,
+    so answer length does not count against a host.
+    A background thread probes ejected hosts and re-admits them once they
+    answer again.
+    """
+
+    def __init__(
+        self,
+        hosts: Iterable[str],
+        http_options: Dict[str, Any],
+        breaker_factory,
+        affinity_window: float = 300.0,
+        affinity_slack: int = 2,
+        slow_factor: float = 3.0,
+        health_check_interval: float = 10.0,
+    ):
+        self.backends: List[Backend] = [Backend(host, http_options, breaker_factory()) for host in hosts]
+        if not self.backends:
+            raise ValueError("BackendPool needs at least one host")
+        self.affinity_window = affinity_window
+        self.affinity_slack = affinity_slack
+        self.slow_factor = slow_factor
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Lock()
+        self._health_thread: Optional[threading.Thread] = None
+        if health_check_interval > 0 and len(self.backends) > 1:
+            self._health_thread = threading.Thread(target=self._health_loop, name="ollama-health", daemon=True)
+            self._health_thread.start()
+
+    def acquire(self, model: str, exclude: Iterable[Backend] = (), operation: str = "") -> Optional[Lease]:
+        """Check out the best backend for a model, or None if every host is ejected"""
+        excluded = set(id(backend) for backend in exclude)
+        with self._lock:
+            candidates = [b for b in self.backends if id(b) not in excluded] or self.backends
+            backend = self._pick(candidates, model)
+            if backend is None:
+                return None
+            backend.outstanding += 1
+            return Lease(backend, model, operation)
+
+    def _pick(self, candidates: List[Backend], model: str) -> Optional[Backend]:
+        closed = [b for b in candidates if b.breaker.state == "closed"]
+        if not closed:
+            # Every candidate is ejected: let one half-open host take a trial request
+            for backend in sorted(candidates, key=lambda b: b.outstanding):
+                if backend.breaker.allow():
+                    return backend
+            return None
+
+        least = min(closed, key=lambda b: b.outstanding)
+        now = time.monotonic()
+        warm = [
+            b for b in closed
+            if now - b.loaded_models.get(model, float("-inf")) <= self.affinity_window
+            and b.outstanding <= least.outstanding + self.affinity_slack
+        ]
+        return min(warm, key=lambda b: b.outstanding) if warm else least
+
+    def release(
+        self, lease: Lease, failed: bool = False, answered: bool = True, latency: Optional[float] = None
+    ) -> None:
+        """Return a backend, updating its health from the request outcome.
+
+        ``failed`` marks host-side problems (connection errors, timeouts, 5xx);
+        ``answered`` is False for requests the host rejected as invalid, which
+        say nothing about its speed or which models it has loaded. ``latency``
+        overrides the time since the lease started (streams pass their time
+        to first part).
+        """
+        backend = lease.backend
+        elapsed = time.monotonic() - lease.started if latency is None else latency
+        key = (lease.model, lease.operation)
+        with self._lock:
+            backend.outstanding -= 1
+            if failed:
+                backend.breaker.record_failure()
+                return
+
+            backend.breaker.record_success()
+            if not answered:
+                return
+            backend.loaded_models[lease.model] = time.monotonic()
+            backend.samples[key] = backend.samples.get(key, 0) + 1
+            previous = backend.ewma_latency.get(key)
+            backend.ewma_latency[key] = elapsed if previous is None else 0.8 * previous + 0.2 * elapsed
+            if self._is_slow(backend, key):
+                logger.warning(
+                    "Ejecting slow Ollama host %s (%.2fs average for %s %s)",
+                    backend.host, backend.ewma_latency[key], lease.model, lease.operation
+                )
+                backend.breaker.trip()
+
+    def mark_warm(self, backend: Backend, model: str) -> None:
+        """Record that a model was loaded on a host outside normal scheduling"""
+        with self._lock:
+            backend.loaded_models[model] = time.monotonic()
+
+    def _is_slow(self, backend: Backend, key: Tuple[str, str]) -> bool:
+        """Whether the host is much slower than its peers at the same model and operation"""
+        peers = [
+            b.ewma_latency[key] for b in self.backends
+            if b is not backend and key in b.ewma_latency and b.breaker.state == "closed"
+        ]
+        if backend.samples.get(key, 0) < 10 or not peers:
+            return False
+        return backend.ewma_latency[key] > self.slow_factor * statistics.median(peers)
+
+    def _health_loop(self) -> None:
+        while True:
+            time.sleep(self.health_check_interval)
+            for backend in self.backends:
+                if backend.breaker.state == "closed":
+                    continue
+                try:
+                    backend.client.list()
+                except Exception as e:
+                    logger.debug("Health check failed for %s: %s", backend.host, str(e))
+                    continue
+                logger.info("Ollama host %s is healthy again", backend.host)
+                with self._lock:
+                    backend.ewma_latency.clear()
+                    backend.samples.clear()
+                    backend.breaker.record_success()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "host": backend.host,
+                    "state": backend.breaker.state,
+                    "outstanding": backend.outstanding,
+                    "ewma_latency": {
+                        f"{model} {operation}": latency for (model, operation), latency in backend.ewma_latency.items()
+                    },
+                    "models": sorted(backend.loaded_models),
+                }
+                for backend in self.backends
+            ]
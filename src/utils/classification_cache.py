@@ -0,0 +1,167 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from src.models.routing import RoutingDecision
+from src.utils.logging_config import logger
+
+PUNCTUATION_PATTERN = re.compile(r"[^\w#\s]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Canonical form of a query: lowercase, no punctuation, single spaces"""
+    query = PUNCTUATION_PATTERN.sub(" ", query.lower())
+    return WHITESPACE_PATTERN.sub(" ", query).strip()
+
+
+class ClassificationCache:
+    """Two-tier cache of routing decisions.
+
+    Entries are keyed on the normalized query, the classifier model and a hash
+    of the prompt version, so changing either invalidates old decisions. The
+    first tier is a bounded in-memory LRU; the optional second tier is a SQLite
+    table that survives restarts. Both tiers honour the same TTL.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 3600,
+        db_path: Optional[str] = None,
+        max_db_entries: int = 100000,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_db_entries = max_db_entries
+
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_writes = 0
+
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS classification_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS classification_cache_accessed "
+                "ON classification_cache (accessed_at)"
+            )
+            self._db.commit()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether lookups and stores may touch the SQLite tier, and so block on disk"""
+        return self._db is not None
+
+    @staticmethod
+    def make_key(query: str, model_name: str, prompt_version: str) -> str:
+        """Cache key for a query classified by a given model and prompt"""
+        raw = "\x1f".join((normalize_query(query), model_name, prompt_version))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[RoutingDecision]:
+        """Return a fresh copy of the cached decision, or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return RoutingDecision.from_dict(value)
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM classification_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    self._db.execute(
+                        "UPDATE classification_cache SET accessed_at = ? WHERE key = ?", (now, key)
+                    )
+                    self._db.commit()
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.db_hits += 1
+                    return RoutingDecision.from_dict(value)
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, decision: RoutingDecision) -> None:
+        """Store a decision in both tiers"""
+        now = time.time()
+        value = decision.to_dict()
+        value["extracted_info"] = {}
+
+        with self._lock:
+            self._remember(key, now, value)
+
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO classification_cache (key, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now)
+                )
+                self._db_writes += 1
+                if self._db_writes % 100 == 0:
+                    self._evict_db(now)
+                self._db.commit()
+
+    def _remember(self, key: str, created_at: float, value: Dict) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _evict_db(self, now: float) -> None:
+        """Drop expired rows, then the least recently used rows over the size limit"""
+        self._db.execute(
+            "DELETE FROM classification_cache WHERE created_at < ?", (now - self.ttl_seconds,)
+        )
+        count = self._db.execute("SELECT COUNT(*) FROM classification_cache").fetchone()[0]
+        overflow = count - self.max_db_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM classification_cache WHERE key IN ("
+                "SELECT key FROM classification_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+            self.evictions += overflow
+            logger.info("Evicted %s classification cache rows", overflow)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM classification_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters for both tiers"""
+        with self._lock:
+            lookups = self.hits + self.db_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits + self.db_hits) / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,283 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
+import queue
+import threading
+import time
+from src.config.settings import settings
+from src.utils.llm_client import LLMClient, LLMClientError, get_llm_client
+from src.utils.logging_config import logger
+from src.utils.metrics import metrics, span
+from src.utils.tokens import estimate_tokens
+
+SUMMARY_SYSTEM_PROMPT = """You keep a running summary of a customer support conversation.
+Merge the new exchanges into the summary so far. Keep order numbers, error codes, product names, amounts and dates,
+what the customer asked for, and what was resolved or is still open. Drop greetings and repetition.
+Reply with the updated summary only, as short notes."""
+
+# Role labels and message framing cost a few tokens per turn on top of the text
+TURN_OVERHEAD_TOKENS = 8
+
+# The conversation of the route being handled; handlers and the classifier read it when building prompts
+_conversation: ContextVar[Optional["Conversation"]] = ContextVar("conversation", default=None)
+
+
+@dataclass(slots=True)
+class Turn:
+    query: str
+    response: str
+    category: str
+    tokens: int
+
+
+class Conversation:
+    """One session: its latest turns verbatim and a rolling summary of the older ones"""
+
+    def __init__(self, session_id: str, memory: "ConversationMemory"):
+        self.session_id = session_id
+        self.memory = memory
+        self.turns: List[Turn] = []
+        self.summary = ""
+        self.summary_tokens = 0
+        self.summarizing = False
+        self.last_used = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def empty(self) -> bool:
+        return not self.turns and not self.summary
+
+    def _fit(self, budget: int) -> Tuple[str, List[Turn]]:
+        """The summary and the newest turns that fit in ``budget`` tokens together"""
+        with self.lock:
+            summary, summary_tokens, turns = self.summary, self.summary_tokens, list(self.turns)
+        if summary_tokens > budget:
+            summary, summary_tokens = "", 0
+        used, recent = summary_tokens, []
+        for turn in reversed(turns):
+            if used + turn.tokens > budget:
+                break
+            used += turn.tokens
+            recent.append(turn)
+        return summary, recent[::-1]
+
+    def messages(self, model: str) -> List[Dict[str, str]]:
+        """The history as chat messages, within ``model``'s budget"""
+        summary, turns = self._fit(self.memory.budget_for(model))
+        messages = [{"role": "system", "content": f"Summary of the conversation so far: {summary}"}] if summary else []
+        for turn in turns:
+            messages.append({"role": "user", "content": turn.query})
+            messages.append({"role": "assistant", "content": turn.response})
+        return messages
+
+    def transcript(self, budget: int) -> str:
+        """The history as plain text, for prompts that cannot take chat turns"""
+        summary, turns = self._fit(budget)
+        lines = [f"Summary: {summary}"] if summary else []
+        for turn in turns:
+            lines.append(f"Customer: {turn.query}")
+            lines.append(f"Agent: {turn.response}")
+        return "\n".join(lines)
+
+
+def current_conversation() -> Optional[Conversation]:
+    return _conversation.get()
+
+
+def has_history() -> bool:
+    """Whether the current route continues a conversation, so its answer depends on more than the query"""
+    conversation = _conversation.get()
+    return conversation is not None and not conversation.empty
+
+
+@contextmanager
+def using(conversation: Optional[Conversation]) -> Iterator[Optional[Conversation]]:
+    """Make ``conversation`` the history of the enclosed model calls"""
+    token = _conversation.set(conversation)
+    try:
+        yield conversation
+    finally:
+        _conversation.reset(token)
+
+
+def iterate_using(iterator: Iterator, conversation: Optional[Conversation]) -> Iterator:
+    """Advance a stream with ``conversation`` active, without keeping it active across yields"""
+    while True:
+        token = _conversation.set(conversation)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _conversation.reset(token)
+        yield item
+
+
+async def aiterate_using(iterator: AsyncIterator, conversation: Optional[Conversation]) -> AsyncIterator:
+    """Async version of iterate_using"""
+    while True:
+        token = _conversation.set(conversation)
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            _conversation.reset(token)
+        yield item
+
+
+class ConversationMemory:
+    """Multi-turn sessions whose history fits a fixed token budget per model.
+
+    Every prompt carries at most ``budget_for(model)`` tokens of history: the
+    session's rolling summary plus as many of its latest turns as fit. Once
+    the verbatim turns outgrow ``history_tokens - summary_tokens``, the oldest
+    are merged into the summary by ``summary_model`` on a background thread,
+    off the routing path; until that lands, turns that do not fit are left
+    out. Prompt size therefore stays flat however long a session runs. If
+    summarizing fails, the oldest turns beyond ``max_turns`` are dropped
+    unsummarized, so memory stays bounded too. Sessions idle for
+    ``ttl_seconds``, or beyond ``max_sessions``, are dropped.
+    """
+
+    def __init__(
+        self,
+        client: Optional[LLMClient] = None,
+        summary_model: Optional[str] = None,
+        history_tokens: int = 1024,
+        model_budgets: Optional[Dict[str, int]] = None,
+        summary_tokens: int = 256,
+        max_sessions: int = 1000,
+        ttl_seconds: float = 3600,
+        max_turns: int = 50,
+    ):
+        self.client = client or get_llm_client()
+        self.summary_model = summary_model or settings.OLLAMA_MODEL
+        self.history_tokens = history_tokens
+        self.model_budgets = model_budgets or {}
+        self.summary_tokens = summary_tokens
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_turns = max_turns
+        # Verbatim turns beyond this are summarized; the summary takes the rest of the budget
+        self.verbatim_tokens = max(history_tokens - summary_tokens, history_tokens // 2)
+
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+
+    def session(self, session_id: str) -> Conversation:
+        """The session's conversation, started afresh if it is new or expired"""
+        now = time.monotonic()
+        with self._lock:
+            conversation = self._sessions.get(session_id)
+            if conversation is None or now - conversation.last_used > self.ttl_seconds:
+                conversation = Conversation(session_id, self)
+                self._sessions[session_id] = conversation
+            self._sessions.move_to_end(session_id)
+            conversation.last_used = now
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return conversation
+
+    def forget(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def budget_for(self, model: str) -> int:
+        """Tokens of history sent with each prompt to ``model``"""
+        return self.model_budgets.get(model, self.history_tokens)
+
+    def record(self, conversation: Conversation, query: str, response: str, category: str) -> None:
+        """Append a finished turn, scheduling a summary if the verbatim turns have outgrown their share"""
+        turn = Turn(query, response, category, estimate_tokens(query) + estimate_tokens(response) + TURN_OVERHEAD_TOKENS)
+        with conversation.lock:
+            conversation.turns.append(turn)
+            schedule = (
+                not conversation.summarizing
+                and len(conversation.turns) > 1
+                and sum(turn.tokens for turn in conversation.turns) > self.verbatim_tokens
+            )
+            conversation.summarizing = conversation.summarizing or schedule
+        if schedule:
+            self._schedule(conversation)
+
+    def _schedule(self, conversation: Conversation) -> None:
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._summarize_loop, name="conversation-summarizer", daemon=True)
+                self._worker.start()
+        self._pending.put(conversation)
+
+    def _summarize_loop(self) -> None:
+        while True:
+            conversation = self._pending.get()
+            try:
+                self.summarize(conversation)
+            except Exception as e:
+                logger.error("Summarizing session %s failed: %s", conversation.session_id, str(e))
+                with conversation.lock:
+                    self._drop_oldest(conversation)
+                    conversation.summarizing = False
+
+    def _drop_oldest(self, conversation: Conversation) -> None:
+        """Forget the oldest turns beyond ``max_turns``; called with the conversation locked"""
+        excess = len(conversation.turns) - self.max_turns
+        if excess > 0:
+            logger.warning("Dropping %s unsummarized turns of session %s", excess, conversation.session_id)
+            del conversation.turns[:excess]
+
+    def _turns_to_fold(self, turns: List[Turn]) -> int:
+        """How many of the oldest turns to summarize so the rest fill half the verbatim share"""
+        kept = 0
+        count = len(turns)
+        while count > 1 and kept + turns[count - 1].tokens <= self.verbatim_tokens // 2:
+            count -= 1
+            kept += turns[count].tokens
+        # The latest turn always stays verbatim
+        return min(count, len(turns) - 1)
+
+    def _summary_messages(self, summary: str, turns: List[Turn]) -> List[Dict[str, str]]:
+        # Each folded turn is clipped so the summary prompt is bounded too
+        limit = self.verbatim_tokens * 4
+        exchanges = "\n".join(f"Customer: {turn.query[:limit]}\nAgent: {turn.response[:limit]}" for turn in turns)
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew exchanges:\n{exchanges}"},
+        ]
+
+    def summarize(self, conversation: Conversation) -> None:
+        """Fold the session's oldest turns into its summary with one model call"""
+        with conversation.lock:
+            count = self._turns_to_fold(conversation.turns)
+            folded, previous = conversation.turns[:count], conversation.summary
+        if not folded:
+            conversation.summarizing = False
+            return
+
+        summary = None
+        with span("summarize", model=self.summary_model) as summary_span:
+            try:
+                response = self.client.chat(
+                    self._summary_messages(previous, folded),
+                    model=self.summary_model,
+                    options={"temperature": 0, "num_predict": self.summary_tokens}
+                )
+                summary = response['message']['content'].strip()
+                summary_span.set(turns=len(folded))
+            except (LLMClientError, KeyError) as e:
+                logger.warning("Could not summarize session %s: %s", conversation.session_id, str(e))
+        metrics.summaries.inc(outcome="ok" if summary else "failed")
+
+        with conversation.lock:
+            if summary:
+                conversation.summary = summary
+                conversation.summary_tokens = estimate_tokens(summary)
+                # Turns are only dropped from the front while no summary is running, so the folded ones are still there
+                del conversation.turns[:count]
+            else:
+                self._drop_oldest(conversation)
+            conversation.summarizing = False
@@ -0,0 +1,84 @@
+"""Deadlines carried in a context variable down to every model call.
+
+``route_query`` runs under ``ROUTE_TIMEOUT``, classification under
+``CLASSIFY_TIMEOUT`` and generation under ``GENERATE_TIMEOUT``; a stage
+deadline is never later than the route's. A model call still running when
+its deadline passes is aborted and raises DeadlineExceeded, after which
+classification falls back to ``unknown`` and generation to the fallback
+answer.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Iterator, Optional
+import time
+
+# Monotonic time by which the current route (or stage) must be finished
+_deadline: ContextVar[Optional[float]] = ContextVar("routing_deadline", default=None)
+
+
+def current_deadline() -> Optional[float]:
+    return _deadline.get()
+
+
+def remaining(expires: Optional[float]) -> Optional[float]:
+    """Seconds left before ``expires``, or None for no deadline"""
+    if expires is None:
+        return None
+    return max(expires - time.monotonic(), 0.0)
+
+
+def expires_in(seconds: Optional[float]) -> Optional[float]:
+    """The deadline ``seconds`` from now, never later than the active one (None: just the active one)"""
+    outer = _deadline.get()
+    if seconds is None:
+        return outer
+    inner = time.monotonic() + seconds
+    return inner if outer is None else min(inner, outer)
+
+
+@contextmanager
+def until(expires: Optional[float]) -> Iterator[Optional[float]]:
+    """Make ``expires`` the deadline of the enclosed code, unless an earlier one is already active"""
+    outer = _deadline.get()
+    if expires is None or (outer is not None and outer < expires):
+        expires = outer
+    token = _deadline.set(expires)
+    try:
+        yield expires
+    finally:
+        _deadline.reset(token)
+
+
+def deadline(seconds: Optional[float]):
+    """Give the enclosed stage at most ``seconds`` (None: no limit of its own).
+
+    Nested stages can only shorten the deadline, so a stage never outlives the
+    route it belongs to. Model calls made inside read it through LLMClient.
+    """
+    return until(expires_in(seconds))
+
+
+def iterate_until(iterator: Iterator, expires: Optional[float]) -> Iterator:
+    """Advance a stream under a deadline, without keeping it active across yields"""
+    while True:
+        token = _deadline.set(expires)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _deadline.reset(token)
+        yield item
+
+
+async def aiterate_until(iterator: AsyncIterator, expires: Optional[float]) -> AsyncIterator:
+    """Async version of iterate_until"""
+    while True:
+        token = _deadline.set(expires)
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            _deadline.reset(token)
+        yield item
@@ -0,0 +1,55 @@
+from typing import Any, Dict, Iterator
+import json
+import os
+import threading
+import time
+from src.models.routing import QueryCategory, RoutingDecision
+from src.utils.logging_config import logger
+
+
+class DecisionLog:
+    """Append-only JSONL log of the routing decisions made by the LLM classifier.
+
+    Each line holds the query, the category, the confidence and the model
+    that decided, and serves as training data for the local classifier.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+
+    def append(self, query: str, routing_decision: RoutingDecision, model: str) -> None:
+        if routing_decision.category == QueryCategory.UNKNOWN:
+            return
+        line = json.dumps({
+            "query": query,
+            "category": routing_decision.category.value,
+            "confidence": routing_decision.confidence,
+            "model": model,
+            "time": round(time.time(), 3),
+        })
+        try:
+            with self._lock:
+                self._file.write(line + "\n")
+        except OSError as e:
+            logger.warning("Could not write to decision log %s: %s", self.path, str(e))
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def read_decisions(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield the logged decisions, skipping lines that are not valid JSON"""
+    with open(path, "r", encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and entry.get("query") and entry.get("category"):
+                yield entry
@@ -0,0 +1,26 @@
+from typing import List, Optional
+import numpy as np
+from src.config.settings import settings
+from src.utils.llm_client import LLMClient, get_llm_client
+
+
+class Embedder:
+    """Turns text into unit-length vectors using the Ollama embedding endpoint"""
+
+    def __init__(self, model_name: str = None, client: Optional[LLMClient] = None):
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.client = client or get_llm_client()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed a single text as a normalized float32 vector"""
+        response = self.client.embeddings(text, model=self.model_name)
+        return _normalize(np.asarray(response["embedding"], dtype=np.float32))
+
+    def embed_many(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts as the rows of a normalized matrix"""
+        return np.vstack([self.embed(text) for text in texts])
+
+
+def _normalize(vector: np.ndarray) -> np.ndarray:
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
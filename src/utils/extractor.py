@@ -0,0 +1,108 @@
+from typing import Dict, Iterable, List, Optional
+import json
+import os
+import re
+from src.utils.logging_config import logger
+
+# "#12345", "order 12345", "order number: 12345", "order no. 12345"
+ORDER_NUMBER_PATTERN = re.compile(
+    r"(?:#\s?|\border\s*(?:number|num|no\.?|id)?\s*[:#]?\s*)(\d{4,})\b",
+    re.IGNORECASE
+)
+
+# "error code E404", "error: 0x80070005", "error 'disk full'"
+ERROR_PHRASE_PATTERN = re.compile(
+    r"\berror(?:\s+(?:code|message))?\s*[:#]?\s*(\"[^\"]+\"|'[^']+'|[A-Z0-9][A-Za-z0-9_-]*\d[A-Za-z0-9_-]*)",
+    re.IGNORECASE
+)
+
+# Bare error codes such as "E404", "ERR-42" or "0x80070005"
+ERROR_CODE_PATTERN = re.compile(r"\b(E\d{2,5}|ERR-?\d{2,5}|0x[0-9A-Fa-f]{4,8})\b")
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+(?:[-'][a-z0-9]+)*")
+
+DEFAULT_PRODUCT_CATALOG = [
+    "laptop",
+    "phone",
+    "tablet",
+    "headphones",
+    "smartwatch",
+    "camera",
+    "app",
+    "website",
+    "subscription",
+    "premium plan",
+    "basic plan",
+]
+
+
+class InfoExtractor:
+    """Pulls order numbers, error codes and product names out of a query.
+
+    Order numbers and error codes come from precompiled regular expressions.
+    Product names are matched against a catalog stored as a word-level trie,
+    so multi-word names like "premium plan" win over shorter prefixes.
+    """
+
+    _END = "__end__"
+
+    def __init__(self, catalog: Optional[Iterable[str]] = None):
+        self._trie: Dict = {}
+        for name in catalog if catalog is not None else DEFAULT_PRODUCT_CATALOG:
+            self.add_product(name)
+
+    @classmethod
+    def from_catalog_file(cls, path: str) -> "InfoExtractor":
+        """Build an extractor from a JSON list or one-name-per-line text file"""
+        if not path or not os.path.exists(path):
+            return cls()
+        with open(path, "r", encoding="utf-8") as catalog_file:
+            if path.endswith(".json"):
+                names = json.load(catalog_file)
+            else:
+                names = [line.strip() for line in catalog_file if line.strip()]
+        logger.info("Loaded %s product names from %s", len(names), path)
+        return cls(names)
+
+    def add_product(self, name: str) -> None:
+        """Add a product name to the catalog trie"""
+        words = WORD_PATTERN.findall(name.lower())
+        if not words:
+            return
+        node = self._trie
+        for word in words:
+            node = node.setdefault(word, {})
+        node[self._END] = name
+
+    def find_product(self, query: str) -> Optional[str]:
+        """Return the first, longest catalog name mentioned in the query"""
+        words: List[str] = WORD_PATTERN.findall(query.lower())
+        for start in range(len(words)):
+            node = self._trie
+            match = None
+            for word in words[start:]:
+                node = node.get(word) or node.get(word.rstrip("s"))
+                if node is None:
+                    break
+                match = node.get(self._END, match)
+            if match:
+                return match
+        return None
+
+    def extract(self, query: str) -> Dict[str, str]:
+        """Return only the fields that are present in the query"""
+        info = {}
+
+        order_match = ORDER_NUMBER_PATTERN.search(query)
+        if order_match:
+            info["order_number"] = order_match.group(1)
+
+        error_match = ERROR_PHRASE_PATTERN.search(query) or ERROR_CODE_PATTERN.search(query)
+        if error_match:
+            info["error_message"] = error_match.group(1).strip("\"'")
+
+        product = self.find_product(query)
+        if product:
+            info["product_name"] = product
+
+        return info
@@ -0,0 +1,79 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import threading
+import numpy as np
+from src.utils.metrics import metrics
+
+
+class HedgePolicy:
+    """Decides when a slow request gets a duplicate ("hedge") and caps how many are sent.
+
+    A request still unanswered after the ``percentile`` of recent latencies
+    is hedged, so only the slowest tail is duplicated. Each request earns
+    ``budget`` of a hedge (saved up to ``burst``) and each hedge spends one,
+    so hedging adds at most ``budget`` extra load even when every request is
+    slow.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 512,
+        burst: float = 10.0,
+    ):
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._tokens = 0.0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there are too few samples to tell"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            return float(np.percentile(self._latencies, self.percentile))
+
+    def start(self) -> bool:
+        """Count a request and earn its share of the budget; True if a hedge could be afforded"""
+        with self._lock:
+            self.requests += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+            return self._tokens >= 1.0
+
+    def try_hedge(self) -> bool:
+        """Spend one hedge from the budget"""
+        with self._lock:
+            if self._tokens < 1.0:
+                metrics.hedges.inc(outcome="over_budget")
+                return False
+            self._tokens -= 1.0
+            self.hedged += 1
+        metrics.hedges.inc(outcome="sent")
+        return True
+
+    def finish(self, seconds: float, hedge_won: bool = False) -> None:
+        """Record how long the caller waited for its answer"""
+        with self._lock:
+            self._latencies.append(seconds)
+            self.hedge_wins += hedge_won
+        if hedge_won:
+            metrics.hedges.inc(outcome="won")
+
+    def as_dict(self) -> Dict[str, float]:
+        delay = self.delay()
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+                "delay_ms": round(delay * 1000, 2) if delay is not None else None,
+            }
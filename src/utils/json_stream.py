@@ -0,0 +1,119 @@
+from typing import Any, Dict, Optional
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """Parses a JSON object as it streams in, one chunk at a time.
+
+    ``feed`` returns the top-level fields whose values became complete in that
+    chunk, so callers can act on early fields without waiting for the rest of
+    the object. Nested values are reported once they close; values that are
+    not valid JSON are skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+
+        self._pos = 0
+        self._depth = 0
+        self._expect = "object"  # object, key, colon, value, comma
+        self._in_string = False
+        self._escape = False
+        self._token_start: Optional[int] = None
+        self._key: Optional[str] = None
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """Consume a chunk and return the fields completed by it"""
+        self.buffer += chunk
+        completed: Dict[str, Any] = {}
+        while self._pos < len(self.buffer) and not self.done:
+            char = self.buffer[self._pos]
+            if not self._step(char, completed):
+                continue
+            self._pos += 1
+        return completed
+
+    def _step(self, char: str, completed: Dict[str, Any]) -> bool:
+        """Advance over one character; returns False to re-read it in a new state"""
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 1:
+                    self._end_token(self._pos + 1, completed)
+            return True
+
+        if self._token_start is not None and self._depth > 1:
+            # Inside a nested object or array value
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._end_token(self._pos + 1, completed)
+            return True
+
+        if self._token_start is not None:
+            # Inside a scalar value (number, true, false, null)
+            if char in WHITESPACE or char in ",}":
+                self._end_token(self._pos, completed)
+                return False
+            return True
+
+        if char in WHITESPACE:
+            return True
+
+        if self._expect == "object":
+            if char == "{":
+                self._depth = 1
+                self._expect = "key"
+        elif self._expect == "key":
+            if char == '"':
+                self._token_start = self._pos
+                self._in_string = True
+            elif char == "}":
+                self.done = True
+        elif self._expect == "colon":
+            if char == ":":
+                self._expect = "value"
+        elif self._expect == "value":
+            self._token_start = self._pos
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+        elif self._expect == "comma":
+            if char == ",":
+                self._expect = "key"
+            elif char == "}":
+                self.done = True
+        return True
+
+    def _end_token(self, end: int, completed: Dict[str, Any]) -> None:
+        text = self.buffer[self._token_start:end]
+        self._token_start = None
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            value = None
+            text = None
+
+        if self._expect == "key":
+            self._key = value
+            self._expect = "colon"
+            return
+
+        self._expect = "comma"
+        if text is not None and isinstance(self._key, str):
+            self.fields[self._key] = value
+            completed[self._key] = value
+        self._key = None
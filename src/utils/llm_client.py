@@ -1,22 +1,459 @@
-from typing import List, Dict
-import logging
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Mapping, Optional, Union
+import asyncio
+import random
+import threading
+import time
+import httpx
 import ollama
-from src.utils.logging_config import logger 
+from src.config.settings import settings
+from src.utils.backend_pool import Backend, BackendPool, Lease
+from src.utils.deadline import current_deadline, remaining
+from src.utils.logging_config import logger
+from src.utils.metrics import metrics, record_llm_usage
+
+
+class LLMClientError(Exception):
+    """Raised when the model server could not produce a response"""
+
+
+class CircuitOpenError(LLMClientError):
+    """Raised without contacting the server while the circuit breaker is open"""
+
+
+class DeadlineExceeded(LLMClientError):
+    """Raised when the route or stage deadline passes before the model has answered"""
+
+
+class CircuitBreaker:
+    """Fails fast after repeated errors, then lets a single trial call through.
+
+    The breaker opens after ``failure_threshold`` consecutive failures. Once
+    ``reset_timeout`` seconds have passed it becomes half-open: one call is
+    allowed, and its outcome closes or re-opens the breaker.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def trip(self) -> None:
+        """Open the breaker immediately, e.g. for a host that is too slow"""
+        with self._lock:
+            self._trial_in_flight = False
+            self.opened_at = time.monotonic()
+
+
+def _keep_alive(value: str) -> Union[float, str]:
+    """Ollama takes keep_alive as seconds or a duration string such as "30m" """
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Connection problems, timeouts and server-side errors are worth retrying"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, ollama.ResponseError):
+        return error.status_code >= 500 or error.status_code == 429
+    return False
 
-logger = logging.getLogger(__name__)
 
 class LLMClient:
-    def __init__(self, model_name: str = "llama3", host: str = None):
-        self.model_name = model_name
-        self.client = ollama.Client(host=host) if host else ollama
-    
-    def chat(self, messages: List[Dict[str, str]]) -> str:
-        try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=messages
+    """Process-wide access to the Ollama servers.
+
+    Requests are spread over a BackendPool of one or more hosts
+    (``OLLAMA_HOSTS``, falling back to ``OLLAMA_HOST``), scheduled by least
+    outstanding requests with model affinity. Each host keeps one pooled
+    ``ollama.Client`` (and one ``ollama.AsyncClient`` per event loop) so
+    connections are kept alive and reused across the router and every handler.
+    Calls get configurable timeouts, retries with jittered exponential backoff
+    on another host when possible, and a circuit breaker per host; when every
+    host is ejected, calls fail fast with ``CircuitOpenError``. Failures
+    surface as ``LLMClientError`` instead of ``None``.
+
+    Calls made under a deadline (``src.utils.deadline``) stop retrying and
+    abort the generation once it passes, raising ``DeadlineExceeded``. Async
+    calls are cancelled mid-read; sync calls stream and check the deadline
+    between parts, so a silent server is still bounded by ``OLLAMA_TIMEOUT``.
+    """
+
+    def __init__(
+        self,
+        model_name: str = None,
+        hosts: Optional[List[str]] = None,
+        timeout: float = None,
+        max_retries: int = None,
+        retry_backoff: float = None,
+        pool: Optional[BackendPool] = None,
+    ):
+        self.model_name = model_name or settings.OLLAMA_MODEL
+        self.max_retries = settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        self.retry_backoff = settings.OLLAMA_RETRY_BACKOFF if retry_backoff is None else retry_backoff
+        # How long the server keeps models loaded after each call (-1 pins them)
+        self.keep_alive = _keep_alive(settings.OLLAMA_KEEP_ALIVE)
+
+        if pool is None:
+            http_options = {
+                "timeout": httpx.Timeout(
+                    timeout or settings.OLLAMA_TIMEOUT, connect=settings.OLLAMA_CONNECT_TIMEOUT
+                ),
+                "limits": httpx.Limits(
+                    max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.OLLAMA_KEEPALIVE_CONNECTIONS,
+                ),
+            }
+            pool = BackendPool(
+                hosts or settings.OLLAMA_HOSTS,
+                http_options,
+                lambda: CircuitBreaker(settings.CIRCUIT_BREAKER_FAILURES, settings.CIRCUIT_BREAKER_RESET_SECONDS),
+                affinity_window=settings.OLLAMA_AFFINITY_WINDOW,
+                slow_factor=settings.OLLAMA_SLOW_HOST_FACTOR,
+                health_check_interval=settings.OLLAMA_HEALTH_CHECK_INTERVAL,
             )
-            return response['message']['content']
+        self.pool = pool
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, self.retry_backoff * (2 ** attempt))
+
+    def _acquire(
+        self, operation: str, model: str, tried: List[Backend], avoid_hosts: Optional[List[str]] = None
+    ) -> Lease:
+        """Check out a host, skipping ``avoid_hosts`` while others are available and recording the one chosen"""
+        avoided = [backend for backend in self.pool.backends if avoid_hosts and backend.host in avoid_hosts]
+        lease = self.pool.acquire(model, exclude=tried + avoided, operation=operation)
+        if lease is None:
+            hosts = ", ".join(backend.host for backend in self.pool.backends)
+            raise CircuitOpenError(f"No Ollama host available ({hosts}): circuit open")
+        if avoid_hosts is not None:
+            avoid_hosts.append(lease.backend.host)
+        return lease
+
+    @staticmethod
+    def _deadline_exceeded(operation: str, model: str) -> DeadlineExceeded:
+        logger.warning("Ollama %s on %s cut off by its deadline", operation, model)
+        metrics.deadlines.inc(operation=operation, model=model)
+        return DeadlineExceeded(f"Deadline exceeded during {operation} on {model}")
+
+    def _retry_delay(self, delay: float, expires: Optional[float], operation: str, model: str) -> float:
+        """The backoff before the next attempt, or DeadlineExceeded if it would not start in time"""
+        left = remaining(expires)
+        if left is not None and left <= delay:
+            raise self._deadline_exceeded(operation, model)
+        return delay
+
+    def _failed(self, lease: Lease, operation: str, error: Exception, attempt: int) -> float:
+        """Release a failed lease; return the retry delay, or raise if giving up"""
+        retryable = _is_retryable(error)
+        self.pool.release(lease, failed=retryable, answered=False)
+        if not retryable or attempt == self.max_retries:
+            logger.error("Error calling Ollama at %s (%s): %s", lease.backend.host, operation, str(error))
+            raise LLMClientError(str(error)) from error
+        delay = self._backoff(attempt)
+        logger.warning("Retrying Ollama %s in %.2fs after %s failed: %s", operation, delay, lease.backend.host, str(error))
+        return delay
+
+    @staticmethod
+    def _record_usage(model: str, lease: Lease, response: Mapping[str, Any]) -> None:
+        """Record token usage and log prompt evaluation cost, which drops sharply on a cached prefix"""
+        record_llm_usage(model, response)
+        if "prompt_eval_duration" in response:
+            logger.debug(
+                "Prompt eval for %s on %s: %s tokens in %.1f ms",
+                model, lease.backend.host, response.get("prompt_eval_count", 0),
+                response["prompt_eval_duration"] / 1e6,
+            )
+
+    @staticmethod
+    def _report_first_token(model: str, lease: Lease, seconds: float) -> None:
+        """Streams closed before the final part never see prompt eval counts; log time to first token instead"""
+        logger.debug("Time to first token for %s on %s: %.1f ms", model, lease.backend.host, seconds * 1000)
+
+    def _call(
+        self,
+        operation: str,
+        model: str,
+        request: Callable[[Backend], Any],
+        hold: bool = False,
+        avoid_hosts: Optional[List[str]] = None,
+    ) -> Any:
+        """Run a request with host scheduling, retries and circuit breaking.
+
+        With ``hold`` the lease is returned alongside the result and the caller
+        must release it (used by streams, which stay open after returning).
+        """
+        expires = current_deadline()
+        tried: List[Backend] = []
+        for attempt in range(self.max_retries + 1):
+            if remaining(expires) == 0.0:
+                raise self._deadline_exceeded(operation, model)
+            lease = self._acquire(operation, model, tried, avoid_hosts)
+            try:
+                result = request(lease.backend)
+            except Exception as e:
+                tried.append(lease.backend)
+                time.sleep(self._retry_delay(self._failed(lease, operation, e, attempt), expires, operation, model))
+                continue
+            if hold:
+                return result, lease
+            self.pool.release(lease)
+            return result
+
+    async def _call_async(
+        self,
+        operation: str,
+        model: str,
+        request: Callable[[Backend], Any],
+        hold: bool = False,
+        avoid_hosts: Optional[List[str]] = None,
+    ) -> Any:
+        """Async version of _call; ``request`` returns an awaitable, cancelled when the deadline passes"""
+        expires = current_deadline()
+        tried: List[Backend] = []
+        for attempt in range(self.max_retries + 1):
+            if remaining(expires) == 0.0:
+                raise self._deadline_exceeded(operation, model)
+            lease = self._acquire(operation, model, tried, avoid_hosts)
+            try:
+                async with asyncio.timeout(remaining(expires)):
+                    result = await request(lease.backend)
+            except TimeoutError:
+                self.pool.release(lease, answered=False)
+                raise self._deadline_exceeded(operation, model)
+            except asyncio.CancelledError:
+                self.pool.release(lease, answered=False)
+                raise
+            except Exception as e:
+                tried.append(lease.backend)
+                await asyncio.sleep(self._retry_delay(self._failed(lease, operation, e, attempt), expires, operation, model))
+                continue
+            if hold:
+                return result, lease
+            self.pool.release(lease)
+            return result
+
+    def chat(self, messages: List[Dict[str, str]], model: str = None, **options) -> Mapping[str, Any]:
+        """Send a chat request and return the full Ollama response"""
+        model = model or self.model_name
+        if current_deadline() is not None:
+            # A blocking call cannot be abandoned halfway, so stream and stop reading at the deadline
+            return self._collect(self.chat_stream(messages, model, **options))
+        options.setdefault("keep_alive", self.keep_alive)
+        response, lease = self._call("chat", model, lambda backend: backend.client.chat(
+            model=model, messages=messages, **options
+        ), hold=True)
+        self.pool.release(lease)
+        self._record_usage(model, lease, response)
+        return response
+
+    async def chat_async(self, messages: List[Dict[str, str]], model: str = None, **options) -> Mapping[str, Any]:
+        """Async version of chat; cancelled outright when the deadline passes"""
+        model = model or self.model_name
+        options.setdefault("keep_alive", self.keep_alive)
+        response, lease = await self._call_async("chat", model, lambda backend: backend.async_client.chat(
+            model=model, messages=messages, **options
+        ), hold=True)
+        self.pool.release(lease)
+        self._record_usage(model, lease, response)
+        return response
+
+    @staticmethod
+    def _collect(parts: Iterator[Mapping[str, Any]]) -> Mapping[str, Any]:
+        """Join streamed parts into the response a non-streaming call would have returned"""
+        content: List[str] = []
+        final: Mapping[str, Any] = {}
+        for part in parts:
+            content.append(part["message"]["content"])
+            final = part
+        return {**final, "message": {**final.get("message", {"role": "assistant"}), "content": "".join(content)}}
+
+    def chat_stream(
+        self, messages: List[Dict[str, str]], model: str = None, avoid_hosts: Optional[List[str]] = None, **options
+    ) -> Iterator[Mapping[str, Any]]:
+        """Stream chat response parts; retries only happen before the first part arrives.
+
+        Closing the returned generator early aborts the generation. Hosts in
+        ``avoid_hosts`` are skipped while another is available, and the host
+        serving the stream is appended to it (used to hedge on another host).
+        """
+        model = model or self.model_name
+        options.setdefault("keep_alive", self.keep_alive)
+        expires = current_deadline()
+
+        def start(backend: Backend):
+            stream = backend.client.chat(model=model, messages=messages, stream=True, **options)
+            return stream, next(stream, None)
+
+        (stream, first), lease = self._call("chat_stream", model, start, hold=True, avoid_hosts=avoid_hosts)
+        first_token = time.monotonic() - lease.started
+        failed = done = timed_out = False
+        try:
+            if first is not None:
+                yield first
+                for part in stream:
+                    if remaining(expires) == 0.0 and not part.get("done"):
+                        timed_out = True
+                        raise self._deadline_exceeded("chat_stream", model)
+                    done = bool(part.get("done"))
+                    if done:
+                        self._record_usage(model, lease, part)
+                    yield part
+        except (GeneratorExit, DeadlineExceeded):
+            raise
         except Exception as e:
-            logger.error("Error calling Ollama: %s", str(e)) 
-            raise
\ No newline at end of file
+            failed = True
+            logger.error("Ollama stream from %s interrupted: %s", lease.backend.host, str(e))
+            raise LLMClientError(str(e)) from e
+        finally:
+            # Closing the response early disconnects, which stops generation on the server
+            stream.close()
+            self.pool.release(lease, failed=failed, answered=not timed_out, latency=first_token)
+            if not done and not failed:
+                self._report_first_token(model, lease, first_token)
+
+    async def chat_stream_async(
+        self, messages: List[Dict[str, str]], model: str = None, avoid_hosts: Optional[List[str]] = None, **options
+    ) -> AsyncIterator[Mapping[str, Any]]:
+        model = model or self.model_name
+        options.setdefault("keep_alive", self.keep_alive)
+        expires = current_deadline()
+
+        async def start(backend: Backend):
+            stream = await backend.async_client.chat(model=model, messages=messages, stream=True, **options)
+            try:
+                return stream, await stream.__anext__()
+            except StopAsyncIteration:
+                return stream, None
+
+        (stream, first), lease = await self._call_async(
+            "chat_stream", model, start, hold=True, avoid_hosts=avoid_hosts
+        )
+        first_token = time.monotonic() - lease.started
+        failed = done = timed_out = False
+        try:
+            if first is not None:
+                yield first
+                while True:
+                    try:
+                        async with asyncio.timeout(remaining(expires)):
+                            part = await stream.__anext__()
+                    except StopAsyncIteration:
+                        break
+                    except TimeoutError:
+                        timed_out = True
+                        raise self._deadline_exceeded("chat_stream", model)
+                    done = bool(part.get("done"))
+                    if done:
+                        self._record_usage(model, lease, part)
+                    yield part
+        except (GeneratorExit, asyncio.CancelledError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            failed = True
+            logger.error("Ollama stream from %s interrupted: %s", lease.backend.host, str(e))
+            raise LLMClientError(str(e)) from e
+        finally:
+            await stream.aclose()
+            self.pool.release(lease, failed=failed, answered=not timed_out, latency=first_token)
+            if not done and not failed:
+                self._report_first_token(model, lease, first_token)
+
+    def embeddings(self, prompt: str, model: str = None) -> Mapping[str, Any]:
+        model = model or self.model_name
+        return self._call("embeddings", model, lambda backend: backend.client.embeddings(
+            model=model, prompt=prompt, keep_alive=self.keep_alive
+        ))
+
+    async def embeddings_async(self, prompt: str, model: str = None) -> Mapping[str, Any]:
+        model = model or self.model_name
+        return await self._call_async("embeddings", model, lambda backend: backend.async_client.embeddings(
+            model=model, prompt=prompt, keep_alive=self.keep_alive
+        ))
+
+    def show(self, model: str = None) -> Mapping[str, Any]:
+        model = model or self.model_name
+        return self._call("show", model, lambda backend: backend.client.show(model))
+
+    def warm_up(
+        self,
+        model: str = None,
+        messages: Optional[List[Dict[str, str]]] = None,
+        embedding: bool = False,
+        options: Optional[Dict[str, Any]] = None,
+    ) -> int:
+        """Load a model on every host and pin it with keep_alive.
+
+        With ``messages`` a one-token completion is run so the server also
+        caches that prompt prefix. Pass the ``options`` later requests use:
+        a different ``num_ctx`` would make the server reload the model.
+        Returns the number of hosts warmed.
+        """
+        model = model or self.model_name
+        warmed = 0
+        for backend in self.pool.backends:
+            started = time.monotonic()
+            try:
+                if embedding:
+                    backend.client.embeddings(model=model, prompt="warmup", keep_alive=self.keep_alive)
+                else:
+                    backend.client.chat(
+                        model=model, messages=messages or [], keep_alive=self.keep_alive,
+                        options={**(options or {}), "num_predict": 1}
+                    )
+            except Exception as e:
+                logger.warning("Could not warm up %s on %s: %s", model, backend.host, str(e))
+                continue
+            self.pool.mark_warm(backend, model)
+            warmed += 1
+            logger.info("Warmed up %s on %s in %.2fs", model, backend.host, time.monotonic() - started)
+        return warmed
+
+
+_shared_client: Optional[LLMClient] = None
+_shared_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """Return the process-wide LLMClient, creating it on first use"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = LLMClient()
+    return _shared_client
@@ -0,0 +1,305 @@
+"""Per-stage timing of routes and process-wide routing metrics.
+
+Each route is timed stage by stage (``classify``, ``classify.llm``,
+``classify.parse``, ``select_handler``, ``generate``, ``route``), with
+Ollama's token counts and prompt-eval/eval durations attached to the model
+call spans. Finished routes carry their timings and usage in
+``response.metadata["timings"]`` and ``["usage"]``. The counters and
+histograms in ``metrics`` are served as Prometheus text at ``/metrics``
+when ``METRICS_PORT`` is set, and every span also reaches the MetricsHooks
+registered with ``metrics.add_hook``.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, AsyncIterator, Dict, Iterator, List, Mapping, Optional, Tuple
+import threading
+import time
+from src.utils.logging_config import logger
+
+# Span attributes that become metric labels; everything else stays on the span only
+LABEL_KEYS = ("category", "model", "handler", "source")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Usage fields Ollama reports with every completed generation
+USAGE_FIELDS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _label_set(labels: Mapping[str, Any]) -> LabelSet:
+    return tuple(sorted((key, str(value)) for key, value in labels.items() if value is not None))
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(pairs, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self.values: Dict[LabelSet, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels, in Prometheus layout"""
+
+    def __init__(self, name: str, description: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        # labels -> (bucket counts, sum, count)
+        self.values: Dict[LabelSet, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_set(labels)
+        with self._lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self.values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', f'{bound:g}'))} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {total:g}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Span:
+    """One timed stage of a route, with attributes such as category, model and token usage"""
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def add_usage(self, usage: Mapping[str, Any]) -> None:
+        """Accumulate Ollama token counts and durations reported during this span"""
+        for field in USAGE_FIELDS:
+            if usage.get(field) is not None:
+                self.attributes[field] = self.attributes.get(field, 0) + usage[field]
+
+    def labels(self) -> Dict[str, Any]:
+        return {key: self.attributes[key] for key in LABEL_KEYS if key in self.attributes}
+
+
+class Trace:
+    """The spans finished while routing one query"""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def timings(self) -> Dict[str, float]:
+        """Milliseconds spent per stage, summed over repeated stages"""
+        timings: Dict[str, float] = {}
+        for span in self.spans:
+            key = span.name.replace(".", "_") + "_ms"
+            timings[key] = round(timings.get(key, 0.0) + span.duration * 1000, 2)
+        return timings
+
+    def usage(self) -> Dict[str, int]:
+        """Token counts and durations (nanoseconds) reported by Ollama across all stages"""
+        usage: Dict[str, int] = {}
+        for span in self.spans:
+            for field in USAGE_FIELDS:
+                if field in span.attributes:
+                    usage[field] = usage.get(field, 0) + span.attributes[field]
+        return usage
+
+
+class MetricsHook:
+    """Receives every finished span and model call; subclass and register with ``metrics.add_hook``"""
+
+    def on_span(self, span: Span) -> None:
+        pass
+
+    def on_llm_call(self, model: str, usage: Mapping[str, Any]) -> None:
+        pass
+
+
+class Metrics:
+    """Process-wide counters and histograms for routing, exportable as Prometheus text"""
+
+    def __init__(self):
+        self.stage_seconds = Histogram("routing_stage_seconds", "Time spent in each routing stage")
+        self.routes = Counter("routing_routes_total", "Routed queries by category and handler")
+        self.fallbacks = Counter("routing_fallbacks_total", "Fallback answers returned after model failures")
+        self.errors = Counter("routing_stage_errors_total", "Routing stages that raised an exception")
+        self.local_classifier = Counter(
+            "routing_local_classifier_total", "Local classifier decisions served, and agreement with the LLM"
+        )
+        self.coalesced = Counter("routing_coalesced_total", "Requests that shared an identical in-flight model call")
+        self.rejections = Counter("routing_rejected_total", "Requests turned away because the server was full or draining")
+        self.deadlines = Counter("routing_deadline_exceeded_total", "Model calls cut off by their route or stage deadline")
+        self.hedges = Counter("routing_hedged_total", "Hedged classification requests by outcome")
+        self.summaries = Counter("routing_conversation_summaries_total", "Background conversation summaries by outcome")
+        self.llm_tokens = Counter("llm_tokens_total", "Tokens processed by Ollama by model and kind")
+        self.llm_seconds = Histogram("llm_phase_seconds", "Ollama load, prompt eval and generation time")
+        self.hooks: List[MetricsHook] = []
+
+    def add_hook(self, hook: MetricsHook) -> None:
+        self.hooks.append(hook)
+
+    def record_span(self, span: Span) -> None:
+        self.stage_seconds.observe(span.duration, stage=span.name, **span.labels())
+        if span.error:
+            self.errors.inc(stage=span.name, error=span.error)
+        for hook in self.hooks:
+            try:
+                hook.on_span(span)
+            except Exception as e:
+                logger.warning("Metrics hook %s failed: %s", type(hook).__name__, str(e))
+
+    def record_llm_call(self, model: str, usage: Mapping[str, Any]) -> None:
+        self.llm_tokens.inc(usage.get("prompt_eval_count") or 0, model=model, kind="prompt")
+        self.llm_tokens.inc(usage.get("eval_count") or 0, model=model, kind="completion")
+        for phase in ("load", "prompt_eval", "eval"):
+            duration = usage.get(f"{phase}_duration")
+            if duration is not None:
+                self.llm_seconds.observe(duration / 1e9, model=model, phase=phase)
+        for hook in self.hooks:
+            try:
+                hook.on_llm_call(model, usage)
+            except Exception as e:
+                logger.warning("Metrics hook %s failed: %s", type(hook).__name__, str(e))
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+        for metric in (self.stage_seconds, self.routes, self.fallbacks, self.errors, self.rejections, self.coalesced,
+                       self.deadlines, self.hedges, self.summaries, self.local_classifier, self.llm_tokens, self.llm_seconds):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("routing_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("routing_span", default=None)
+
+
+@contextmanager
+def trace(route_trace: Optional[Trace] = None) -> Iterator[Trace]:
+    """Collect the spans of one route so their timings can be attached to the response"""
+    route_trace = route_trace or Trace()
+    token = _current_trace.set(route_trace)
+    try:
+        yield route_trace
+    finally:
+        _current_trace.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Span]:
+    """Time a stage; model calls made inside it add their token usage to the span"""
+    current = Span(name, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        finish_span(current)
+
+
+def finish_span(current: Span, route_trace: Optional[Trace] = None, duration: Optional[float] = None) -> None:
+    """Record a span, by default timed from its creation until now"""
+    current.duration = time.perf_counter() - current.started if duration is None else duration
+    route_trace = route_trace or _current_trace.get()
+    if route_trace is not None:
+        route_trace.spans.append(current)
+    metrics.record_span(current)
+
+
+def iterate_in_span(iterator: Iterator, current: Span) -> Iterator:
+    """Advance a stream with ``current`` active, without keeping it active across yields"""
+    while True:
+        token = _current_span.set(current)
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            _current_span.reset(token)
+        yield item
+
+
+async def aiterate_in_span(iterator: AsyncIterator, current: Span) -> AsyncIterator:
+    """Async version of iterate_in_span"""
+    while True:
+        token = _current_span.set(current)
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            return
+        finally:
+            _current_span.reset(token)
+        yield item
+
+
+def record_llm_usage(model: str, usage: Mapping[str, Any]) -> None:
+    """Attribute an Ollama response's usage to the active span and the global metrics"""
+    current = _current_span.get()
+    if current is not None:
+        current.add_usage(usage)
+    metrics.record_llm_call(model, usage)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve /metrics in Prometheus text format from a background thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    logger.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
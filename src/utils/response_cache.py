@@ -0,0 +1,134 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import numpy as np
+from src.models.responses import HandlerResponse
+from src.models.routing import QueryCategory
+from src.utils.embeddings import Embedder
+from src.utils.logging_config import logger
+
+
+@dataclass
+class ResponseCachePolicy:
+    """How close a query must be to a cached one, and for how long answers stay valid"""
+    similarity_threshold: float
+    ttl_seconds: float
+
+
+# Categories not listed here are never served from the response cache
+DEFAULT_RESPONSE_CACHE_POLICIES = {
+    QueryCategory.GENERAL_INQUIRY: ResponseCachePolicy(similarity_threshold=0.92, ttl_seconds=3600),
+    QueryCategory.TECHNICAL_SUPPORT: ResponseCachePolicy(similarity_threshold=0.95, ttl_seconds=1800),
+    QueryCategory.PRODUCT_RECOMMENDATION: ResponseCachePolicy(similarity_threshold=0.95, ttl_seconds=1800),
+}
+
+
+class _CategoryEntries:
+    """Ring buffer of query embeddings and the responses generated for them"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.created_at = np.zeros(capacity, dtype=np.float64)
+        self.responses: List[Optional[HandlerResponse]] = [None] * capacity
+        self.next_slot = 0
+
+    def best_match(self, vector: np.ndarray, now: float) -> Tuple[int, float]:
+        if self.vectors is None:
+            return -1, 0.0
+        similarities = self.vectors @ vector
+        similarities[self.expires_at <= now] = -1.0
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def add(self, vector: np.ndarray, response: HandlerResponse, now: float, ttl_seconds: float) -> None:
+        if self.vectors is None:
+            self.vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        slot = self.next_slot
+        self.vectors[slot] = vector
+        self.created_at[slot] = now
+        self.expires_at[slot] = now + ttl_seconds
+        self.responses[slot] = response
+        self.next_slot = (slot + 1) % self.capacity
+
+
+class ResponseCache:
+    """Opt-in semantic cache of handler responses.
+
+    Responses are stored per category next to the embedding of the query that
+    produced them. A later query in the same category whose cosine similarity
+    to a stored query reaches the category's threshold gets the stored
+    response back, tagged as served from cache. Callers are responsible for
+    skipping handlers that deal with sensitive data.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        policies: Optional[Dict[QueryCategory, ResponseCachePolicy]] = None,
+        max_entries_per_category: int = 512,
+    ):
+        self.embedder = embedder or Embedder()
+        self.policies = policies if policies is not None else dict(DEFAULT_RESPONSE_CACHE_POLICIES)
+        self.max_entries_per_category = max_entries_per_category
+
+        self._entries: Dict[QueryCategory, _CategoryEntries] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def covers(self, category: QueryCategory) -> bool:
+        """Whether responses for this category may be cached at all"""
+        return category in self.policies
+
+    def lookup(self, category: QueryCategory, query: str) -> Tuple[Optional[HandlerResponse], Optional[np.ndarray]]:
+        """Return (cached response or None, query embedding for a later store)"""
+        try:
+            vector = self.embedder.embed(query)
+        except Exception as e:
+            logger.warning("Response cache unavailable: %s", str(e))
+            return None, None
+
+        now = time.time()
+        with self._lock:
+            entries = self._entries.get(category)
+            slot, similarity = entries.best_match(vector, now) if entries else (-1, 0.0)
+            if slot < 0 or similarity < self.policies[category].similarity_threshold:
+                self.misses += 1
+                return None, vector
+
+            self.hits += 1
+            cached = entries.responses[slot]
+            age = float(now - entries.created_at[slot])
+
+        return HandlerResponse(
+            response=cached.response,
+            metadata={
+                **cached.metadata,
+                "cached": True,
+                "cache_similarity": round(similarity, 4),
+                "cache_age_seconds": round(age, 1),
+            },
+            handler_name=cached.handler_name
+        ), vector
+
+    def store(self, category: QueryCategory, vector: Optional[np.ndarray], response: HandlerResponse) -> None:
+        """Remember a freshly generated response for similar future queries"""
+        if vector is None or not self.covers(category) or not response.response:
+            return
+        with self._lock:
+            entries = self._entries.get(category)
+            if entries is None:
+                entries = self._entries[category] = _CategoryEntries(self.max_entries_per_category)
+            entries.add(vector, response, time.time(), self.policies[category].ttl_seconds)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
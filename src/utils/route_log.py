@@ -0,0 +1,319 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+import atexit
+import mmap
+import os
+import struct
+import threading
+import time
+import numpy as np
+from src.models.responses import HandlerResponse
+from src.models.routing import QueryCategory, RoutingDecision
+from src.utils.logging_config import logger
+
+MAGIC = b"RLOG"
+VERSION = 1
+# Magic, version, record size, then reserved bytes
+HEADER = struct.Struct("<4sHH8x")
+
+# One fixed-width record per routed query; text lives in the string heap next to the log
+RECORD_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("category", "u1"),
+    ("source", "u1"),
+    ("flags", "u1"),
+    ("intents", "u1"),
+    ("confidence", "<f4"),
+    ("classify_ms", "<f4"),
+    ("generate_ms", "<f4"),
+    ("route_ms", "<f4"),
+    ("prompt_tokens", "<u4"),
+    ("completion_tokens", "<u4"),
+    ("response_chars", "<u4"),
+    ("query_offset", "<u8"),
+    ("query_length", "<u4"),
+    ("handler_offset", "<u8"),
+    ("handler_length", "<u4"),
+])
+
+# Codes are positions in these tuples; new values may only be appended
+CATEGORIES = tuple(QueryCategory)
+SOURCES = ("llm", "cache", "semantic", "local", "coalesced", "multi_intent", "conversation")
+UNKNOWN_SOURCE = 255
+
+FLAG_FALLBACK = 1
+FLAG_DEGRADED = 2
+FLAG_RESPONSE_CACHED = 4
+FLAG_COALESCED = 8
+
+_CATEGORY_CODES = {category: code for code, category in enumerate(CATEGORIES)}
+_SOURCE_CODES = {source: code for code, source in enumerate(SOURCES)}
+
+
+def _strings_path(path: str) -> str:
+    return path + ".strings"
+
+
+def _check_header(header: bytes, path: str) -> None:
+    magic, version, record_size = HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION or record_size != RECORD_DTYPE.itemsize:
+        raise ValueError(f"{path} is not a version {VERSION} routing log")
+
+
+class RouteLog:
+    """Append-only binary log of routed queries.
+
+    Each route is one fixed-width record (see RECORD_DTYPE) holding codes,
+    confidences, stage timings and token counts, plus offsets into a string
+    heap file (``<path>.strings``) holding the query and handler name.
+    Records are buffered and flushed at most every ``flush_interval`` seconds
+    and when the process exits; heap bytes are handed to the OS before the
+    record pointing at them is buffered, so a record that reaches the file
+    has its text in the heap unless the machine itself went down. A torn
+    record left by a crash is cut off on the next open, and readers also
+    drop trailing records whose text is missing from the heap.
+
+    Heap offsets are tracked by the writer, so a file must have a single
+    writer; routers in one process share it through ``get_route_log``.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._records = open(path, "ab")
+        size = os.fstat(self._records.fileno()).st_size
+        if size == 0:
+            self._records.write(HEADER.pack(MAGIC, VERSION, RECORD_DTYPE.itemsize))
+            self._records.flush()
+        else:
+            with open(path, "rb") as existing:
+                _check_header(existing.read(HEADER.size), path)
+            torn = (size - HEADER.size) % RECORD_DTYPE.itemsize
+            if torn:
+                logger.warning("Dropping %s bytes of a torn record at the end of %s", torn, path)
+                self._records.truncate(size - torn)
+        self._strings = open(_strings_path(path), "ab")
+        self._heap_size = os.fstat(self._strings.fileno()).st_size
+        # Handler names repeat on every record, so each is stored once per writer
+        self._interned: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def _store(self, text: str) -> Tuple[int, int]:
+        data = text.encode("utf-8")
+        offset = self._heap_size
+        self._strings.write(data)
+        self._heap_size += len(data)
+        return offset, len(data)
+
+    def _intern(self, text: str) -> Tuple[int, int]:
+        offset = self._interned.get(text)
+        if offset is None:
+            offset, _ = self._store(text)
+            self._interned[text] = offset
+        return offset, len(text.encode("utf-8"))
+
+    def append(
+        self,
+        query: str,
+        routing_decision: RoutingDecision,
+        response: HandlerResponse,
+        source: Optional[str] = None,
+        timestamp: Optional[float] = None,
+    ) -> None:
+        """Record one route; timings and token usage are read from the response metadata"""
+        metadata = response.metadata
+        timings = metadata.get("timings") or {}
+        usage = metadata.get("usage") or {}
+        flags = (
+            FLAG_FALLBACK * bool(metadata.get("fallback"))
+            | FLAG_DEGRADED * bool(metadata.get("degraded"))
+            | FLAG_RESPONSE_CACHED * bool(metadata.get("cached"))
+            | FLAG_COALESCED * bool(metadata.get("coalesced"))
+        )
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record["timestamp"] = time.time() if timestamp is None else timestamp
+        record["category"] = _CATEGORY_CODES[routing_decision.category]
+        record["source"] = _SOURCE_CODES.get(source, UNKNOWN_SOURCE)
+        record["flags"] = flags
+        record["intents"] = min(len(metadata.get("intents") or ()) or 1, 255)
+        record["confidence"] = routing_decision.confidence
+        record["classify_ms"] = timings.get("classify_ms", 0.0)
+        record["generate_ms"] = timings.get("generate_ms", 0.0)
+        record["route_ms"] = timings.get("route_ms", 0.0)
+        record["prompt_tokens"] = usage.get("prompt_eval_count", 0)
+        record["completion_tokens"] = usage.get("eval_count", 0)
+        record["response_chars"] = len(response.response)
+
+        try:
+            with self._lock:
+                record["query_offset"], record["query_length"] = self._store(query)
+                record["handler_offset"], record["handler_length"] = self._intern(response.handler_name)
+                # The record buffer may reach the file on its own at any time, so its text must be there first
+                self._strings.flush()
+                self._records.write(record.tobytes())
+                if time.monotonic() - self._last_flush >= self.flush_interval:
+                    self._flush()
+        except OSError as e:
+            logger.warning("Could not write to routing log %s: %s", self.path, str(e))
+
+    def _flush(self) -> None:
+        self._strings.flush()
+        self._records.flush()
+        self._last_flush = time.monotonic()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._records.closed:
+                self._flush()
+
+    def close(self) -> None:
+        atexit.unregister(self.flush)
+        with self._lock:
+            if self._records.closed:
+                return
+            self._flush()
+            self._records.close()
+            self._strings.close()
+
+
+_shared_logs: Dict[str, RouteLog] = {}
+_shared_logs_lock = threading.Lock()
+
+
+def get_route_log(path: str) -> RouteLog:
+    """Return the process-wide RouteLog writing to ``path``, opening it on first use"""
+    key = os.path.abspath(path)
+    with _shared_logs_lock:
+        if key not in _shared_logs:
+            _shared_logs[key] = RouteLog(path)
+        return _shared_logs[key]
+
+
+class RouteLogReader:
+    """Memory-maps a RouteLog for analysis.
+
+    ``records`` is a structured NumPy array backed by the file, so columns
+    such as ``reader.column("route_ms")`` are views, not copies, and
+    aggregates over millions of routes run at NumPy speed. The reader sees
+    the records flushed when it was opened, less any at the end whose text
+    never reached the string heap.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        size = os.path.getsize(path)
+        with open(path, "rb") as log_file:
+            _check_header(log_file.read(HEADER.size), path)
+        count = (size - HEADER.size) // RECORD_DTYPE.itemsize
+        if count:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER.size, shape=(count,))
+            heap_size = os.path.getsize(_strings_path(path)) if os.path.exists(_strings_path(path)) else 0
+            # Text is written in record order, so only a tail of records can point past the heap
+            valid = count
+            while valid and not self._in_heap(self.records[valid - 1], heap_size):
+                valid -= 1
+            if valid < count:
+                logger.warning("Ignoring %s records at the end of %s whose text is missing", count - valid, path)
+                self.records = self.records[:valid]
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+        self._heap: Optional[mmap.mmap] = None
+
+    @staticmethod
+    def _in_heap(record: np.void, heap_size: int) -> bool:
+        return (
+            int(record["query_offset"]) + int(record["query_length"]) <= heap_size
+            and int(record["handler_offset"]) + int(record["handler_length"]) <= heap_size
+        )
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def column(self, name: str) -> np.ndarray:
+        return self.records[name]
+
+    def _text(self, offset: int, length: int) -> str:
+        if self._heap is None:
+            with open(_strings_path(self.path), "rb") as heap_file:
+                self._heap = mmap.mmap(heap_file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._heap[offset:offset + length].decode("utf-8")
+
+    def query(self, index: int) -> str:
+        record = self.records[index]
+        return self._text(int(record["query_offset"]), int(record["query_length"]))
+
+    def handler(self, index: int) -> str:
+        record = self.records[index]
+        return self._text(int(record["handler_offset"]), int(record["handler_length"]))
+
+    def since(self, timestamp: float) -> np.ndarray:
+        """Mask of the routes at or after a unix timestamp"""
+        return self.records["timestamp"] >= timestamp
+
+    def _select(self, mask: Optional[np.ndarray]) -> np.ndarray:
+        return self.records if mask is None else self.records[mask]
+
+    def category_counts(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        codes = self._select(mask)["category"]
+        counts = np.bincount(codes, minlength=len(CATEGORIES))
+        return {category.value: int(counts[code]) for code, category in enumerate(CATEGORIES) if counts[code]}
+
+    def source_counts(self, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        counts = np.bincount(self._select(mask)["source"], minlength=UNKNOWN_SOURCE + 1)
+        names = {code: source for code, source in enumerate(SOURCES)}
+        return {names.get(code, "unknown"): int(count) for code, count in enumerate(counts) if count}
+
+    def flag_rate(self, flag: int, mask: Optional[np.ndarray] = None) -> float:
+        flags = self._select(mask)["flags"]
+        return float(np.count_nonzero(flags & flag) / len(flags)) if len(flags) else 0.0
+
+    def confidence_histogram(self, bins: int = 10, mask: Optional[np.ndarray] = None) -> Dict[str, int]:
+        counts, edges = np.histogram(self._select(mask)["confidence"], bins=bins, range=(0.0, 1.0))
+        return {f"{low:.1f}-{high:.1f}": int(count) for low, high, count in zip(edges, edges[1:], counts)}
+
+    def percentiles(
+        self, column: str = "route_ms", percentiles: Sequence[float] = (50, 95, 99), mask: Optional[np.ndarray] = None
+    ) -> Dict[str, Dict[str, float]]:
+        """Percentiles of a column overall and per category"""
+        records = self._select(mask)
+        groups = [("all", records[column])] + [
+            (category.value, records[column][records["category"] == code]) for code, category in enumerate(CATEGORIES)
+        ]
+        return {
+            name: {f"p{q:g}": round(float(value), 2) for q, value in zip(percentiles, np.percentile(values, percentiles))}
+            for name, values in groups if len(values)
+        }
+
+    def summary(self, mask: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        records = self._select(mask)
+        if not len(records):
+            return {"routes": 0}
+        return {
+            "routes": len(records),
+            "first": float(records["timestamp"].min()),
+            "last": float(records["timestamp"].max()),
+            "categories": self.category_counts(mask),
+            "sources": self.source_counts(mask),
+            "mean_confidence": round(float(records["confidence"].mean()), 4),
+            "confidence": self.confidence_histogram(mask=mask),
+            "route_ms": self.percentiles("route_ms", mask=mask),
+            "fallback_rate": round(self.flag_rate(FLAG_FALLBACK, mask), 4),
+            "response_cache_rate": round(self.flag_rate(FLAG_RESPONSE_CACHED, mask), 4),
+            "multi_intent_rate": round(float(np.count_nonzero(records["intents"] > 1) / len(records)), 4),
+            "tokens": {
+                "prompt": int(records["prompt_tokens"].sum(dtype=np.uint64)),
+                "completion": int(records["completion_tokens"].sum(dtype=np.uint64)),
+            },
+        }
+
+    def close(self) -> None:
+        if self._heap is not None:
+            self._heap.close()
+            self._heap = None
+        # The file stays mapped until the last view of it is gone
+        self.records = np.zeros(0, dtype=RECORD_DTYPE)
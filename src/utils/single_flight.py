@@ -0,0 +1,103 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import threading
+from src.utils.deadline import current_deadline, remaining
+from src.utils.llm_client import DeadlineExceeded
+from src.utils.metrics import metrics
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Lets concurrent callers with the same key share one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait and receive the same result (or exception). Nothing is cached
+    once the call finishes. A waiting caller gives up with DeadlineExceeded
+    when its own deadline passes first.
+    """
+
+    def __init__(self, kind: str):
+        # Label of the coalesced-requests counter, e.g. "classification"
+        self.kind = kind
+        self.coalesced = 0
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, function: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared), where ``shared`` is True for callers that waited on another's call"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced += 1
+        if not leader:
+            metrics.coalesced.inc(kind=self.kind)
+            if not call.done.wait(remaining(current_deadline())):
+                raise DeadlineExceeded(f"Deadline exceeded waiting for a shared {self.kind} call")
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines on one event loop"""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.coalesced = 0
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, function: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            metrics.coalesced.inc(kind=self.kind)
+            try:
+                # Shielded so one waiter giving up does not cancel the shared call
+                async with asyncio.timeout(remaining(current_deadline())):
+                    return await asyncio.shield(future), True
+            except TimeoutError:
+                raise DeadlineExceeded(f"Deadline exceeded waiting for a shared {self.kind} call")
+            except asyncio.CancelledError:
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                # The leader was cancelled (e.g. its client went away); run the call ourselves
+                return await self.do(key, function)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        try:
+            result = await function()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark it retrieved so a call nobody waited on does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        return result, False
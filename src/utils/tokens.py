@@ -0,0 +1,3 @@
+def estimate_tokens(text: str) -> int:
+    """Rough token count for prompt budgeting (about four characters per token)"""
+    return len(text) // 4 + 1
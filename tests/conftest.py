@@ -0,0 +1,19 @@
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaConfig, FakeOllamaServer
+from src.config.settings import settings
+from src.utils import llm_client
+
+
+@pytest.fixture
+def ollama(monkeypatch):
+    """A fake Ollama server that the shared LLM client talks to, with the on-disk logs turned off"""
+    server = FakeOllamaServer(("127.0.0.1", 0), FakeOllamaConfig()).start()
+    monkeypatch.setattr(settings, "OLLAMA_HOST", server.url)
+    monkeypatch.setattr(settings, "OLLAMA_HOSTS", [server.url])
+    monkeypatch.setattr(settings, "DECISION_LOG_PATH", "")
+    monkeypatch.setattr(settings, "ROUTE_LOG_PATH", "")
+    monkeypatch.setattr(llm_client, "_shared_client", None)
+    yield server
+    server.shutdown()
+    server.server_close()
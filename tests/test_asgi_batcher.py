@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+import pytest
+
+from src.config.settings import settings
+from src.router.async_router import AsyncRouter
+from src.server.asgi import _DONE, ClassificationBatcher, RoutingService
+from src.utils.deadline import deadline
+from src.utils.llm_client import DeadlineExceeded
+
+QUERIES = ["I want a refund for order #12345", "My app crashes with error E404"]
+
+
+def classify_together(batcher: ClassificationBatcher):
+    async def run():
+        return await asyncio.gather(*(batcher.classify(query) for query in QUERIES), return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_batches_are_classified_together(ollama):
+    batcher = ClassificationBatcher(AsyncRouter(), window=0.01, max_size=10)
+    decisions = classify_together(batcher)
+    assert [decision.category.value for decision in decisions] == ["refund_request", "technical_support"]
+
+
+def test_batch_applies_classify_timeout(ollama, monkeypatch):
+    ollama.config.latency = 1.0
+    monkeypatch.setattr(settings, "CLASSIFY_TIMEOUT", 0.2)
+    batcher = ClassificationBatcher(AsyncRouter(), window=0.01, max_size=10)
+    decisions = classify_together(batcher)
+    # Without a deadline the slow server would still have classified both
+    assert [decision.category.value for decision in decisions] == ["unknown", "unknown"]
+    assert all("Deadline exceeded" in decision.reasoning for decision in decisions)
+
+
+def test_caller_stops_waiting_at_its_deadline(ollama):
+    ollama.config.latency = 1.0
+    batcher = ClassificationBatcher(AsyncRouter(), window=0.01, max_size=10)
+
+    async def run():
+        with deadline(0.1):
+            await batcher.classify(QUERIES[0])
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.monotonic() - started < 0.5
+
+
+def test_served_route_degrades_at_the_route_deadline(ollama, monkeypatch):
+    ollama.config.latency = 1.0
+    monkeypatch.setattr(settings, "ROUTE_TIMEOUT", 0.2)
+    monkeypatch.setattr(settings, "WARMUP_ON_START", False)
+    service = RoutingService(AsyncRouter(), workers=1, batch_window=0.01)
+
+    async def run():
+        await service.start()
+        job = service.submit(QUERIES[0], stream=False)
+        events = []
+        while (event := await job.events.get()) is not _DONE:
+            events.append(event)
+        await service.stop()
+        return events
+
+    started = time.monotonic()
+    decision, response = asyncio.run(run())
+    assert time.monotonic() - started < 1.0
+    assert decision.category.value == "unknown" and "Deadline exceeded" in decision.reasoning
+    assert response.metadata["fallback"] is True
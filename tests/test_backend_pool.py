@@ -0,0 +1,90 @@
+from src.utils.backend_pool import BackendPool
+from src.utils.llm_client import CircuitBreaker
+
+HOSTS = ["http://gpu1:11434", "http://gpu2:11434", "http://gpu3:11434"]
+
+
+def make_pool(**options) -> BackendPool:
+    options.setdefault("health_check_interval", 0)
+    return BackendPool(HOSTS, {}, lambda: CircuitBreaker(failure_threshold=2, reset_timeout=60), **options)
+
+
+def host(lease) -> str:
+    return lease.backend.host
+
+
+def test_picks_least_outstanding_host():
+    pool = make_pool()
+    leases = [pool.acquire("llama3") for _ in range(3)]
+    assert sorted(host(lease) for lease in leases) == sorted(HOSTS)
+
+    pool.release(leases[1])
+    assert host(pool.acquire("llama3")) == host(leases[1])
+
+
+def test_prefers_host_with_the_model_warm_within_slack():
+    pool = make_pool(affinity_slack=1)
+    warm = pool.backends[2]
+    pool.mark_warm(warm, "gemma3")
+    first = pool.acquire("gemma3")
+    assert first.backend is warm
+    # One more request than the idle hosts is within the slack
+    assert pool.acquire("gemma3").backend is warm
+    # Beyond the slack the least loaded host wins
+    assert pool.acquire("gemma3").backend is not warm
+
+
+def test_exclude_skips_hosts_while_others_are_available():
+    pool = make_pool()
+    lease = pool.acquire("llama3", exclude=pool.backends[:2])
+    assert lease.backend is pool.backends[2]
+    # With every host excluded the pool still answers
+    assert pool.acquire("llama3", exclude=pool.backends) is not None
+
+
+def test_failing_host_is_ejected():
+    pool = make_pool()
+    bad = pool.backends[0]
+    for _ in range(2):
+        pool.release(pool.acquire("llama3", exclude=pool.backends[1:]), failed=True)
+    assert bad.breaker.state == "open"
+    assert all(pool.acquire("llama3").backend is not bad for _ in range(6))
+
+
+def test_returns_none_when_every_host_is_ejected():
+    pool = make_pool()
+    for backend in pool.backends:
+        backend.breaker.trip()
+    assert pool.acquire("llama3") is None
+
+
+def test_slow_host_is_ejected_against_peers_on_the_same_model():
+    pool = make_pool(slow_factor=3.0)
+    slow, fast = pool.backends[0], pool.backends[1]
+    for _ in range(10):
+        pool.release(pool.acquire("llama3", exclude=[slow, pool.backends[2]], operation="chat"), latency=0.1)
+    for _ in range(10):
+        pool.release(pool.acquire("llama3", exclude=[fast, pool.backends[2]], operation="chat"), latency=1.0)
+    assert slow.breaker.state == "open"
+
+
+def test_hosts_serving_different_models_are_not_compared():
+    pool = make_pool(slow_factor=3.0)
+    large, small = pool.backends[0], pool.backends[1]
+    for _ in range(10):
+        pool.release(pool.acquire("phi3", exclude=[large, pool.backends[2]], operation="chat"), latency=0.1)
+    for _ in range(10):
+        pool.release(pool.acquire("llama3:70b", exclude=[small, pool.backends[2]], operation="chat"), latency=2.0)
+    assert large.breaker.state == "closed"
+    assert set(pool.stats()[0]["ewma_latency"]) == {"llama3:70b chat"}
+
+
+def test_streams_and_blocking_calls_are_not_compared():
+    pool = make_pool(slow_factor=3.0)
+    streaming, blocking = pool.backends[0], pool.backends[1]
+    for _ in range(10):
+        pool.release(pool.acquire("llama3", exclude=[streaming, pool.backends[2]], operation="chat"), latency=2.0)
+    for _ in range(10):
+        pool.release(pool.acquire("llama3", exclude=[blocking, pool.backends[2]], operation="chat_stream"), latency=0.2)
+    assert streaming.breaker.state == "closed"
+    assert blocking.breaker.state == "closed"
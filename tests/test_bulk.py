@@ -0,0 +1,121 @@
+import argparse
+import json
+
+import pytest
+
+from src.cli.bulk import Checkpoint, Progress, read_records, run
+
+QUERIES = [
+    "I want a refund for order #12345",
+    "My app crashes with error E404",
+    "Why was I charged twice this month?",
+    "Can you recommend a laptop for students?",
+    "What are your opening hours?",
+    "The website will not load on my phone",
+]
+
+
+def test_watermark_advances_over_out_of_order_completions():
+    checkpoint = Checkpoint("unused", "input.jsonl")
+    for position in (2, 0, 3):
+        checkpoint.mark_done(position)
+    assert (checkpoint.watermark, checkpoint.done_above) == (0, {2, 3})
+    checkpoint.mark_done(1)
+    assert (checkpoint.watermark, checkpoint.done_above) == (3, set())
+    assert checkpoint.completed == 4
+    assert checkpoint.is_done(3) and not checkpoint.is_done(4)
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "out.jsonl.checkpoint")
+    checkpoint = Checkpoint(path, "input.jsonl")
+    for position in (0, 1, 5):
+        checkpoint.mark_done(position)
+    checkpoint.save(1234)
+
+    loaded = Checkpoint.load(path, "input.jsonl")
+    assert (loaded.watermark, loaded.done_above, loaded.output_bytes) == (1, {5}, 1234)
+    with pytest.raises(ValueError):
+        Checkpoint.load(path, "other.jsonl")
+    assert Checkpoint.load(str(tmp_path / "missing"), "input.jsonl") is None
+
+
+def test_read_records_flags_records_without_a_query(tmp_path):
+    path = tmp_path / "input.jsonl"
+    path.write_text('"plain string"\n{"query": "as object", "id": 7}\n\n{"query": " "}\nnot json\n', encoding="utf-8")
+    records = list(read_records(str(path), "jsonl", "query", "id"))
+    assert records == [(0, "plain string", None), (1, "as object", 7), (2, None, None), (3, None, None)]
+
+
+def bulk_args(input_path: str, output_path: str, resume: bool) -> argparse.Namespace:
+    return argparse.Namespace(
+        input=input_path, output=output_path, format=None, field="query", id_field=None, handle=False,
+        workers=2, batch_size=2, ordered=False, resume=resume, checkpoint_every=1,
+        progress_interval=0, fail_on_error=False,
+    )
+
+
+def write_input(tmp_path) -> str:
+    input_path = str(tmp_path / "input.jsonl")
+    with open(input_path, "w", encoding="utf-8") as input_file:
+        input_file.writelines(json.dumps({"query": query}) + "\n" for query in QUERIES)
+    return input_path
+
+
+def test_resume_routes_only_unfinished_records_and_drops_torn_output(ollama, tmp_path):
+    input_path = write_input(tmp_path)
+    output_path = str(tmp_path / "routed.jsonl")
+
+    # A crashed run: records 0, 1 and 4 were checkpointed, then a line was torn mid-write
+    finished = b"".join(
+        json.dumps({"index": index, "query": QUERIES[index], "decision": {}}).encode("utf-8") + b"\n" for index in (0, 1, 4)
+    )
+    with open(output_path, "wb") as output_file:
+        output_file.write(finished + b'{"index": 2, "qu')
+    checkpoint = Checkpoint(output_path + ".checkpoint", input_path)
+    for position in (0, 1, 4):
+        checkpoint.mark_done(position)
+    checkpoint.save(len(finished))
+
+    assert run(bulk_args(input_path, output_path, resume=True)) == 0
+
+    with open(output_path, "r", encoding="utf-8") as output_file:
+        results = [json.loads(line) for line in output_file]
+    assert sorted(result["index"] for result in results) == list(range(len(QUERIES)))
+    rerouted = [result for result in results if result["index"] in (2, 3, 5)]
+    assert all(result["decision"]["category"] != "unknown" for result in rerouted)
+    assert Checkpoint.load(output_path + ".checkpoint", input_path) is None
+
+
+def test_interrupt_while_writing_a_batch_does_not_write_it_twice(ollama, tmp_path, monkeypatch):
+    input_path = write_input(tmp_path)
+    output_path = str(tmp_path / "routed.jsonl")
+    update = Progress.update
+    calls = []
+
+    def interrupted_update(self, results):
+        calls.append(len(results))
+        update(self, results)
+        if len(calls) == 1:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(Progress, "update", interrupted_update)
+    assert run(bulk_args(input_path, output_path, resume=False)) == 130
+    monkeypatch.setattr(Progress, "update", update)
+    assert run(bulk_args(input_path, output_path, resume=True)) == 0
+
+    with open(output_path, "r", encoding="utf-8") as output_file:
+        indexes = [json.loads(line)["index"] for line in output_file]
+    assert sorted(indexes) == list(range(len(QUERIES)))
+
+
+def test_resume_without_a_checkpoint_keeps_the_output(ollama, tmp_path):
+    input_path = write_input(tmp_path)
+    output_path = str(tmp_path / "routed.jsonl")
+    assert run(bulk_args(input_path, output_path, resume=False)) == 0
+    with open(output_path, "rb") as output_file:
+        routed = output_file.read()
+
+    assert run(bulk_args(input_path, output_path, resume=True)) == 1
+    with open(output_path, "rb") as output_file:
+        assert output_file.read() == routed
@@ -0,0 +1,77 @@
+import time
+
+from src.models.routing import QueryCategory, RoutingDecision
+from src.utils.classification_cache import ClassificationCache, normalize_query
+
+
+def decision(category: QueryCategory = QueryCategory.REFUND_REQUEST) -> RoutingDecision:
+    return RoutingDecision(category=category, confidence=0.9, reasoning="test", extracted_info={"order_number": "12345"})
+
+
+def test_key_ignores_case_punctuation_and_spacing():
+    assert normalize_query("  Where is   my ORDER #123?! ") == "where is my order #123"
+    key = ClassificationCache.make_key("Refund please!", "llama3", "v1")
+    assert key == ClassificationCache.make_key("refund   please", "llama3", "v1")
+    assert key != ClassificationCache.make_key("refund please", "gemma3", "v1")
+    assert key != ClassificationCache.make_key("refund please", "llama3", "v2")
+
+
+def test_hit_returns_a_copy_without_extracted_info():
+    cache = ClassificationCache()
+    cache.set("key", decision())
+    first = cache.get("key")
+    assert first.category == QueryCategory.REFUND_REQUEST
+    assert first.extracted_info == {}
+    first.extracted_info["order_number"] = "99999"
+    assert cache.get("key").extracted_info == {}
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ClassificationCache(max_entries=2)
+    cache.set("a", decision())
+    cache.set("b", decision())
+    assert cache.get("a") is not None
+    cache.set("c", decision())
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_expired_entries_miss():
+    cache = ClassificationCache(ttl_seconds=0.05)
+    cache.set("key", decision())
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_sqlite_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ClassificationCache(db_path=path)
+    assert cache.persistent
+    cache.set("key", decision(QueryCategory.BILLING_QUESTION))
+
+    restarted = ClassificationCache(db_path=path)
+    hit = restarted.get("key")
+    assert hit.category == QueryCategory.BILLING_QUESTION
+    # The row is promoted to memory, so the next lookup stays in the first tier
+    assert restarted.get("key") is not None
+    stats = restarted.stats()
+    assert (stats["db_hits"], stats["hits"]) == (1, 1)
+
+
+def test_sqlite_tier_honours_ttl(tmp_path):
+    path = str(tmp_path / "cache.db")
+    ClassificationCache(db_path=path).set("key", decision())
+    time.sleep(0.1)
+    assert ClassificationCache(ttl_seconds=0.05, db_path=path).get("key") is None
+
+
+def test_clear_empties_both_tiers(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = ClassificationCache(db_path=path)
+    cache.set("key", decision())
+    cache.clear()
+    assert cache.get("key") is None
+    assert ClassificationCache(db_path=path).get("key") is None
@@ -0,0 +1,34 @@
+from collections import Counter
+
+from src.models.routing import QueryCategory, RoutingDecision
+from src.router.caching import RouteCaches
+from src.router.classifier import LLMClassifier
+from src.router.learning import DecisionLearner
+from src.router.router import Router
+
+
+class UnsureClassifier(LLMClassifier):
+    """Drops every batch and answers each query with low confidence, counting calls per model"""
+
+    def __init__(self, client):
+        super().__init__(client, "small", escalation_model="large")
+        self.calls = Counter()
+
+    def plan_batches(self, queries):
+        return [list(range(len(queries)))] if queries else []
+
+    def classify_batch(self, queries):
+        return {}
+
+    def _classify_with_model(self, query, model):
+        self.calls[model] += 1
+        return RoutingDecision(category=QueryCategory.BILLING_QUESTION, confidence=0.2, reasoning="", extracted_info={})
+
+
+def test_batch_retries_escalate_once(ollama):
+    router = Router(caches=RouteCaches(), learner=DecisionLearner())
+    classifier = UnsureClassifier(router.client)
+    router.classifier = classifier
+    decisions = router.classify_many(["Why was I charged twice?", "Where is my invoice?"])
+    assert [decision.category for decision in decisions] == [QueryCategory.BILLING_QUESTION] * 2
+    assert classifier.calls == {"small": 2, "large": 2}
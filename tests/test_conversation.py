@@ -0,0 +1,67 @@
+from src.utils.conversation import ConversationMemory, has_history, using
+from src.utils.llm_client import LLMClientError
+
+
+class FailingClient:
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, messages, model=None, **options):
+        self.calls += 1
+        raise LLMClientError("summary model unavailable")
+
+
+class SummaryClient:
+    def chat(self, messages, model=None, **options):
+        return {"message": {"content": "Customer asked about order 12345."}}
+
+
+def fill(memory: ConversationMemory, conversation, turns: int) -> None:
+    for index in range(turns):
+        memory.record(conversation, f"question {index} " + "word " * 40, f"answer {index} " + "word " * 40, "general_inquiry")
+        # Summarize inline instead of on the background thread
+        if conversation.summarizing:
+            memory.summarize(conversation)
+
+
+def test_history_stays_within_the_budget():
+    memory = ConversationMemory(client=SummaryClient(), history_tokens=200, summary_tokens=50)
+    conversation = memory.session("s1")
+    fill(memory, conversation, 20)
+    assert conversation.summary == "Customer asked about order 12345."
+    assert conversation.messages("llama3")[0]["role"] == "system"
+    assert sum(turn.tokens for turn in conversation.turns) <= memory.verbatim_tokens
+    assert conversation.turns[-1].query.startswith("question 19")
+
+
+def test_stored_turns_are_capped_when_summaries_keep_failing():
+    client = FailingClient()
+    memory = ConversationMemory(client=client, history_tokens=200, summary_tokens=50, max_turns=5)
+    conversation = memory.session("s1")
+    fill(memory, conversation, 30)
+    assert client.calls > 0
+    assert conversation.summary == ""
+    assert len(conversation.turns) <= 5
+    assert conversation.turns[-1].query.startswith("question 29")
+
+
+def test_sessions_expire_and_are_bounded():
+    memory = ConversationMemory(client=SummaryClient(), max_sessions=2, ttl_seconds=3600)
+    first = memory.session("a")
+    memory.record(first, "hello", "hi", "general_inquiry")
+    assert memory.session("a") is first
+    memory.session("b")
+    memory.session("c")
+    assert memory.session("a") is not first
+    memory.forget("c")
+    assert memory.session("c").empty
+
+
+def test_has_history_follows_the_active_conversation():
+    memory = ConversationMemory(client=SummaryClient())
+    conversation = memory.session("s1")
+    with using(conversation):
+        assert not has_history()
+        memory.record(conversation, "hello", "hi", "general_inquiry")
+        assert has_history()
+    assert not has_history()
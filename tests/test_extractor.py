@@ -0,0 +1,51 @@
+import json
+
+from src.utils.extractor import InfoExtractor
+
+
+def test_extracts_order_number_error_and_product():
+    info = InfoExtractor().extract("My laptop order #12345 fails with error code E404")
+    assert info == {"order_number": "12345", "error_message": "E404", "product_name": "laptop"}
+
+
+def test_order_number_phrasings():
+    extractor = InfoExtractor()
+    for query in ("order 98765 never arrived", "order number: 98765", "Order no. 98765 is late"):
+        assert extractor.extract(query)["order_number"] == "98765"
+
+
+def test_quoted_error_message_is_unquoted():
+    info = InfoExtractor().extract("The app shows error 'disk full' on startup")
+    assert info["error_message"] == "disk full"
+
+
+def test_bare_error_code():
+    info = InfoExtractor().extract("Install stopped at 0x80070005")
+    assert info["error_message"] == "0x80070005"
+
+
+def test_longest_product_name_wins_and_plurals_match():
+    extractor = InfoExtractor()
+    assert extractor.find_product("How much is the premium plan?") == "premium plan"
+    assert extractor.find_product("Do your tablets support styluses?") == "tablet"
+
+
+def test_missing_fields_are_left_out():
+    assert InfoExtractor().extract("Hello there") == {}
+
+
+def test_catalog_file(tmp_path):
+    text_catalog = tmp_path / "catalog.txt"
+    text_catalog.write_text("Gaming Console\n\nE-Reader\n", encoding="utf-8")
+    extractor = InfoExtractor.from_catalog_file(str(text_catalog))
+    assert extractor.find_product("my gaming console broke") == "Gaming Console"
+    assert extractor.find_product("my laptop broke") is None
+
+    json_catalog = tmp_path / "catalog.json"
+    json_catalog.write_text(json.dumps(["Smart TV"]), encoding="utf-8")
+    assert InfoExtractor.from_catalog_file(str(json_catalog)).find_product("smart tv remote") == "Smart TV"
+
+
+def test_missing_catalog_file_falls_back_to_default(tmp_path):
+    extractor = InfoExtractor.from_catalog_file(str(tmp_path / "absent.txt"))
+    assert extractor.find_product("my phone") == "phone"
@@ -0,0 +1,58 @@
+import json
+
+from src.utils.json_stream import IncrementalJSONParser
+
+DOCUMENT = {
+    "category": "refund_request",
+    "confidence": 0.92,
+    "urgent": False,
+    "note": None,
+    "reasoning": "Says \"refund\", mentions {braces} and a \\ backslash",
+    "extracted_info": {"order_number": "12345", "tags": ["a", "b]"]},
+}
+
+
+def test_fields_complete_as_soon_as_their_value_closes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"category": "refund_') == {}
+    assert parser.feed('request", "confid') == {"category": "refund_request"}
+    # A number is only complete once something follows it
+    assert parser.feed('ence": 0.9') == {}
+    assert parser.feed("2,") == {"confidence": 0.92}
+    assert not parser.done
+    assert parser.feed(' "reasoning": "x"}') == {"reasoning": "x"}
+    assert parser.done
+
+
+def test_character_by_character_matches_json_loads():
+    text = json.dumps(DOCUMENT, indent=2)
+    parser = IncrementalJSONParser()
+    completed = {}
+    for char in text:
+        completed.update(parser.feed(char))
+    assert parser.done
+    assert completed == DOCUMENT
+    assert parser.fields == DOCUMENT
+
+
+def test_nested_values_are_reported_once_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"extracted_info": {"order_number": "1') == {}
+    assert parser.feed('2345"}, "category": "billing_question"}') == {
+        "extracted_info": {"order_number": "12345"},
+        "category": "billing_question",
+    }
+
+
+def test_invalid_values_are_skipped():
+    parser = IncrementalJSONParser()
+    completed = parser.feed('{"confidence": high, "category": "technical_support"}')
+    assert completed == {"category": "technical_support"}
+    assert parser.done
+
+
+def test_text_after_the_object_is_ignored():
+    parser = IncrementalJSONParser()
+    assert parser.feed('Sure! {"category": "general_inquiry"} Hope that helps') == {"category": "general_inquiry"}
+    assert parser.feed('{"category": "refund_request"}') == {}
+    assert parser.fields == {"category": "general_inquiry"}
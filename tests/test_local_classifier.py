@@ -0,0 +1,46 @@
+import numpy as np
+
+from src.models.routing import QueryCategory
+from src.router.local_classifier import LocalClassifier, calibrate_threshold
+
+
+def test_threshold_is_the_lowest_confidence_meeting_the_target():
+    probabilities = np.array([0.99, 0.95, 0.9, 0.8, 0.7, 0.6])
+    correct = np.array([1, 1, 1, 1, 0, 0])
+    assert calibrate_threshold(probabilities, correct, target=1.0, min_support=1) == 0.8
+    # Four of the top five agree, which meets 0.8
+    assert calibrate_threshold(probabilities, correct, target=0.8, min_support=1) == 0.7
+
+
+def test_threshold_needs_minimum_support():
+    probabilities = np.array([0.99, 0.9, 0.8])
+    correct = np.array([1, 0, 0])
+    # Only the single top prediction is accurate enough, and one is below the support
+    assert calibrate_threshold(probabilities, correct, target=1.0, min_support=2) == 1.01
+
+
+def test_input_order_does_not_matter():
+    probabilities = np.array([0.6, 0.99, 0.8, 0.95])
+    correct = np.array([0, 1, 1, 1])
+    assert calibrate_threshold(probabilities, correct, target=1.0, min_support=1) == 0.8
+
+
+def test_never_confident_enough_to_serve():
+    probabilities = np.array([0.9, 0.8])
+    correct = np.array([0, 0])
+    assert calibrate_threshold(probabilities, correct, target=0.5, min_support=1) == 1.01
+
+
+def test_fit_save_and_load(tmp_path):
+    queries = ["refund my order", "i want my money back", "app crashes on start", "error when logging in"] * 5
+    labels = [QueryCategory.REFUND_REQUEST] * 2 + [QueryCategory.TECHNICAL_SUPPORT] * 2
+    classifier = LocalClassifier.fit(queries, labels * 5, n_features=2 ** 10, iterations=100)
+    classifier.threshold = 0.6
+    assert classifier.predict("please refund my order")[0] == QueryCategory.REFUND_REQUEST
+
+    path = str(tmp_path / "local_classifier.npz")
+    classifier.save(path)
+    loaded = LocalClassifier.load(path)
+    assert loaded.threshold == 0.6
+    assert loaded.predict("the app crashes")[0] == QueryCategory.TECHNICAL_SUPPORT
+    np.testing.assert_allclose(loaded.predict_proba(queries), classifier.predict_proba(queries))
@@ -0,0 +1,21 @@
+from src.models.routing import QueryCategory
+from src.router.prompts import parse_classification
+
+
+def test_parses_a_fenced_answer():
+    decision = parse_classification('```json\n{"category": "refund_request", "confidence": 0.9}\n```')
+    assert decision.category == QueryCategory.REFUND_REQUEST
+    assert decision.confidence == 0.9
+
+
+def test_malformed_answers_fail_the_classification():
+    for content in (
+        "not json",
+        '"billing_question"',
+        "[1, 2]",
+        '{"category": "billing_question", "confidence": "high"}',
+        '{"category": "billing_question", "confidence": null}',
+    ):
+        decision = parse_classification(content)
+        assert decision.category == QueryCategory.UNKNOWN, content
+        assert decision.reasoning.startswith("Classification failed"), content
@@ -0,0 +1,41 @@
+import asyncio
+
+from src.router.async_router import AsyncRouter
+from src.router.caching import RouteCaches
+from src.router.router import Router
+from src.utils.response_cache import ResponseCache
+
+QUERY = "What are your opening hours on weekends?"
+
+
+def test_cache_hit_carries_no_usage_or_timings_of_the_first_route(ollama):
+    router = Router(caches=RouteCaches(response_cache=ResponseCache()))
+    first, _ = router.route_query(QUERY)
+    assert first.metadata.get("usage")
+
+    hit, _ = router.route_query(QUERY)
+    assert hit.metadata["cached"] is True
+    assert "usage" not in hit.metadata
+    assert hit.metadata["timings"] != first.metadata["timings"]
+
+
+def test_streamed_answer_is_cached_without_usage(ollama):
+    router = Router(caches=RouteCaches(response_cache=ResponseCache()))
+    events = list(router.route_query_stream(QUERY))
+    assert events[-1].metadata.get("usage")
+
+    hit, _ = router.route_query(QUERY)
+    assert hit.metadata["cached"] is True
+    assert "usage" not in hit.metadata
+
+
+def test_async_cache_hit_carries_no_usage(ollama):
+    router = AsyncRouter(caches=RouteCaches(response_cache=ResponseCache()))
+
+    async def route_twice():
+        await router.route_query_async(QUERY)
+        return await router.route_query_async(QUERY)
+
+    hit, _ = asyncio.run(route_twice())
+    assert hit.metadata["cached"] is True
+    assert "usage" not in hit.metadata
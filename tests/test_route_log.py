@@ -0,0 +1,99 @@
+import os
+
+from src.models.responses import HandlerResponse
+from src.models.routing import QueryCategory, RoutingDecision
+from src.utils.route_log import FLAG_FALLBACK, FLAG_RESPONSE_CACHED, HEADER, RECORD_DTYPE, RouteLog, RouteLogReader
+
+ROUTES = [
+    ("I want a refund for order #12345", QueryCategory.REFUND_REQUEST, "RefundRequestHandler", "llm", {}),
+    ("Mi app se cierra — ¿ayuda?", QueryCategory.TECHNICAL_SUPPORT, "TechnicalSupportHandler", "cache", {"cached": True}),
+    ("Why was I charged twice?", QueryCategory.BILLING_QUESTION, "BillingQuestionHandler", "local", {"fallback": True}),
+    ("Refund and explain my invoice", QueryCategory.REFUND_REQUEST, "RefundRequestHandler", "multi_intent",
+     {"intents": [{}, {}]}),
+]
+
+
+def write_routes(log: RouteLog) -> None:
+    for index, (query, category, handler, source, extra) in enumerate(ROUTES):
+        metadata = {
+            "timings": {"classify_ms": 10.0 * index, "generate_ms": 100.0, "route_ms": 110.0 + 10 * index},
+            "usage": {"prompt_eval_count": 50, "eval_count": 20},
+            **extra,
+        }
+        log.append(
+            query,
+            RoutingDecision(category=category, confidence=0.5 + 0.1 * index, reasoning="", extracted_info={}),
+            HandlerResponse(response="x" * (index + 1), metadata=metadata, handler_name=handler),
+            source,
+            timestamp=1000.0 + index,
+        )
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "routes.bin")
+    log = RouteLog(path)
+    write_routes(log)
+    log.close()
+
+    reader = RouteLogReader(path)
+    assert len(reader) == len(ROUTES)
+    assert [reader.query(index) for index in range(len(reader))] == [route[0] for route in ROUTES]
+    assert [reader.handler(index) for index in range(len(reader))] == [route[2] for route in ROUTES]
+    assert list(reader.column("response_chars")) == [1, 2, 3, 4]
+
+    summary = reader.summary()
+    assert summary["categories"] == {"refund_request": 2, "technical_support": 1, "billing_question": 1}
+    assert summary["sources"] == {"llm": 1, "cache": 1, "local": 1, "multi_intent": 1}
+    assert summary["tokens"] == {"prompt": 200, "completion": 80}
+    assert summary["multi_intent_rate"] == 0.25
+    assert reader.flag_rate(FLAG_FALLBACK) == 0.25
+    assert reader.flag_rate(FLAG_RESPONSE_CACHED) == 0.25
+    assert reader.summary(reader.since(1002.0))["routes"] == 2
+    reader.close()
+
+
+def test_reopening_appends_and_cuts_a_torn_record(tmp_path):
+    path = str(tmp_path / "routes.bin")
+    log = RouteLog(path)
+    write_routes(log)
+    log.close()
+    with open(path, "ab") as log_file:
+        log_file.write(b"\x01" * 10)
+
+    log = RouteLog(path)
+    write_routes(log)
+    log.close()
+    assert os.path.getsize(path) == HEADER.size + 2 * len(ROUTES) * RECORD_DTYPE.itemsize
+    reader = RouteLogReader(path)
+    # Handler names are interned per writer, so the second writer's records point at its own copies
+    assert [reader.handler(index) for index in range(len(reader))] == [route[2] for route in ROUTES] * 2
+    assert reader.query(len(ROUTES)) == ROUTES[0][0]
+    reader.close()
+
+
+def test_flushed_records_never_point_past_the_heap(tmp_path):
+    path = str(tmp_path / "routes.bin")
+    log = RouteLog(path, flush_interval=3600)
+    write_routes(log)
+    # The records are still buffered, but the text they point at is already in the heap
+    assert os.path.getsize(path + ".strings") >= sum(len(route[0].encode("utf-8")) for route in ROUTES)
+    log.flush()
+    reader = RouteLogReader(path)
+    assert len(reader) == len(ROUTES)
+    reader.close()
+    log.close()
+
+
+def test_reader_drops_records_whose_text_is_missing(tmp_path):
+    path = str(tmp_path / "routes.bin")
+    log = RouteLog(path)
+    write_routes(log)
+    log.close()
+    # As if the machine went down with the last query's text still in the page cache
+    with open(path + ".strings", "r+b") as heap:
+        heap.truncate(os.path.getsize(path + ".strings") - 5)
+
+    reader = RouteLogReader(path)
+    assert len(reader) == len(ROUTES) - 1
+    assert reader.query(len(reader) - 1) == ROUTES[-2][0]
+    reader.close()
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from src.models.routing import QueryCategory
+from src.router.async_router import AsyncRouter
+from src.router.scheduler import AdmissionRejected, AdmissionScheduler, CategoryPolicy
+
+REFUND = QueryCategory.REFUND_REQUEST
+GENERAL = QueryCategory.GENERAL_INQUIRY
+
+
+async def grant_order(scheduler: AdmissionScheduler, categories):
+    """Queue ``categories`` behind one running query and return the order their slots are granted"""
+    await scheduler.acquire(GENERAL)
+    order = []
+
+    async def wait(category):
+        await scheduler.acquire(category)
+        order.append(category)
+
+    tasks = [asyncio.ensure_future(wait(category)) for category in categories]
+    await asyncio.sleep(0)
+    scheduler.release(GENERAL)
+    for granted in range(1, len(categories) + 1):
+        while len(order) < granted:
+            await asyncio.sleep(0)
+        scheduler.release(order[-1])
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_slots_are_shared_in_proportion_to_weight():
+    scheduler = AdmissionScheduler(1)
+    order = asyncio.run(grant_order(scheduler, [GENERAL] * 4 + [REFUND] * 8))
+    # Refunds weigh 4 to general inquiries' 1, so they get four slots for each of theirs
+    assert order[:5].count(REFUND) == 4
+    assert order[:10].count(REFUND) == 8
+
+
+def test_low_weight_category_is_not_starved():
+    scheduler = AdmissionScheduler(1)
+    order = asyncio.run(grant_order(scheduler, [REFUND] * 12 + [GENERAL]))
+    assert order.index(GENERAL) < 6
+
+
+def test_full_queue_is_rejected():
+    scheduler = AdmissionScheduler(1, {GENERAL: CategoryPolicy(max_queue=1)})
+
+    async def run():
+        await scheduler.acquire(GENERAL)
+        waiting = asyncio.ensure_future(scheduler.acquire(GENERAL))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire(GENERAL)
+        waiting.cancel()
+        return rejected.value.reason
+
+    assert asyncio.run(run()) == "queue_full"
+    assert scheduler.as_dict()[GENERAL.value]["shed"] == {"queue_full": 1}
+
+
+def test_query_that_would_miss_its_deadline_is_rejected():
+    scheduler = AdmissionScheduler(1, {GENERAL: CategoryPolicy(deadline=0.05)})
+
+    async def run():
+        await scheduler.acquire(GENERAL)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire(GENERAL)
+        return rejected.value.reason
+
+    assert asyncio.run(run()) == "deadline"
+    assert scheduler.queued == 0
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    scheduler = AdmissionScheduler(1)
+
+    async def run():
+        await scheduler.acquire(GENERAL)
+        waiting = asyncio.ensure_future(scheduler.acquire(REFUND))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        scheduler.release(GENERAL)
+
+    asyncio.run(run())
+    assert (scheduler.running, scheduler.queued) == (0, 0)
+
+
+def test_try_acquire_only_takes_an_idle_slot():
+    scheduler = AdmissionScheduler(1)
+    assert scheduler.try_acquire(GENERAL)
+    assert not scheduler.try_acquire(GENERAL)
+    scheduler.release(GENERAL)
+    assert scheduler.try_acquire(GENERAL)
+
+
+def test_speculation_holds_a_scheduler_slot(ollama):
+    scheduler = AdmissionScheduler(1)
+    router = AsyncRouter(speculative=True, scheduler=scheduler)
+    query = "I want a refund for order #12345, it arrived broken"
+
+    async def run():
+        speculation = router._start_speculation(query)
+        assert speculation is not None
+        assert scheduler.running == 1
+        # With the only slot taken, no second speculation starts
+        assert router._start_speculation(query) is None
+        speculation.task.cancel()
+        await asyncio.gather(speculation.task, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert scheduler.running == 0
+
+        response, _ = await router.route_query_async(query)
+        assert response.response
+        assert scheduler.running == 0
+
+    asyncio.run(run())
@@ -0,0 +1,174 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.deadline import deadline
+from src.utils.llm_client import DeadlineExceeded
+from src.utils.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def run_followers(flight: SingleFlight, count: int, timeout: float = None):
+    """Start ``count`` callers of one key while the leader is running; returns their outcomes"""
+    outcomes = [None] * count
+
+    def follow(index):
+        try:
+            if timeout is None:
+                outcomes[index] = flight.do("key", lambda: "follower ran")
+            else:
+                with deadline(timeout):
+                    outcomes[index] = flight.do("key", lambda: "follower ran")
+        except Exception as e:
+            outcomes[index] = e
+
+    threads = [threading.Thread(target=follow, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+
+def test_followers_share_the_leaders_result():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def leader():
+        started.set()
+        release.wait()
+        return "answer"
+
+    leader_thread = threading.Thread(target=lambda: flight.do("key", leader))
+    leader_thread.start()
+    started.wait()
+    threads, outcomes = run_followers(flight, 3)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join()
+    assert outcomes == [("answer", True)] * 3
+    assert flight.coalesced == 3
+    # Nothing is kept once the call finishes
+    assert flight.do("key", lambda: "fresh") == ("fresh", False)
+
+
+def test_followers_get_the_leaders_exception():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def leader():
+        started.set()
+        release.wait()
+        raise ValueError("model unavailable")
+
+    leader_thread = threading.Thread(target=lambda: pytest.raises(ValueError, flight.do, "key", leader))
+    leader_thread.start()
+    started.wait()
+    threads, outcomes = run_followers(flight, 2)
+    time.sleep(0.05)
+    release.set()
+    for thread in threads + [leader_thread]:
+        thread.join()
+    assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+
+def test_follower_stops_waiting_at_its_deadline():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+
+    def leader():
+        started.set()
+        release.wait()
+        return "late answer"
+
+    leader_thread = threading.Thread(target=lambda: flight.do("key", leader))
+    leader_thread.start()
+    started.wait()
+    began = time.monotonic()
+    threads, outcomes = run_followers(flight, 1, timeout=0.1)
+    threads[0].join()
+    assert isinstance(outcomes[0], DeadlineExceeded)
+    assert time.monotonic() - began < 1.0
+    release.set()
+    leader_thread.join()
+
+
+def test_async_followers_share_result_and_exception():
+    flight = AsyncSingleFlight("test")
+
+    async def run(outcome):
+        async def leader():
+            await asyncio.sleep(0.05)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return await asyncio.gather(*(flight.do("key", leader) for _ in range(3)), return_exceptions=True)
+
+    assert asyncio.run(run("answer")) == [("answer", False), ("answer", True), ("answer", True)]
+    results = asyncio.run(run(ValueError("model unavailable")))
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_async_follower_runs_the_call_when_the_leader_is_cancelled():
+    flight = AsyncSingleFlight("test")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(run()) == ("answer", False)
+    assert len(calls) == 2
+
+
+def test_cancelled_async_follower_leaves_the_call_running():
+    flight = AsyncSingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(run()) == ("answer", False)
+
+
+def test_async_follower_stops_waiting_at_its_deadline():
+    flight = AsyncSingleFlight("test")
+
+    async def call():
+        await asyncio.sleep(1.0)
+        return "late answer"
+
+    async def follow():
+        with deadline(0.05):
+            return await flight.do("key", call)
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("key", call))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await follow()
+        leader.cancel()
+
+    began = time.monotonic()
+    asyncio.run(run())
+    assert time.monotonic() - began < 0.5
@@ -0,0 +1,25 @@
+from src.config.settings import settings
+from src.router.router import Router
+
+
+def test_warm_up_uses_the_options_of_later_requests(ollama, monkeypatch):
+    monkeypatch.setattr(settings, "HANDLER_MODELS", {"technical_support": "long-context"})
+    monkeypatch.setattr(settings, "HANDLER_OPTIONS", {"technical_support": {"num_ctx": 8192}})
+    monkeypatch.setattr(settings, "CLASSIFIER_MODEL", "classifier")
+    router = Router(model_name="general")
+
+    warmed = {}
+    for backend in router.client.pool.backends:
+        chat = backend.client.chat
+
+        def recording_chat(chat=chat, **kwargs):
+            warmed[kwargs["model"]] = kwargs["options"]
+            return chat(**kwargs)
+
+        monkeypatch.setattr(backend.client, "chat", recording_chat)
+
+    router.warm_up()
+    # A different num_ctx would make the server reload the model on the first real request
+    assert warmed["long-context"] == {"num_ctx": 8192, "num_predict": 1}
+    assert warmed["classifier"]["temperature"] == 0.0
+    assert warmed["classifier"]["num_predict"] == 1